@@ -0,0 +1,199 @@
+from json_stream import JsonStreamWriter, iter_json_offsets
+import numpy as np
+import mmap
+import json
+import os
+
+INDEX_VERSION = 1
+SECTIONS = ["info", "categories", "sounds", "annotations"]
+# Kinds of the index entries, in the order they are sorted in
+INFO, CATEGORY, SOUND, ANNOTATION = range(4)
+INDEX_DTYPE = np.dtype([("kind", np.int8), ("key", np.int64), ("start", np.int64), ("end", np.int64)])
+
+
+def index_paths(json_path:str):
+    """Returns the paths of the sidecar files of a dataset JSON: the offset array and its metadata."""
+    return f"{json_path}.index.npy", f"{json_path}.index.json"
+
+
+class OffsetIndexBuilder:
+    """
+    Collects the byte offsets of the info section and of every category, sound and annotation of a
+    dataset JSON while it is written or scanned, and saves them as a sidecar index. Categories and
+    sounds are keyed by their id, and annotations by the id of their sound.
+
+    The entries are written into fixed-size INDEX_DTYPE chunks, 25 bytes each, so that streaming a large
+    merge does not keep a Python object per annotation.
+    """
+
+    chunk_size = 1 << 16
+
+    def __init__(self):
+        self._chunks = []
+        self._chunk = np.empty(self.chunk_size, dtype=INDEX_DTYPE)
+        self._length = 0
+
+    def _append(self, kind:int, key:int, start:int, end:int):
+        if self._length == len(self._chunk):
+            self._chunks.append(self._chunk)
+            self._chunk = np.empty(self.chunk_size, dtype=INDEX_DTYPE)
+            self._length = 0
+        self._chunk[self._length] = (kind, key, start, end)
+        self._length += 1
+
+    def add(self, section:str, value, start:int, end:int):
+        """Records the offsets of the info section or of an item of one of the arrays."""
+        if section == "info":
+            self._append(INFO, 0, start, end)
+        elif section == "categories":
+            self._append(CATEGORY, value["id"], start, end)
+        elif section == "sounds":
+            self._append(SOUND, value["id"], start, end)
+        elif section == "annotations":
+            self._append(ANNOTATION, value["sound_id"], start, end)
+
+    def save(self, json_path:str):
+        """Writes the index next to json_path. Must be called after the JSON file is closed."""
+        chunks = self._chunks + [self._chunk[:self._length]]
+        self._chunks, self._chunk, self._length = [], np.empty(self.chunk_size, dtype=INDEX_DTYPE), 0
+        entries = np.empty(sum(len(chunk) for chunk in chunks), dtype=INDEX_DTYPE)
+        position = 0
+        while chunks:
+            # Every chunk is released as soon as it is copied, so the entries are never held twice
+            chunk = chunks.pop(0)
+            entries[position:position + len(chunk)] = chunk
+            position += len(chunk)
+        # Sorted in place, without the index arrays and copy of a lexsort
+        entries.sort(order=["kind", "key", "start"])
+        array_path, meta_path = index_paths(json_path)
+        np.save(array_path, entries)
+        stat = os.stat(json_path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "json_size": stat.st_size, "json_mtime_ns": stat.st_mtime_ns}, f, indent=4)
+
+
+def write_dataset_json(data:dict, json_path:str):
+    """
+    Writes a dataset to a JSON file exactly as json.dump(data, f, indent=4) would, and saves a sidecar
+    offset index for LazyAnnotationReader at the same time.
+
+    Args:
+        data (dict): The dataset, with the keys info, categories, sounds and annotations.
+        json_path (str): The path of the JSON file.
+    """
+    builder = OffsetIndexBuilder()
+    with open(json_path, "w", encoding="utf-8") as f:
+        writer = JsonStreamWriter(f)
+        for section, value in data.items():
+            if isinstance(value, list):
+                writer.begin_array(section)
+                for item in value:
+                    builder.add(section, item, *writer.write_item(item))
+                writer.end_array()
+            else:
+                builder.add(section, value, *writer.write_value(section, value))
+        writer.close()
+    builder.save(json_path)
+
+
+def build_offset_index(json_path:str):
+    """Scans an existing dataset JSON once and writes its sidecar offset index."""
+    builder = OffsetIndexBuilder()
+    for section, value, start, end in iter_json_offsets(json_path, SECTIONS):
+        builder.add(section, value, start, end)
+    builder.save(json_path)
+
+
+def load_offset_index(json_path:str, mmap_mode:str="r"):
+    """
+    Loads the sidecar offset index of a dataset JSON.
+
+    Returns:
+        entries (ndarray): The index entries, or None if there is no index or the JSON changed since it was written.
+    """
+    array_path, meta_path = index_paths(json_path)
+    if not os.path.exists(array_path) or not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    stat = os.stat(json_path)
+    if meta.get("version") != INDEX_VERSION or meta.get("json_size") != stat.st_size or meta.get("json_mtime_ns") != stat.st_mtime_ns:
+        return None
+    return np.load(array_path, mmap_mode=mmap_mode)
+
+
+class LazyAnnotationReader:
+    """
+    Random access to a dataset JSON without loading it. The file is memory-mapped, and the sidecar offset
+    index tells where every sound and annotation is, so only the requested entries are parsed. The index
+    is built with one scan of the file if it is missing or out of date.
+
+    Attributes:
+        json_path (str): The path of the dataset JSON.
+    """
+
+    def __init__(self, json_path:str, build_index:bool=True):
+        self.json_path = json_path
+        entries = load_offset_index(json_path)
+        if entries is None:
+            if not build_index:
+                raise FileNotFoundError(f"No up-to-date offset index for {json_path}.")
+            build_offset_index(json_path)
+            entries = load_offset_index(json_path)
+        kinds = np.asarray(entries["kind"])
+        bounds = np.searchsorted(kinds, [INFO, CATEGORY, SOUND, ANNOTATION, ANNOTATION + 1])
+        self._info = entries[bounds[0]:bounds[1]]
+        self._categories = entries[bounds[1]:bounds[2]]
+        self._sounds = entries[bounds[2]:bounds[3]]
+        self._annotations = entries[bounds[3]:bounds[4]]
+        self._sound_keys = np.asarray(self._sounds["key"])
+        self._annotation_keys = np.asarray(self._annotations["key"])
+        self._file = open(json_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _decode(self, entry):
+        return json.loads(self._mmap[int(entry["start"]):int(entry["end"])])
+
+    @property
+    def info(self):
+        """The info section of the dataset."""
+        return self._decode(self._info[0]) if len(self._info) else None
+
+    @property
+    def categories(self):
+        """The categories of the dataset, sorted by id."""
+        return [self._decode(entry) for entry in self._categories]
+
+    @property
+    def num_sounds(self):
+        return len(self._sounds)
+
+    @property
+    def num_annotations(self):
+        return len(self._annotations)
+
+    def sound_ids(self):
+        """Returns the ids of all sounds, sorted."""
+        return self._sound_keys
+
+    def get_sound(self, sound_id:int):
+        """Returns the sound with the given id, or None if there is none."""
+        i = np.searchsorted(self._sound_keys, sound_id)
+        if i == len(self._sound_keys) or self._sound_keys[i] != sound_id:
+            return None
+        return self._decode(self._sounds[i])
+
+    def annotations_for(self, sound_id:int):
+        """Returns the annotations of a sound, in the order they appear in the file."""
+        start, end = np.searchsorted(self._annotation_keys, [sound_id, sound_id + 1])
+        return [self._decode(entry) for entry in self._annotations[start:end]]
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
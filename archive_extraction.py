@@ -0,0 +1,323 @@
+from concurrent.futures import ProcessPoolExecutor
+from zipfile import ZipFile, ZIP_STORED
+import tempfile
+import argparse
+import shutil
+import struct
+import time
+import zlib
+import io
+import os
+
+CHUNK_SIZE = 1 << 20
+
+
+def member_path(extract_to:str, name:str):
+    """Returns where a zip member is extracted, dropping absolute and parent components as ZipFile.extract does."""
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".", "..")]
+    return os.path.join(extract_to, *parts)
+
+
+def nested_extract_dir(extract_to:str, name:str):
+    """Returns the directory a nested zip is extracted into: a folder named after it, next to where it would be."""
+    return os.path.splitext(member_path(extract_to, name))[0]
+
+
+def file_crc32(path:str, chunk_size:int=CHUNK_SIZE):
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def is_extracted(info, path:str, verify_crc:bool=True):
+    """Checks whether a member was already extracted to path with the same size and, optionally, the same CRC-32."""
+    if not os.path.isfile(path) or os.path.getsize(path) != info.file_size:
+        return False
+    return not verify_crc or file_crc32(path) == info.CRC
+
+
+class _MemberWindow(io.RawIOBase):
+    """A read-only, seekable view of the bytes of a stored member inside the file of the outer archive."""
+
+    def __init__(self, file, start:int, size:int):
+        self._file = file
+        self._start = start
+        self._size = size
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        self._position = min(max(base + offset, 0), self._size)
+        return self._position
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self._size - self._position)
+        if n <= 0:
+            return 0
+        self._file.seek(self._start + self._position)
+        data = self._file.read(n)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def _open_nested(archive:ZipFile, info):
+    """
+    Opens a zip member of an archive as a ZipFile. Stored members are read in place from the outer archive,
+    without a copy. Compressed members are decompressed once to a temporary file, since a ZipFile needs to seek.
+
+    Returns:
+        nested (ZipFile): The nested archive.
+        temporary_path (Optional[str]): The temporary copy to delete after use, or None.
+    """
+    if info.compress_type == ZIP_STORED and archive.fp is not None and archive.fp.seekable():
+        archive.fp.seek(info.header_offset)
+        header = archive.fp.read(30)
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        start = info.header_offset + 30 + name_length + extra_length
+        return ZipFile(io.BufferedReader(_MemberWindow(archive.fp, start, info.file_size), CHUNK_SIZE)), None
+    with archive.open(info) as source, tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as copy:
+        shutil.copyfileobj(source, copy, CHUNK_SIZE)
+    return ZipFile(copy.name), copy.name
+
+
+def _extract_from(archive:ZipFile, infos:list, extract_to:str, verify_crc:bool, nested:bool, stats:dict):
+    """Extracts members of an open archive, extracting nested zips into folders named after them."""
+    for info in infos:
+        if nested and not info.is_dir() and info.filename.lower().endswith(".zip"):
+            nested_archive, temporary_path = _open_nested(archive, info)
+            try:
+                with nested_archive:
+                    _extract_from(nested_archive, nested_archive.infolist(), nested_extract_dir(extract_to, info.filename), verify_crc, nested, stats)
+            finally:
+                if temporary_path:
+                    os.remove(temporary_path)
+            continue
+        path = member_path(extract_to, info.filename)
+        if info.is_dir():
+            os.makedirs(path, exist_ok=True)
+            continue
+        if is_extracted(info, path, verify_crc):
+            stats["skipped_files"] += 1
+            stats["skipped_bytes"] += info.file_size
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with archive.open(info) as source, open(path, "wb") as target:
+            shutil.copyfileobj(source, target, CHUNK_SIZE)
+        stats["files"] += 1
+        stats["bytes"] += info.file_size
+
+
+def _extract_batch(archive_path:str, names:list, extract_to:str, verify_crc:bool, nested:bool):
+    """Extracts some members of an archive with its own file handle. Runs in a worker process."""
+    stats = {"files": 0, "bytes": 0, "skipped_files": 0, "skipped_bytes": 0}
+    with ZipFile(archive_path) as archive:
+        _extract_from(archive, [archive.getinfo(name) for name in names], extract_to, verify_crc, nested, stats)
+    return stats
+
+
+def extract_archive(archive_path:str, extract_to:str, max_workers:int=None, verify_crc:bool=True, nested:bool=True):
+    """
+    Extracts a zip archive with a pool of worker processes. The members are split into batches of similar
+    uncompressed size, and every worker opens the archive itself and extracts its batches. Nested zip files
+    are extracted in the same pass, into a folder named after them, and are not written to disk themselves.
+    Members that were already extracted with the same size and CRC-32 are skipped, so an interrupted
+    extraction can be run again.
+
+    Args:
+        archive_path (str): The path of the zip archive.
+        extract_to (str): The directory to extract to.
+        max_workers (Optional[int]): The number of worker processes. 1 extracts in the current process.
+            Defaults to the number of CPUs.
+        verify_crc (bool): Compare the CRC-32 of existing files before skipping them, not only their size.
+        nested (bool): Extract nested zip files.
+
+    Returns:
+        stats (dict): The number of files and bytes extracted and skipped, and the elapsed seconds.
+    """
+    start = time.perf_counter()
+    max_workers = max_workers or os.cpu_count() or 1
+    with ZipFile(archive_path) as archive:
+        infos = archive.infolist()
+
+    # Largest members first, each to the batch with the fewest bytes so far
+    n_batches = min(len(infos), max_workers * 4) or 1
+    batches = [[] for _ in range(n_batches)]
+    batch_sizes = [0] * n_batches
+    for info in sorted(infos, key=lambda info: info.file_size, reverse=True):
+        smallest = batch_sizes.index(min(batch_sizes))
+        batches[smallest].append(info.filename)
+        batch_sizes[smallest] += info.file_size
+    batches = [batch for batch in batches if batch]
+
+    os.makedirs(extract_to, exist_ok=True)
+    if max_workers == 1 or len(batches) <= 1:
+        results = [_extract_batch(archive_path, batch, extract_to, verify_crc, nested) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_extract_batch, *zip(*((archive_path, batch, extract_to, verify_crc, nested) for batch in batches))))
+
+    stats = {key: sum(result[key] for result in results) for key in ("files", "bytes", "skipped_files", "skipped_bytes")}
+    stats["seconds"] = time.perf_counter() - start
+    mib = stats["bytes"] / (1 << 20)
+    print(f"Extracted {stats['files']} files ({mib:.1f} MiB) from {os.path.basename(archive_path)} in {stats['seconds']:.1f}s "
+          f"({mib / max(stats['seconds'], 1e-9):.1f} MiB/s), skipped {stats['skipped_files']} already extracted")
+    return stats
+
+
+class StreamingNotSupported(Exception):
+    """Raised when a member of a zip stream can only be extracted with the central directory."""
+
+
+class _PushbackReader:
+    """Reads exact amounts from a stream and takes back bytes read too far."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._buffer = b""
+
+    def read(self, n:int):
+        """Reads up to n bytes, fewer only at the end of the stream."""
+        while len(self._buffer) < n:
+            chunk = self._stream.read(max(n - len(self._buffer), CHUNK_SIZE))
+            if not chunk:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+    def read_exact(self, n:int):
+        data = self.read(n)
+        if len(data) < n:
+            raise EOFError("The zip stream ended in the middle of a member.")
+        return data
+
+    def read_chunk(self):
+        """Reads whatever is buffered, or the next chunk of the stream."""
+        if self._buffer:
+            data, self._buffer = self._buffer, b""
+            return data
+        return self._stream.read(CHUNK_SIZE)
+
+    def unread(self, data:bytes):
+        self._buffer = data + self._buffer
+
+
+def extract_zip_stream(stream, extract_to:str, on_member=None):
+    """
+    Extracts a zip archive from a stream that can only be read forward, e.g. a download still in progress,
+    using the local header in front of every member instead of the central directory at the end. Members
+    are written as soon as their data has been read and their CRC-32 checked.
+
+    Args:
+        stream: A file-like object with a read method.
+        extract_to (str): The directory to extract to.
+        on_member (Optional[callable]): Called with the path of every extracted file.
+
+    Returns:
+        stats (dict): The number of files and bytes extracted.
+
+    Raises:
+        StreamingNotSupported: If a member is encrypted, uses a compression method other than stored or
+            deflated, or is stored without its size in the local header. The archive must then be
+            extracted with extract_archive once it is complete.
+    """
+    reader = _PushbackReader(stream)
+    stats = {"files": 0, "bytes": 0}
+    while True:
+        signature = reader.read(4)
+        if signature in (b"PK\x01\x02", b"PK\x05\x06"):
+            # The central directory, or the end record of an empty archive
+            return stats
+        if signature != b"PK\x03\x04":
+            raise EOFError("The zip stream ended before its central directory." if len(signature) < 4 else "The stream is not a zip archive.")
+        (_, flags, method, _, _, crc, compressed_size, size, name_length, extra_length) = struct.unpack("<HHHHHIIIHH", reader.read_exact(26))
+        name = reader.read_exact(name_length).decode("utf-8" if flags & 0x800 else "cp437")
+        extra = reader.read_exact(extra_length)
+        zip64 = False
+        position = 0
+        while position + 4 <= len(extra):
+            header_id, data_size = struct.unpack("<HH", extra[position:position + 4])
+            if header_id == 0x0001:
+                zip64 = True
+                values = list(struct.unpack(f"<{data_size // 8}Q", extra[position + 4:position + 4 + data_size - data_size % 8]))
+                if size == 0xFFFFFFFF and values:
+                    size = values.pop(0)
+                if compressed_size == 0xFFFFFFFF and values:
+                    compressed_size = values.pop(0)
+            position += 4 + data_size
+        has_descriptor = bool(flags & 0x08)
+        if flags & 0x01:
+            raise StreamingNotSupported(f"{name} is encrypted.")
+        if method not in (0, 8):
+            raise StreamingNotSupported(f"{name} uses compression method {method}.")
+        if method == 0 and has_descriptor and compressed_size == 0 and not name.endswith("/"):
+            raise StreamingNotSupported(f"{name} is stored without its size in the local header.")
+
+        path = member_path(extract_to, name)
+        is_dir = name.endswith("/")
+        if is_dir:
+            os.makedirs(path, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        running_crc = 0
+        written = 0
+        with open(os.devnull if is_dir else path, "wb") as target:
+            if method == 0:
+                remaining = compressed_size
+                while remaining:
+                    chunk = reader.read_exact(min(remaining, CHUNK_SIZE))
+                    running_crc = zlib.crc32(chunk, running_crc)
+                    target.write(chunk)
+                    written += len(chunk)
+                    remaining -= len(chunk)
+            else:
+                decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                while not decompressor.eof:
+                    chunk = reader.read_chunk()
+                    if not chunk:
+                        raise EOFError(f"The zip stream ended in the middle of {name}.")
+                    data = decompressor.decompress(chunk)
+                    running_crc = zlib.crc32(data, running_crc)
+                    target.write(data)
+                    written += len(data)
+                reader.unread(decompressor.unused_data)
+        if has_descriptor:
+            descriptor = reader.read_exact(4)
+            if descriptor == b"PK\x07\x08":
+                descriptor = reader.read_exact(4)
+            crc = struct.unpack("<I", descriptor)[0]
+            reader.read_exact(16 if zip64 else 8)
+        if running_crc != crc:
+            raise zlib.error(f"Bad CRC-32 for {name} in the zip stream.")
+        if not is_dir:
+            stats["files"] += 1
+            stats["bytes"] += written
+            if on_member is not None:
+                on_member(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract a zip archive and the zip files nested in it in parallel.")
+    parser.add_argument("archive_path", help="The zip archive to extract.")
+    parser.add_argument("extract_to", help="The directory to extract to.")
+    parser.add_argument("--max-workers", type=int, default=None, help="Number of worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("--no-verify-crc", action="store_true", help="Skip existing files whose size matches without checking their CRC-32.")
+    parser.add_argument("--no-nested", action="store_true", help="Write nested zip files as they are instead of extracting them.")
+    args = parser.parse_args()
+    extract_archive(args.archive_path, args.extract_to, args.max_workers, not args.no_verify_crc, not args.no_nested)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+import soundfile as sf
+import threading
+import csv
+import os
+
+
+def read_audio_header(file_path:str):
+    """
+    Reads the duration and sample rate of a sound file from its header.
+
+    Args:
+        file_path (str): The path to the sound file
+
+    Returns:
+        duration (float): The duration of the sound file in seconds
+        sample_rate (int): The sample rate of the sound file in Hz
+    """
+    info = sf.info(file_path)
+    return info.frames / info.samplerate, info.samplerate
+
+
+class AudioMetadataCache:
+    """
+    Probes the headers of audio files in a bounded thread pool and keeps the results in an on-disk
+    CSV cache, so files that have not changed since the previous run are not opened again.
+
+    Entries are keyed by the absolute path of the file and are only reused while the size and
+    modification time of the file still match the ones recorded when it was probed.
+
+    Attributes:
+        cache_file (str): The path of the CSV file where the probed metadata is stored.
+        max_workers (int): The maximum number of files probed at the same time.
+        hits (int): The number of files served from the cache.
+        misses (int): The number of files whose header had to be read.
+    """
+
+    fieldnames = ["path", "size", "mtime_ns", "duration", "sample_rate"]
+
+    def __init__(self, cache_file:str, max_workers:int=None):
+        self.cache_file = cache_file
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Loads the cache file if it exists."""
+        if not os.path.exists(self.cache_file):
+            return
+        with open(self.cache_file, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                try:
+                    self._entries[row["path"]] = (int(row["size"]), int(row["mtime_ns"]), float(row["duration"]), int(row["sample_rate"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+    def get(self, file_path:str):
+        """
+        Gets the duration and sample rate of a single file, reading its header on a cache miss.
+
+        Args:
+            file_path (str): The path to the sound file
+
+        Returns:
+            duration (float): The duration of the sound file in seconds
+            sample_rate (int): The sample rate of the sound file in Hz
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                self.hits += 1
+                return cached[2:]
+        metadata = read_audio_header(path)
+        with self._lock:
+            self._entries[path] = (stat.st_size, stat.st_mtime_ns) + metadata
+            self._dirty = True
+            self.misses += 1
+        return metadata
+
+    def probe(self, file_paths:list):
+        """
+        Gets the duration and sample rate of many files, reading the uncached headers concurrently.
+
+        Args:
+            file_paths (list): The paths to the sound files.
+
+        Returns:
+            metadata (dict): A dictionary mapping each given path to its (duration, sample_rate) tuple.
+        """
+        file_paths = list(file_paths)
+        if not file_paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(file_paths))) as executor:
+            results = executor.map(self.get, file_paths)
+            return dict(zip(file_paths, results))
+
+    def save(self):
+        """Writes the cache to disk if new entries were probed, replacing the file atomically."""
+        if not self._dirty:
+            return
+        directory = os.path.dirname(os.path.abspath(self.cache_file))
+        os.makedirs(directory, exist_ok=True)
+        tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(tmp_file, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(self.fieldnames)
+                for path, entry in self._entries.items():
+                    writer.writerow([path, *entry])
+            os.replace(tmp_file, self.cache_file)
+            self._dirty = False
+
+    def report(self):
+        """Returns a short summary of the cache hits and misses."""
+        total = self.hits + self.misses
+        hit_rate = 100 * self.hits / total if total else 0.0
+        return f"Audio metadata cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate)"
@@ -0,0 +1,91 @@
+import argparse
+import tempfile
+import random
+import time
+import json
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from combine_datasets import combine_annotation_jsons
+
+
+def write_synthetic_dataset(json_path, n_annotations, n_sounds, n_categories, seed):
+    """Write an annotations.json with random annotations over n_sounds sounds and n_categories species."""
+    rng = random.Random(seed)
+    categories = [{"id": i, "name": f"Species {seed}-{i}"} for i in range(n_categories)]
+    sounds = [
+        {
+            "id": i,
+            "file_name_path": f"soundscape_data/recording_{i}.flac",
+            "duration": 300.0,
+            "sample_rate": 32000,
+            "latitude": None,
+            "longitude": None,
+            "date_recorded": None,
+        }
+        for i in range(n_sounds)
+    ]
+    annotations = []
+    for anno_id in range(n_annotations):
+        category = rng.choice(categories)
+        t_min = rng.uniform(0, 295)
+        annotations.append({
+            "anno_id": anno_id,
+            "sound_id": rng.randrange(n_sounds),
+            "category_id": category["id"],
+            "category": category["name"],
+            "supercategory": None,
+            "t_min": t_min,
+            "t_max": t_min + rng.uniform(0.1, 5),
+            "f_min": 1000.0,
+            "f_max": 8000.0,
+            "ismultilabel": None,
+        })
+    data = {
+        "info": {"title": f"Synthetic {seed}", "license": "CC0-1.0", "publication_date": None, "description": None, "creators": None, "version": None, "url": None},
+        "categories": categories,
+        "sounds": sounds,
+        "annotations": annotations,
+    }
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+    return [category["name"] for category in categories]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark combine_annotation_jsons against the number of annotations.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Total numbers of annotations to merge.")
+    parser.add_argument("--datasets", type=int, default=4, help="Number of datasets the annotations are split across.")
+    parser.add_argument("--sounds", type=int, default=1000, help="Number of sounds per dataset.")
+    parser.add_argument("--categories", type=int, default=2000, help="Number of categories per dataset.")
+    parser.add_argument("--streaming", action="store_true", help="Also time the streaming merge.")
+    args = parser.parse_args()
+
+    modes = [False, True] if args.streaming else [False]
+    print(f"{'annotations':>12} {'mode':>10} {'seconds':>10} {'annotations/s':>15}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Every name is already in the cache, so the merge never reaches the network
+            cache_file = os.path.join(tmp_dir, "cache.csv")
+            json_paths = []
+            names = []
+            for i in range(args.datasets):
+                json_path = os.path.join(tmp_dir, f"dataset_{i}.json")
+                names += write_synthetic_dataset(json_path, size // args.datasets, args.sounds, args.categories, seed=i)
+                json_paths.append(json_path)
+            with open(cache_file, "w", encoding="utf-8") as f:
+                f.write("original_name,standard_name\n")
+                f.writelines(f"{name},{name}\n" for name in names)
+
+            for streaming in modes:
+                output_path = os.path.join(tmp_dir, "combined.json")
+                start = time.perf_counter()
+                combine_annotation_jsons(json_paths, output_path, cache_file=cache_file, streaming=streaming)
+                elapsed = time.perf_counter() - start
+                mode = "streaming" if streaming else "in-memory"
+                print(f"{size:>12} {mode:>10} {elapsed:>10.2f} {size / elapsed:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import subprocess
+import argparse
+import json
+import time
+import sys
+import os
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+READERS_DIR = os.path.join(ROOT_DIR, "readers")
+
+# Modules that only visualizations or online metadata fetching need. Importing a reader must not load them.
+DEFERRED_MODULES = ["matplotlib", "seaborn", "librosa", "numba", "scipy", "requests"]
+
+
+def reader_modules():
+    """Returns the names of the reader entry point modules, leaving out the empty placeholders."""
+    return sorted(
+        os.path.splitext(file)[0] for file in os.listdir(READERS_DIR)
+        if file.endswith(".py") and os.path.getsize(os.path.join(READERS_DIR, file)) > 0
+    )
+
+
+def measure_import(module_name, repeats):
+    """
+    Imports a module in fresh interpreters and measures how long the import takes.
+
+    Returns:
+        seconds (float): The fastest import time over the repeats.
+        loaded (list): The DEFERRED_MODULES that the import loaded.
+        slowest (list): The (module, seconds) pairs of the imported modules with the largest own import time.
+    """
+    code = (
+        "import sys, time, json, importlib\n"
+        f"sys.path[:0] = [{READERS_DIR!r}, {ROOT_DIR!r}]\n"
+        "start = time.perf_counter()\n"
+        f"importlib.import_module({module_name!r})\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps([elapsed, [name for name in {DEFERRED_MODULES!r} if name in sys.modules]]))\n"
+    )
+    best = None
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=READERS_DIR)
+        if result.returncode != 0:
+            error = "\n".join(line for line in result.stderr.splitlines() if not line.startswith("import time:"))
+            raise RuntimeError(f"Importing {module_name} failed:\n{error}")
+        elapsed, loaded = json.loads(result.stdout.strip().splitlines()[-1])
+        if best is None or elapsed < best[0]:
+            best = (elapsed, loaded, result.stderr)
+
+    elapsed, loaded, import_log = best
+    own_times = []
+    for line in import_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = [field.strip() for field in line[len("import time:"):].split("|")]
+        if fields[0].isdigit():
+            own_times.append((fields[2], int(fields[0]) / 1e6))
+    slowest = sorted(own_times, key=lambda item: item[1], reverse=True)[:5]
+    return elapsed, loaded, slowest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of the reader entry points.")
+    parser.add_argument("--modules", nargs="+", default=None, help="Modules to import. Defaults to every module in readers/.")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of fresh interpreters per module; the fastest is reported.")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Fail if any import takes longer than this.")
+    parser.add_argument("--verbose", action="store_true", help="Also print the slowest imported modules of every entry point.")
+    args = parser.parse_args()
+
+    modules = args.modules or reader_modules()
+    failures = []
+    start = time.perf_counter()
+    print(f"{'module':<40} {'seconds':>8}  deferred modules loaded")
+    for module_name in modules:
+        try:
+            elapsed, loaded, slowest = measure_import(module_name, args.repeats)
+        except RuntimeError as e:
+            print(f"{module_name:<40} {'error':>8}")
+            failures.append(str(e))
+            continue
+        print(f"{module_name:<40} {elapsed:>8.3f}  {', '.join(loaded) or '-'}")
+        if args.verbose:
+            for name, seconds in slowest:
+                print(f"    {seconds:>8.3f}s {name}")
+        if loaded:
+            failures.append(f"{module_name} imports {', '.join(loaded)} at import time")
+        if args.max_seconds is not None and elapsed > args.max_seconds:
+            failures.append(f"{module_name} took {elapsed:.3f}s to import (limit {args.max_seconds}s)")
+    print(f"\nMeasured {len(modules)} modules in {time.perf_counter() - start:.1f}s")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
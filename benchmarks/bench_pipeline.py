@@ -0,0 +1,166 @@
+from contextlib import redirect_stdout
+import argparse
+import tempfile
+import shutil
+import json
+import time
+import math
+import sys
+import io
+import os
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "readers"))
+from BaseReader import discover_readers
+from combine_datasets import combine_annotation_jsons
+from coco_standard_format import AnnotationCreator
+from synthetic_data import LAYOUTS, generate_dataset
+from taxonomy_index import TaxonomyIndex
+
+
+def offline_reader(reader_class):
+    """Returns a subclass of a reader that fills in placeholder dataset info instead of querying Zenodo."""
+    def add_dataset_info(self):
+        self.annotation_creator.add_info(title=f"Synthetic {self.dataset_name}", license="CC0-1.0", url="synthetic")
+    # __module__ is set to "__main__" so that the subclass is not added to the reader registry
+    return type(f"Offline{reader_class.__name__}", (reader_class,), {"add_dataset_info": add_dataset_info, "__module__": "__main__"})
+
+
+def run_reader(reader_class, dataset_dir):
+    """Runs a reader without visualizations and returns its elapsed time, counts and stage metrics."""
+    reader = offline_reader(reader_class)(dataset_dir)
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        reader.process_dataset(visualize=False)
+    return {
+        "seconds": time.perf_counter() - start,
+        "sounds": len(reader.annotation_creator.data["sounds"]),
+        "annotations": len(reader.annotation_creator.data["annotations"]),
+        "stages": {stage["stage"]: stage["wall_time"] for stage in reader.metrics.stages},
+    }
+
+
+def run_combine(json_paths, names, work_dir, streaming):
+    """Merges the annotations.json files, resolving every category name offline with a TaxonomyIndex."""
+    taxonomy_index = TaxonomyIndex.from_name_cache({name: name for name in names})
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        combine_annotation_jsons(json_paths, os.path.join(work_dir, "combined.json"), cache_file=os.path.join(work_dir, "cache.csv"),
+                                 streaming=streaming, taxonomy_index=taxonomy_index)
+    return time.perf_counter() - start
+
+
+def run_crowsetta(data_dir):
+    """
+    Converts the synthetic Domestic_Canari (Audacity) and Enabirds (Raven) datasets through crowsetta.
+
+    Returns:
+        seconds (float): The elapsed time, or None if crowsetta is not installed or neither dataset was generated.
+    """
+    try:
+        from crowsetta_annotations import get_annotations
+    except ImportError:
+        return None
+    canari_dir = os.path.join(data_dir, "Domestic_Canari")
+    enabirds_dir = os.path.join(data_dir, "Enabirds")
+    if not os.path.isdir(canari_dir) and not os.path.isdir(enabirds_dir):
+        return None
+
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        if os.path.isdir(canari_dir):
+            annotations = get_annotations(os.path.join(canari_dir, "M1-2016-spring_audacity_annotations", "audacity-annotations"), "aud-seq",
+                                          sounds_path=os.path.join(canari_dir, "M1-2016-sping_audio", "audio"))
+            AnnotationCreator().convert_crowsetta_seq_annotations(annotations)
+        if os.path.isdir(enabirds_dir):
+            for recording in sorted(os.listdir(os.path.join(enabirds_dir, "annotation_Files"))):
+                annotations = get_annotations(os.path.join(enabirds_dir, "annotation_Files", recording), "raven", annot_col="Species",
+                                              sounds_path=os.path.join(enabirds_dir, "wav_Files", recording))
+                AnnotationCreator().convert_crowsetta_bbox_annotations(annotations)
+    return time.perf_counter() - start
+
+
+def scaling_exponent(scales, seconds):
+    """Fits seconds ~ scale^k between the smallest and largest scale. k close to 1 means linear scaling."""
+    points = [(scale, value) for scale, value in zip(scales, seconds) if value]
+    if len(points) < 2:
+        return None
+    (first_scale, first_value), (last_scale, last_value) = points[0], points[-1]
+    return math.log(last_value / first_value) / math.log(last_scale / first_scale)
+
+
+def print_results(scales, results):
+    """Prints one row per task with its time at every scale and its scaling exponent."""
+    width = max(len(task) for task in results) + 2
+    header = f"{'task':<{width}}" + "".join(f"{f'{scale} sounds':>14}" for scale in scales) + f"{'exponent':>10}"
+    print("\n" + header)
+    for task, seconds in results.items():
+        exponent = scaling_exponent(scales, seconds)
+        cells = "".join(f"{value:>13.2f}s" if value is not None else f"{'-':>14}" for value in seconds)
+        print(f"{task:<{width}}{cells}{exponent:>10.2f}" if exponent is not None else f"{task:<{width}}{cells}{'-':>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the readers, the dataset merge and the crowsetta conversion on synthetic datasets of several sizes.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 50, 250], help="Numbers of recordings per dataset.")
+    parser.add_argument("--datasets", nargs="+", default=sorted(LAYOUTS), choices=sorted(LAYOUTS), help="Datasets to generate and read.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Duration of every recording in seconds.")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="Sample rate of the recordings.")
+    parser.add_argument("--species", type=int, default=20, help="Number of categories per dataset.")
+    parser.add_argument("--annotations-per-sound", type=int, default=20, help="Number of annotations per recording.")
+    parser.add_argument("--streaming", action="store_true", help="Use the streaming merge for combine_annotation_jsons.")
+    parser.add_argument("--stages", action="store_true", help="Also report the time of every reader stage.")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--keep", default=None, help="Keep the generated datasets in this directory instead of a temporary one.")
+    args = parser.parse_args()
+
+    registry, _ = discover_readers()
+    scales = sorted(args.scales)
+    results = {}
+
+    def record(task, scale_index, seconds):
+        results.setdefault(task, [None] * len(scales))[scale_index] = seconds
+
+    for scale_index, n_sounds in enumerate(scales):
+        work_dir = os.path.join(args.keep, f"scale_{n_sounds}") if args.keep else tempfile.mkdtemp(prefix="bench_pipeline_")
+        data_dir = os.path.join(work_dir, "data")
+        try:
+            names = []
+            json_paths = []
+            for dataset_name in args.datasets:
+                start = time.perf_counter()
+                names += generate_dataset(dataset_name, data_dir, n_sounds, args.duration, args.sample_rate, args.species, args.annotations_per_sound)
+                generation = time.perf_counter() - start
+
+                result = run_reader(registry[dataset_name], os.path.join(data_dir, dataset_name))
+                json_paths.append(os.path.join(data_dir, dataset_name, "annotations.json"))
+                record(f"reader {dataset_name}", scale_index, result["seconds"])
+                if args.stages:
+                    for stage, seconds in result["stages"].items():
+                        record(f"  {dataset_name}.{stage}", scale_index, seconds)
+                print(f"{n_sounds:>6} sounds  {dataset_name:<40} generated in {generation:.2f}s, read in {result['seconds']:.2f}s "
+                      f"({result['annotations']} annotations, {result['annotations'] / result['seconds']:.0f} annotations/s)")
+
+            seconds = run_combine(json_paths, names, work_dir, args.streaming)
+            record("combine_annotation_jsons", scale_index, seconds)
+            print(f"{n_sounds:>6} sounds  combine_annotation_jsons in {seconds:.2f}s")
+
+            seconds = run_crowsetta(data_dir)
+            if seconds is not None:
+                record("crowsetta conversion", scale_index, seconds)
+                print(f"{n_sounds:>6} sounds  crowsetta conversion in {seconds:.2f}s")
+        finally:
+            if not args.keep:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    if "crowsetta conversion" not in results:
+        print("crowsetta is not installed, skipping the crowsetta conversion")
+    print_results(scales, results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"scales": scales, "results": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
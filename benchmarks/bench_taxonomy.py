@@ -0,0 +1,47 @@
+import argparse
+import tempfile
+import time
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from combine_datasets import load_or_create_cache, get_standard_species_name, resolve_species_names
+from mock_taxonomy_server import MockTaxonomyServer
+from taxonomy_resolver import TaxonomyResolver
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark taxonomy resolution against a local mock server.")
+    parser.add_argument("--names", type=int, default=200, help="Number of distinct names to resolve.")
+    parser.add_argument("--duplicates", type=int, default=3, help="Number of times every name appears in the input.")
+    parser.add_argument("--latency", type=float, default=0.1, help="Server latency per request, in seconds.")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Server rate limit in requests per second.")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Maximum number of requests in flight for the concurrent resolver.")
+    parser.add_argument("--rate", type=float, default=100.0, help="Client-side request rate for the concurrent resolver.")
+    parser.add_argument("--skip-sequential", action="store_true", help="Only time the concurrent resolver.")
+    args = parser.parse_args()
+
+    names = [f"Species name {i}" for i in range(args.names)] * args.duplicates
+
+    with MockTaxonomyServer(latency=args.latency, rate_limit=args.rate_limit) as server, tempfile.TemporaryDirectory() as tmp_dir:
+        if not args.skip_sequential:
+            cache_file = os.path.join(tmp_dir, "sequential_cache.csv")
+            name_cache = load_or_create_cache(cache_file)
+            start = time.perf_counter()
+            for name in names:
+                get_standard_species_name(name, name_cache, url=server.url)
+            sequential = time.perf_counter() - start
+            print(f"Sequential: {sequential:.2f}s for {len(names)} names ({server.request_count} requests)")
+
+        cache_file = os.path.join(tmp_dir, "concurrent_cache.csv")
+        name_cache = load_or_create_cache(cache_file)
+        resolver = TaxonomyResolver(url=server.url, max_concurrency=args.max_concurrency, rate=args.rate)
+        start = time.perf_counter()
+        resolve_species_names(names, name_cache, resolver)
+        concurrent = time.perf_counter() - start
+        print(f"Concurrent: {concurrent:.2f}s for {len(names)} names ({resolver.requests_sent} requests, {resolver.rate_limited} rate limited)")
+        assert len(name_cache) == args.names
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from interval_index import IntervalIndex
+from math import gcd
+import soundfile as sf
+import pandas as pd
+import numpy as np
+import argparse
+import hashlib
+import json
+import os
+
+PROGRESS_FILE = "progress.json"
+CLIP_COLUMNS = ["clip_id", "unit", "sound_id", "file_name_path", "t_start", "t_end", "anno_id", "category_ids"]
+
+
+def read_segment(file_path:str, t_start:float, t_end:float, target_sample_rate:int=None, mono:bool=True):
+    """
+    Reads a segment of a sound file by seeking to its first frame, so only the frames of the segment are
+    decoded. Parts of the segment outside the file are filled with zeros.
+
+    Args:
+        file_path (str): The path of the sound file.
+        t_start (float): The start of the segment in seconds. May be negative.
+        t_end (float): The end of the segment in seconds. May be after the end of the file.
+        target_sample_rate (Optional[int]): Resample the segment to this rate. Defaults to the rate of the file.
+        mono (bool): Average the channels.
+
+    Returns:
+        samples (ndarray): The float32 samples, with shape (frames,) if mono and (frames, channels) otherwise.
+        sample_rate (int): The sample rate of the samples.
+    """
+    with sf.SoundFile(file_path) as sound_file:
+        return read_open_segment(sound_file, t_start, t_end, target_sample_rate, mono)
+
+
+def read_open_segment(sound_file:sf.SoundFile, t_start:float, t_end:float, target_sample_rate:int=None, mono:bool=True):
+    """Like read_segment, but reads from an open SoundFile so several segments can be read without reopening it."""
+    sample_rate = sound_file.samplerate
+    first = int(round(t_start * sample_rate))
+    samples = read_frames(sound_file, first, int(round(t_end * sample_rate)) - first, mono)
+    if target_sample_rate and target_sample_rate != sample_rate:
+        samples = resample(samples, sample_rate, target_sample_rate)
+        sample_rate = target_sample_rate
+    return samples, sample_rate
+
+
+def read_frames(sound_file:sf.SoundFile, first:int, n_frames:int, mono:bool=True):
+    """Reads n_frames frames from an open SoundFile starting at frame first, with zeros outside the file."""
+    samples = np.zeros((n_frames, sound_file.channels), dtype=np.float32)
+    start = min(max(first, 0), sound_file.frames)
+    stop = min(max(first + n_frames, 0), sound_file.frames)
+    if stop > start:
+        sound_file.seek(start)
+        samples[start - first:stop - first] = sound_file.read(stop - start, dtype="float32", always_2d=True)
+    return samples.mean(axis=1) if mono else samples
+
+
+def resample(samples, sample_rate:int, target_sample_rate:int):
+    """Resamples along the first axis with a polyphase filter."""
+    from scipy.signal import resample_poly
+    divisor = gcd(int(sample_rate), int(target_sample_rate))
+    return resample_poly(samples, target_sample_rate // divisor, sample_rate // divisor, axis=0).astype(np.float32)
+
+
+def plan_clips(data:dict, mode:str="annotation", clip_duration:float=None, hop:float=None, padding:float=0.0, min_overlap:float=0.5):
+    """
+    Lists the clips to extract from a dataset, with their labels.
+
+    In "annotation" mode there is one clip per annotation: the annotation itself extended by padding on both
+    sides, or, with clip_duration, a clip of that length centered on the annotation. In "window" mode every
+    sound is cut into windows of clip_duration seconds every hop seconds.
+
+    A clip is labeled with every category whose annotation overlaps it by at least min_overlap times the
+    shorter of the annotation and the clip, found with an IntervalIndex.
+
+    Args:
+        data (dict): The dataset in the annotations.json schema.
+        mode (str): "annotation" or "window".
+        clip_duration (Optional[float]): The length of the clips in seconds. Required in "window" mode.
+        hop (Optional[float]): The step between windows in seconds. Defaults to clip_duration.
+        padding (float): The seconds added before and after annotations of variable-length clips.
+        min_overlap (float): The fraction of overlap needed to label a clip with a category.
+
+    Returns:
+        clips (DataFrame): One row per clip with the columns of CLIP_COLUMNS except unit, sorted by sound and time.
+    """
+    sounds = pd.DataFrame(data["sounds"], columns=["id", "file_name_path", "duration"])
+    annotations = data["annotations"]
+    if mode == "annotation":
+        anno_sound_ids = np.array([anno["sound_id"] for anno in annotations], dtype=np.int64)
+        t_min = np.array([anno["t_min"] for anno in annotations], dtype=float)
+        t_max = np.array([anno["t_max"] for anno in annotations], dtype=float)
+        if clip_duration:
+            centers = (t_min + t_max) / 2
+            t_start, t_end = centers - clip_duration / 2, centers + clip_duration / 2
+        else:
+            t_start, t_end = t_min - padding, t_max + padding
+        clips = pd.DataFrame({"sound_id": anno_sound_ids, "t_start": t_start, "t_end": t_end,
+                              "anno_id": [anno["anno_id"] for anno in annotations]})
+    elif mode == "window":
+        if not clip_duration:
+            raise ValueError("clip_duration is required in window mode.")
+        hop = hop or clip_duration
+        starts = [np.arange(0, max(duration - clip_duration, 0) + 1e-9, hop) for duration in sounds["duration"]]
+        counts = [len(sound_starts) for sound_starts in starts]
+        t_start = np.concatenate(starts) if starts else np.zeros(0)
+        clips = pd.DataFrame({"sound_id": np.repeat(sounds["id"].to_numpy(), counts), "t_start": t_start,
+                              "t_end": t_start + clip_duration, "anno_id": None})
+    else:
+        raise ValueError(f"Unknown mode '{mode}'. Expected 'annotation' or 'window'.")
+
+    index = IntervalIndex.from_annotations(annotations)
+    matches = index.query_batch(clips["sound_id"].to_numpy(), clips["t_start"].to_numpy(), clips["t_end"].to_numpy())
+    category_ids = []
+    for clip_start, clip_end, positions in zip(clips["t_start"].tolist(), clips["t_end"].tolist(), matches):
+        labels = set()
+        for position in positions.tolist():
+            anno = annotations[position]
+            overlap = min(clip_end, anno["t_max"]) - max(clip_start, anno["t_min"])
+            if overlap >= min_overlap * min(anno["t_max"] - anno["t_min"], clip_end - clip_start):
+                labels.add(anno["category_id"])
+        category_ids.append(";".join(str(category_id) for category_id in sorted(labels)))
+    clips["category_ids"] = category_ids
+
+    clips = clips.merge(sounds[["id", "file_name_path"]].rename(columns={"id": "sound_id"}), on="sound_id", how="left")
+    clips = clips.sort_values(["sound_id", "t_start"], kind="stable").reset_index(drop=True)
+    clips["clip_id"] = np.arange(len(clips))
+    return clips[[column for column in CLIP_COLUMNS if column != "unit"]]
+
+
+def _extract_unit(unit:int, clips:pd.DataFrame, audio_root:str, output_dir:str, output_format:str, sample_rate:int, category_ids:list):
+    """Extracts the clips of one unit of work and writes them as clip files or as one shard."""
+    label_columns = {category_id: i for i, category_id in enumerate(category_ids)}
+    samples = []
+    labels = np.zeros((len(clips), len(category_ids)), dtype=np.uint8)
+    sound_file = None
+    for i, clip in enumerate(clips.itertuples(index=False)):
+        file_path = os.path.join(audio_root, clip.file_name_path)
+        if sound_file is None or sound_file.name != file_path:
+            if sound_file is not None:
+                sound_file.close()
+            sound_file = sf.SoundFile(file_path)
+        segment, _ = read_open_segment(sound_file, clip.t_start, clip.t_end, sample_rate)
+        for category_id in filter(None, clip.category_ids.split(";")):
+            labels[i, label_columns[int(category_id)]] = 1
+        if output_format == "clips":
+            sf.write(os.path.join(output_dir, "clips", f"clip_{clip.clip_id:08d}.wav"), segment, sample_rate)
+        else:
+            samples.append(segment)
+    if sound_file is not None:
+        sound_file.close()
+    if output_format == "shards":
+        # Rounding can make clips of the same duration differ by a sample
+        length = int(round((clips["t_end"].iloc[0] - clips["t_start"].iloc[0]) * sample_rate))
+        shard = np.zeros((len(samples), length), dtype=np.float32)
+        for i, segment in enumerate(samples):
+            shard[i, :min(length, len(segment))] = segment[:length]
+        np.save(os.path.join(output_dir, "shards", f"shard_{unit:05d}.npy"), shard)
+        np.save(os.path.join(output_dir, "shards", f"shard_{unit:05d}.labels.npy"), labels)
+    return unit
+
+
+class ClipExtractor:
+    """
+    Extracts training clips from the recordings of a dataset in a process pool.
+
+    The clips are sorted by sound and time and split into units of work of unit_size clips, so a worker
+    opens every file once per unit and seeks from clip to clip. Each unit is written as clip files or as one
+    shard: an array of shape (clips, samples) and a multi-hot label array. Only a few units are in flight at
+    a time, which bounds the memory used, and finished units are recorded in progress.json, so an
+    interrupted extraction resumes where it stopped.
+
+    Attributes:
+        output_dir (str): The directory where the clips, clips.csv, categories.json and progress.json are written.
+        audio_root (str): The directory the file_name_path of the sounds are relative to.
+        sample_rate (int): The sample rate of the clips.
+        output_format (str): "clips" to write one WAV file per clip or "shards" to write packed arrays.
+        unit_size (int): The number of clips per unit of work, and per shard.
+        max_workers (Optional[int]): The number of worker processes. Defaults to the number of CPUs.
+    """
+
+    def __init__(self, output_dir:str, audio_root:str, sample_rate:int=16000, output_format:str="clips", unit_size:int=256, max_workers:int=None):
+        if output_format not in ("clips", "shards"):
+            raise ValueError(f"Unknown output format '{output_format}'. Expected 'clips' or 'shards'.")
+        self.output_dir = output_dir
+        self.audio_root = audio_root
+        self.sample_rate = sample_rate
+        self.output_format = output_format
+        self.unit_size = unit_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.progress_path = os.path.join(output_dir, PROGRESS_FILE)
+
+    def _load_progress(self, plan_hash:str):
+        """Returns the units finished by a previous run with the same plan and settings."""
+        if not os.path.exists(self.progress_path):
+            return set()
+        with open(self.progress_path, "r", encoding="utf-8") as f:
+            progress = json.load(f)
+        if progress.get("plan") != plan_hash:
+            raise ValueError(f"{self.output_dir} holds an extraction with different clips or settings. Use another output directory.")
+        return set(progress["completed_units"])
+
+    def _save_progress(self, plan_hash:str, completed:set, n_units:int):
+        temporary_path = self.progress_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump({"plan": plan_hash, "num_units": n_units, "completed_units": sorted(completed)}, f)
+        os.replace(temporary_path, self.progress_path)
+
+    def extract(self, clips:pd.DataFrame, categories:list):
+        """
+        Extracts the clips planned by plan_clips, skipping the units finished by a previous run.
+
+        Args:
+            clips (DataFrame): The clips returned by plan_clips.
+            categories (list): The categories of the dataset. Their order gives the columns of the label arrays.
+
+        Returns:
+            clips (DataFrame): The clips with the unit they were written in, also saved as clips.csv.
+        """
+        if self.output_format == "shards" and not np.allclose(clips["t_end"] - clips["t_start"], (clips["t_end"] - clips["t_start"]).iloc[0]):
+            raise ValueError("The clips of shards must all have the same duration. Plan them with a clip_duration.")
+        os.makedirs(os.path.join(self.output_dir, self.output_format), exist_ok=True)
+        clips = clips.assign(unit=np.arange(len(clips)) // self.unit_size)[CLIP_COLUMNS]
+        category_ids = [category["id"] for category in categories]
+        settings = json.dumps({"sample_rate": self.sample_rate, "format": self.output_format, "unit_size": self.unit_size})
+        plan_hash = hashlib.blake2b((settings + clips.to_csv(index=False)).encode("utf-8"), digest_size=16).hexdigest()
+        with open(os.path.join(self.output_dir, "categories.json"), "w", encoding="utf-8") as f:
+            json.dump(categories, f, indent=4)
+
+        n_units = int(clips["unit"].max()) + 1 if len(clips) else 0
+        completed = self._load_progress(plan_hash)
+        pending = [unit for unit in range(n_units) if unit not in completed]
+        if completed:
+            print(f"Resuming: {len(completed)} of {n_units} units already extracted")
+
+        units = clips.groupby("unit")
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = set()
+            for unit in pending:
+                if len(in_flight) >= 2 * self.max_workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    self._finish(done, completed, plan_hash, n_units)
+                in_flight.add(executor.submit(_extract_unit, unit, units.get_group(unit), self.audio_root, self.output_dir,
+                                              self.output_format, self.sample_rate, category_ids))
+            self._finish(wait(in_flight).done, completed, plan_hash, n_units)
+
+        clips.to_csv(os.path.join(self.output_dir, "clips.csv"), index=False)
+        return clips
+
+    def _finish(self, futures, completed:set, plan_hash:str, n_units:int):
+        for future in futures:
+            completed.add(future.result())
+        self._save_progress(plan_hash, completed, n_units)
+        print(f"Extracted {len(completed)} of {n_units} units")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract fixed-length or per-annotation training clips from a dataset.")
+    parser.add_argument("json_path", help="The annotations.json file of the dataset.")
+    parser.add_argument("output_dir", help="The directory to write the clips to.")
+    parser.add_argument("--audio-root", default=None, help="The directory the sound paths are relative to. Defaults to the directory of json_path.")
+    parser.add_argument("--mode", choices=["annotation", "window"], default="annotation", help="One clip per annotation or sliding windows over every sound.")
+    parser.add_argument("--clip-duration", type=float, default=None, help="The length of the clips in seconds. Required for windows and shards.")
+    parser.add_argument("--hop", type=float, default=None, help="The step between windows in seconds. Defaults to the clip duration.")
+    parser.add_argument("--padding", type=float, default=0.0, help="Seconds added around annotations when --clip-duration is not given.")
+    parser.add_argument("--min-overlap", type=float, default=0.5, help="Fraction of overlap needed to label a clip with a category.")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="The sample rate of the clips.")
+    parser.add_argument("--format", choices=["clips", "shards"], default="clips", help="Write one WAV file per clip or packed NumPy shards.")
+    parser.add_argument("--unit-size", type=int, default=256, help="Number of clips per unit of work and per shard.")
+    parser.add_argument("--max-workers", type=int, default=None, help="Number of worker processes. Defaults to the number of CPUs.")
+    args = parser.parse_args()
+
+    if args.format == "shards" and not args.clip_duration:
+        parser.error("--format shards needs --clip-duration, since the clips of a shard must have the same length.")
+    with open(args.json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    clips = plan_clips(data, args.mode, args.clip_duration, args.hop, args.padding, args.min_overlap)
+    extractor = ClipExtractor(args.output_dir, args.audio_root or os.path.dirname(os.path.abspath(args.json_path)), args.sample_rate,
+                              args.format, args.unit_size, args.max_workers)
+    extractor.extract(clips, data["categories"])
+    print(f"✅ Extracted {len(clips)} clips to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
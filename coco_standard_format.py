@@ -1,11 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime  
 from typing import Optional
 import soundfile as sf 
 import pandas as pd
-import requests
-import json  
+import numpy as np
 import os
+from columnar_format import ColumnarDataset, save_columnar
+from annotation_index import write_dataset_json
+from zenodo_metadata import ZenodoMetadataCache
+from dataset_downloader import parse_record_id
   
+def _column_values(df:pd.DataFrame, column:str, cast=None):
+    """
+    Returns the values of a DataFrame column as a list of Python objects, with missing values as None.
+
+    Args:
+        df (DataFrame): The DataFrame to read from.
+        column (str): The name of the column. If the column does not exist, a list of None is returned.
+        cast (Optional[type]): A type the non-missing values are converted to, e.g. int or float.
+
+    Returns:
+        values (list): The values of the column.
+    """
+    if column not in df:
+        return [None] * len(df)
+    values = df[column].astype(object).where(df[column].notna(), None).tolist()
+    if cast is not None:
+        values = [cast(value) if value is not None else None for value in values]
+    return values
+
+
 class AnnotationCreator:  
     """  
     A class to create and manage bioacustics annotations in a standard format.  
@@ -24,6 +48,13 @@ class AnnotationCreator:
             "sounds": [],  
             "annotations": []  
         }  
+        self._sounds_by_id = {}
+        self._sounds_by_path = {}
+        self._sounds_by_basename = {}
+        self._sounds_by_stem = {}
+        self._category_indexes = {}
+        self._stable_sound_ids = None
+        self._next_sound_id = 0
 
     def _validate_date_format(self, date_str: str, date_format: str = "%Y%m%d"):  
         """  
@@ -60,7 +91,7 @@ class AnnotationCreator:
             sample_rate = sound_file.samplerate 
         return duration, sample_rate
 
-    def add_info(self, title:str=None,  license:str=None, publication_date:Optional[datetime]=None, description:Optional[str]=None, creators:Optional[list]=None, version:Optional[float]=None, url:Optional[str]=None):
+    def add_info(self, title:str=None,  license:str=None, publication_date:Optional[datetime]=None, description:Optional[str]=None, creators:Optional[list]=None, version:Optional[float]=None, url:Optional[str]=None, metadata_cache:Optional[ZenodoMetadataCache]=None):
         """  
         Adds the general information about the dataset.  
   
@@ -72,29 +103,25 @@ class AnnotationCreator:
             creators (Optional[dict]): List with creators information.  
             version (Optional[float]): The version number of the dataset.   
             url (Optional[str]): The web address where the dataset can be accessed or downloaded. If it's a Zenodo URL, metadata is fetched automatically.
+            metadata_cache (Optional[ZenodoMetadataCache]): The cache Zenodo metadata is read from. Defaults to the
+                cache configured by the ZENODO_METADATA_CACHE and ZENODO_OFFLINE environment variables.
   
         Raises:  
             ValueError: If the year is in the future or the date format is incorrect.  
+            ZenodoMetadataError: If the Zenodo metadata is neither cached nor available from Zenodo.
         """  
         #TODO: Check if set title and license as required values
         if "zenodo.org/records/" in url:
-            try:
-                record_id = url.split("zenodo.org/records/")[1]
-                response = requests.get(f"https://zenodo.org/api/records/{record_id}")
-                data = response.json()
-                metadata = data['metadata']
-                title=metadata['title']
-                license=metadata['license']['id']
-                publication_date=datetime.strptime(metadata['publication_date'], "%Y-%m-%d").strftime("%Y%m%d")
-                description=metadata['description']
-                creators=metadata['creators']
-                if 'version' in metadata:
-                    version=metadata['version']
-                else:
-                    version=metadata['relations']['version']
-
-            except requests.exceptions.RequestException as e:
-                raise ValueError(f"Failed to fetch metadata from Zenodo: {e}")
+            metadata = (metadata_cache or ZenodoMetadataCache.from_environment()).get(parse_record_id(url))
+            title=metadata['title']
+            license=metadata['license']['id']
+            publication_date=datetime.strptime(metadata['publication_date'], "%Y-%m-%d").strftime("%Y%m%d")
+            description=metadata['description']
+            creators=metadata['creators']
+            if 'version' in metadata:
+                version=metadata['version']
+            else:
+                version=metadata['relations']['version']
 
         if publication_date:
             self._validate_date_format(publication_date)
@@ -119,6 +146,7 @@ class AnnotationCreator:
         sorted_df.index.name = 'id'
         categories_list = sorted_df.reset_index().to_dict(orient='records') 
         self.data['categories'] = categories_list
+        self._category_indexes = {}
         
     def add_sound(self, id:int, file_name_path:str, duration:int, sample_rate:int, latitude:float, longitude:float, date_recorded:Optional[datetime]=None):  
         """  
@@ -149,6 +177,11 @@ class AnnotationCreator:
                 raise ValueError("Longitude must be between -180 and 180 degrees.")
         if date_recorded:
             self._validate_date_format(date_recorded)
+        if self._stable_sound_ids is not None:
+            id = self._stable_sound_ids.get(file_name_path)
+            if id is None:
+                id = self._next_sound_id
+                self._next_sound_id += 1
 
         sound = {  
             "id": id,  
@@ -160,6 +193,101 @@ class AnnotationCreator:
             "date_recorded": date_recorded  
         }  
         self.data['sounds'].append(sound)  
+        self._index_sound(sound)
+
+    def _index_sound(self, sound:dict):
+        """
+        Registers a sound in the lookup indexes. The first sound added under a given key wins,
+        which matches the behaviour of scanning the sounds list in order.
+
+        Args:
+            sound (dict): The sound entry to index.
+        """
+        path = os.path.normpath(sound["file_name_path"])
+        basename = os.path.basename(path)
+        self._sounds_by_id[sound["id"]] = sound
+        self._sounds_by_path.setdefault(path, sound)
+        self._sounds_by_basename.setdefault(basename, sound)
+        self._sounds_by_stem.setdefault(os.path.splitext(basename)[0], sound)
+
+    def set_stable_sound_ids(self, sound_ids:dict):
+        """
+        Makes add_sound keep the ids of previously processed sounds, instead of the ids it is called with,
+        so incremental runs do not renumber unchanged sounds. Sounds with new paths are numbered after the
+        largest known id.
+
+        Args:
+            sound_ids (dict): Maps file_name_path to the id the sound had before.
+        """
+        self._stable_sound_ids = dict(sound_ids)
+        self._next_sound_id = max(sound_ids.values(), default=-1) + 1
+
+    def get_sound(self, file_name:str):
+        """
+        Finds a sound by its relative path, its file name or its file name without extension.
+
+        Args:
+            file_name (str): The path, file name or stem of the sound file.
+
+        Returns:
+            sound (dict): The matching sound entry, or None if there is no match.
+        """
+        path = os.path.normpath(file_name)
+        basename = os.path.basename(path)
+        sound = self._sounds_by_path.get(path)
+        if sound is None:
+            sound = self._sounds_by_basename.get(basename)
+        if sound is None:
+            sound = self._sounds_by_stem.get(basename)
+        return sound
+
+    def get_sound_id(self, file_name:str):
+        """
+        Finds the id of a sound by its relative path, its file name or its file name without extension.
+
+        Args:
+            file_name (str): The path, file name or stem of the sound file.
+
+        Returns:
+            sound_id (int): The id of the matching sound, or None if there is no match.
+        """
+        sound = self.get_sound(file_name)
+        return sound["id"] if sound is not None else None
+
+    def get_category(self, value, key:str="name"):
+        """
+        Finds a category by the value of one of its attributes. An index is built the first time
+        an attribute is queried and is discarded whenever the categories are replaced.
+
+        Args:
+            value: The value to look up, e.g. a species name or an eBird code.
+            key (str): The category attribute to match on, e.g. "name" or "Species eBird Code".
+
+        Returns:
+            category (dict): The first matching category entry, or None if there is no match.
+        """
+        index = self._category_indexes.get(key)
+        if index is None:
+            index = {}
+            for category in self.data["categories"]:
+                if key in category:
+                    index.setdefault(category[key], category)
+            self._category_indexes[key] = index
+        return index.get(value)
+
+    def get_category_id(self, value, key:str="name"):
+        """
+        Finds the id of a category by the value of one of its attributes.
+
+        Args:
+            value: The value to look up, e.g. a species name or an eBird code.
+            key (str): The category attribute to match on, e.g. "name" or "Species eBird Code".
+
+        Returns:
+            category_id (int): The id of the matching category, or None if there is no match.
+        """
+        category = self.get_category(value, key)
+        return category["id"] if category is not None else None
   
     def add_annotation(self, anno_id:int, sound_id:int, category_id:int, category:str, t_min:float, t_max:float, supercategory:Optional[str]=None, f_min:Optional[float]=None, f_max:Optional[float]=None, ismultilabel:Optional[bool]=None):  
         """  
@@ -181,7 +309,7 @@ class AnnotationCreator:
             ValueError: If any of the provided values are out of valid range, or if the   
                         time/frequency constraints are violated.  
         """
-        sound_dict = self.data['sounds'][sound_id]
+        sound_dict = self._sounds_by_id[sound_id]
         
         if t_min < 0:  
             raise ValueError("t_min must be a positive value.")  
@@ -215,87 +343,215 @@ class AnnotationCreator:
         }  
         self.data['annotations'].append(annotation)  
 
-    def convert_crowsetta_bbox_annotations(self, crowsetta_annotations:list):
-        """  
-        Adds annotations from Crowsetta to the dataset.  
-  
-        Args:  
-            crowsetta_annotations (list): A list of annotations in Crowsetta format.
+    def add_annotations_bulk(self, annotations_df:pd.DataFrame):
         """
-        # Add categories 
-        unique_labels = set()   
-        for annot in crowsetta_annotations:  
-            for bbox in annot.bboxes:  
-                unique_labels.add(bbox.label) 
+        Adds many annotation entries to the dataset at once. The same checks as in add_annotation are
+        evaluated as array operations against the sounds table, and the rows that fail them are returned
+        instead of being added.
+
+        Args:
+            annotations_df (DataFrame): A pandas DataFrame with one annotation per row. It must contain the
+                columns sound_id, category_id, t_min and t_max, and may contain anno_id, category, supercategory,
+                f_min, f_max and ismultilabel. Missing anno_ids are numbered after the existing annotations and
+                missing category names are taken from the categories of the dataset.
+
+        Returns:
+            rejected (DataFrame): The rows that were not added, with a "reason" column explaining why.
+        """
+        df = annotations_df.reset_index(drop=True)
+        n_rows = len(df)
+
+        sound_ids = pd.Index([sound["id"] for sound in self.data["sounds"]])
+        durations = np.array([sound["duration"] for sound in self.data["sounds"]] + [np.nan], dtype=float)
+        sample_rates = np.array([sound["sample_rate"] for sound in self.data["sounds"]] + [np.nan], dtype=float)
+        positions = sound_ids.get_indexer(df["sound_id"])
+        duration = durations[positions]
+        nyquist = sample_rates[positions] / 2
+
+        t_min = pd.to_numeric(df["t_min"], errors="coerce").to_numpy(dtype=float)
+        t_max = pd.to_numeric(df["t_max"], errors="coerce").to_numpy(dtype=float)
+        f_min = pd.to_numeric(df["f_min"], errors="coerce").to_numpy(dtype=float) if "f_min" in df else np.full(n_rows, np.nan)
+        f_max = pd.to_numeric(df["f_max"], errors="coerce").to_numpy(dtype=float) if "f_max" in df else np.full(n_rows, np.nan)
+        has_frequencies = ~np.isnan(f_min) & ~np.isnan(f_max)
+
+        with np.errstate(invalid="ignore"):
+            checks = [
+                (positions < 0, "sound_id does not match any sound."),
+                (np.isnan(t_min) | np.isnan(t_max), "t_min and t_max must be numeric values."),
+                (t_min < 0, "t_min must be a positive value."),
+                (t_max < 0, "t_max must be a positive value."),
+                (t_max < t_min, "t_max must be greater than t_min."),
+                (t_max > np.round(duration, 1), "t_max must be less than the duration of the sound."),
+                (has_frequencies & (f_min < 0), "f_min must be a positive value."),
+                (has_frequencies & (f_max < 0), "f_max must be a positive value."),
+                (has_frequencies & (f_max < f_min), "f_max must be greater than f_min."),
+                (has_frequencies & (f_max > nyquist), "f_max must be less than half the sample rate of the sound."),
+            ]
+        reasons = np.select([mask for mask, _ in checks], [reason for _, reason in checks], default="")
+        accepted = reasons == ""
+
+        rejected = annotations_df.iloc[np.flatnonzero(~accepted)].copy()
+        rejected["reason"] = reasons[~accepted]
+
+        df = df[accepted]
+        n_accepted = len(df)
+        if "anno_id" in df:
+            anno_ids = _column_values(df, "anno_id", int)
+        else:
+            first_id = len(self.data["annotations"])
+            anno_ids = list(range(first_id, first_id + n_accepted))
+        category_ids = _column_values(df, "category_id", int)
+        if "category" in df:
+            categories = _column_values(df, "category")
+        else:
+            names = {category["id"]: category["name"] for category in self.data["categories"]}
+            categories = [names.get(category_id) for category_id in category_ids]
 
-        categories_df = pd.DataFrame(list(unique_labels), columns=['label'])
+        columns = zip(
+            anno_ids,
+            _column_values(df, "sound_id", int),
+            category_ids,
+            categories,
+            _column_values(df, "supercategory"),
+            t_min[accepted].tolist(),
+            t_max[accepted].tolist(),
+            _column_values(df, "f_min", float),
+            _column_values(df, "f_max", float),
+            _column_values(df, "ismultilabel", bool),
+        )
+        self.data["annotations"].extend(
+            {
+                "anno_id": anno_id,
+                "sound_id": sound_id,
+                "category_id": category_id,
+                "category": category,
+                "supercategory": supercategory,
+                "t_min": t_min_value,
+                "t_max": t_max_value,
+                "f_min": f_min_value,
+                "f_max": f_max_value,
+                "ismultilabel": ismultilabel,
+            }
+            for anno_id, sound_id, category_id, category, supercategory, t_min_value, t_max_value, f_min_value, f_max_value, ismultilabel in columns
+        )
+        return rejected
+
+    def _convert_crowsetta_annotations(self, crowsetta_annotations, events, max_workers:int=None):
+        """
+        Adds the sounds, categories and annotations of crowsetta annotations. The annotations are consumed as
+        they arrive, e.g. from crowsetta_annotations.iter_annotations: the header of every sound is probed in a
+        thread pool right away and its events are collected into columns, which are added at the end with
+        add_annotations_bulk once the categories are known.
+
+        Args:
+            crowsetta_annotations (iterable): Annotations in crowsetta format, one per sound.
+            events (callable): Returns the (label, onset, offset, low_freq, high_freq) of the events of an annotation.
+            max_workers (Optional[int]): The number of audio headers probed at the same time.
+
+        Returns:
+            rejected (DataFrame): The events that were not added, with a "reason" column explaining why.
+        """
+        columns = {"anno_id": [], "sound_id": [], "category": [], "t_min": [], "t_max": [], "f_min": [], "f_max": []}
+        probed = []
+        with ThreadPoolExecutor(max_workers=max_workers or min(32, (os.cpu_count() or 1) * 4)) as executor:
+            for sound_id, annotation in enumerate(crowsetta_annotations):
+                probed.append((annotation.notated_path, executor.submit(self._get_duration_and_sample_rate, annotation.notated_path)))
+                for anno_id, (label, onset, offset, low_freq, high_freq) in enumerate(events(annotation)):
+                    columns["anno_id"].append(anno_id)
+                    columns["sound_id"].append(sound_id)
+                    columns["category"].append(label)
+                    columns["t_min"].append(float(onset))
+                    columns["t_max"].append(float(offset))
+                    columns["f_min"].append(low_freq)
+                    columns["f_max"].append(high_freq)
+
+            # Add sounds
+            for sound_id, (notated_path, future) in enumerate(probed):
+                duration, sample_rate = future.result()
+                self.add_sound(id=sound_id, 
+                               file_name_path=notated_path.name, 
+                               duration=duration, 
+                               sample_rate=sample_rate,
+                               latitude=None,
+                               longitude=None)
+
+        # Add categories 
+        categories_df = pd.DataFrame(list(set(columns["category"])), columns=['label'])
         self.add_categories(categories_df)
+        category_ids = {category["label"]: category["id"] for category in self.data["categories"]}
+
+        # Add annotations
+        annotations_df = pd.DataFrame(columns)
+        annotations_df["category_id"] = annotations_df["category"].map(category_ids)
+        rejected = self.add_annotations_bulk(annotations_df)
+        if not rejected.empty:
+            print(f"Skipped {len(rejected)} of {len(annotations_df)} annotations:")
+            for reason, count in rejected["reason"].value_counts().items():
+                print(f"  {count} x {reason}")
+        return rejected
 
-        # Add sounds 
-        for sound_id, annotation in enumerate(crowsetta_annotations):
-            duration, sample_rate = self._get_duration_and_sample_rate(annotation.notated_path)
-            self.add_sound(id=sound_id, 
-                           file_name_path=annotation.notated_path.name, 
-                           duration=duration, 
-                           sample_rate=sample_rate,
-                           latitude=None,
-                           longitude=None)
-            # Add annotations
-            for anno_id, bbox in enumerate(annotation.bboxes):
-                category_id = [category for category in self.data["categories"] if category["label"] == bbox.label][0]["id"]
-                self.add_annotation(anno_id=anno_id, 
-                                    sound_id=sound_id, 
-                                    category_id=category_id, 
-                                    category=bbox.label, 
-                                    t_min=float(bbox.onset), 
-                                    t_max=float(bbox.offset), 
-                                    f_min=float(bbox.low_freq), 
-                                    f_max=float(bbox.high_freq))
-
-    def convert_crowsetta_seq_annotations(self, crowsetta_annotations:list):
+    def convert_crowsetta_bbox_annotations(self, crowsetta_annotations, max_workers:int=None):
         """  
         Adds annotations from Crowsetta to the dataset.  
   
         Args:  
-            crowsetta_annotations (list): A list of annotations in Crowsetta format.
+            crowsetta_annotations (iterable): Annotations in Crowsetta format with bounding boxes.
+            max_workers (Optional[int]): The number of audio headers probed at the same time.
+
+        Returns:
+            rejected (DataFrame): The annotations that were not added, with a "reason" column explaining why.
         """
-        # Add categories 
-        unique_labels = set()   
-        for annot in crowsetta_annotations:  
-            for segment in annot.seq.segments:  
-                unique_labels.add(segment.label) 
+        events = lambda annotation: ((bbox.label, bbox.onset, bbox.offset, float(bbox.low_freq), float(bbox.high_freq)) for bbox in annotation.bboxes)
+        return self._convert_crowsetta_annotations(crowsetta_annotations, events, max_workers)
 
-        categories_df = pd.DataFrame(list(unique_labels), columns=['label'])
-        self.add_categories(categories_df)
+    def convert_crowsetta_seq_annotations(self, crowsetta_annotations, max_workers:int=None):
+        """  
+        Adds annotations from Crowsetta to the dataset.  
+  
+        Args:  
+            crowsetta_annotations (iterable): Annotations in Crowsetta format with sequences of segments.
+            max_workers (Optional[int]): The number of audio headers probed at the same time.
 
-        # Add sounds 
-        for sound_id, annotation in enumerate(crowsetta_annotations):
-            duration, sample_rate = self._get_duration_and_sample_rate(annotation.notated_path)
-            self.add_sound(id=sound_id, 
-                           file_name_path=annotation.notated_path.name, 
-                           duration=duration, 
-                           sample_rate=sample_rate,
-                           latitude=None,
-                           longitude=None)
-            # Add annotations
-            for anno_id, segment in enumerate(annotation.seq.segments):
-                category_id = [category for category in self.data["categories"] if category["label"] == segment.label][0]["id"]
-                self.add_annotation(anno_id=anno_id, 
-                                    sound_id=sound_id, 
-                                    category_id=category_id, 
-                                    category=segment.label, 
-                                    t_min=float(segment.onset_s), 
-                                    t_max=float(segment.offset_s))
+        Returns:
+            rejected (DataFrame): The annotations that were not added, with a "reason" column explaining why.
+        """
+        events = lambda annotation: ((segment.label, segment.onset_s, segment.offset_s, None, None) for segment in annotation.seq.segments)
+        return self._convert_crowsetta_annotations(crowsetta_annotations, events, max_workers)
   
     def save_to_file(self, filename):  
         """  
-        Saves the current dataset to a JSON file.  
+        Saves the current dataset to a JSON file, with a sidecar offset index for LazyAnnotationReader.
     
         Args:  
             filename (str): The name of the file to save the dataset to.  
         """
-        with open(filename, 'w') as f:  
-            json.dump(self.data, f, indent=4)  
+        write_dataset_json(self.data, filename)
+
+    def save_to_columnar(self, directory:str):
+        """
+        Saves the current dataset in the memory-mappable columnar format of columnar_format.py.
+
+        Args:
+            directory (str): The directory to write the column files to.
+        """
+        save_columnar(self.data, directory)
+
+    @classmethod
+    def load_from_columnar(cls, directory:str):
+        """
+        Creates an AnnotationCreator from a dataset saved with save_to_columnar.
+
+        Args:
+            directory (str): The directory of the column files.
+
+        Returns:
+            creator (AnnotationCreator): A creator holding the loaded dataset, with its lookup indexes built.
+        """
+        creator = cls()
+        creator.data = ColumnarDataset(directory, mmap_mode=None).to_dict()
+        for sound in creator.data["sounds"]:
+            creator._index_sound(sound)
+        return creator
 
 if __name__ == "__main__":
 
@@ -0,0 +1,262 @@
+import numpy as np
+import argparse
+import json
+import os
+
+FORMAT_VERSION = 1
+TABLES = ["categories", "sounds", "annotations"]
+
+
+def _column_kind(values:list):
+    """Returns the storage kind of a column: "int", "float", "number" (ints and floats mixed), "bool", "string", "json" or "null"."""
+    types = {type(value) for value in values if value is not None}
+    if not types:
+        return "null"
+    if types == {bool}:
+        return "bool"
+    if types == {int}:
+        return "int"
+    if types == {float}:
+        return "float"
+    if types == {int, float}:
+        return "number"
+    if types == {str}:
+        return "string"
+    return "json"
+
+
+def _dictionary_encode(values:list):
+    """Encodes values as int32 codes into a list of distinct values. Missing values get the code -1."""
+    index = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+        else:
+            codes[i] = index.setdefault(value, len(index))
+    return codes, list(index)
+
+
+def save_columnar(data:dict, directory:str):
+    """
+    Writes a dataset in the annotations.json schema as a directory of column files. Every column of the
+    categories, sounds and annotations tables is stored as a .npy file that can be memory-mapped: numbers
+    and booleans as native arrays, strings as dictionary codes with their distinct values in a JSON file.
+    Missing values, missing keys and the int/float distinction of mixed numeric columns are stored as masks,
+    so load_columnar gives back exactly the same records. The info section and the layout are kept in schema.json.
+
+    Args:
+        data (dict): The dataset, with the keys info, categories, sounds and annotations.
+        directory (str): The directory to write to. It is created if needed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    schema = {"version": FORMAT_VERSION, "info": data.get("info", {}), "tables": {}}
+
+    for table in TABLES:
+        records = data.get(table, [])
+        column_names = list(dict.fromkeys(key for record in records for key in record))
+        columns = {}
+        for name in column_names:
+            present = np.fromiter((name in record for record in records), dtype=bool, count=len(records))
+            values = [record.get(name) for record in records]
+            kind = _column_kind(values)
+            column = {"kind": kind, "file": f"{table}.{name}.npy"}
+            nulls = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+
+            if kind in ("int", "float", "number", "bool"):
+                dtype = {"int": np.int64, "float": np.float64, "number": np.float64, "bool": np.bool_}[kind]
+                filler = 0 if kind != "bool" else False
+                array = np.array([filler if value is None else value for value in values], dtype=dtype)
+                if kind == "number":
+                    np.save(os.path.join(directory, f"{table}.{name}.is_int.npy"), np.fromiter((type(value) is int for value in values), dtype=bool, count=len(values)))
+                    column["int_mask_file"] = f"{table}.{name}.is_int.npy"
+            elif kind in ("string", "json"):
+                encoded = values if kind == "string" else [None if value is None else json.dumps(value) for value in values]
+                array, distinct = _dictionary_encode(encoded)
+                with open(os.path.join(directory, f"{table}.{name}.values.json"), "w", encoding="utf-8") as f:
+                    json.dump(distinct, f)
+                column["values_file"] = f"{table}.{name}.values.json"
+            else:
+                array = np.zeros(len(values), dtype=np.int8)
+            np.save(os.path.join(directory, column["file"]), array)
+
+            if nulls.any() and kind != "null":
+                np.save(os.path.join(directory, f"{table}.{name}.null.npy"), nulls)
+                column["null_file"] = f"{table}.{name}.null.npy"
+            if not present.all():
+                np.save(os.path.join(directory, f"{table}.{name}.present.npy"), present)
+                column["present_file"] = f"{table}.{name}.present.npy"
+            columns[name] = column
+        schema["tables"][table] = {"num_rows": len(records), "columns": columns}
+
+    with open(os.path.join(directory, "schema.json"), "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=4)
+
+
+class ColumnarDataset:
+    """
+    Read access to a dataset written with save_columnar. Columns are memory-mapped and only the requested
+    ones are read, so a training job can load t_min, t_max and category_id of millions of annotations
+    without parsing anything else.
+
+    Attributes:
+        directory (str): The directory of the dataset.
+        info (dict): The info section of the dataset.
+        mmap_mode (Optional[str]): The mmap_mode passed to numpy.load, or None to read the columns into memory.
+    """
+
+    def __init__(self, directory:str, mmap_mode:str="r"):
+        self.directory = directory
+        self.mmap_mode = mmap_mode
+        with open(os.path.join(directory, "schema.json"), "r", encoding="utf-8") as f:
+            self.schema = json.load(f)
+        if self.schema.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format version {self.schema.get('version')} in {directory}.")
+        self.info = self.schema["info"]
+        self._values = {}
+
+    def num_rows(self, table:str):
+        """Returns the number of records of a table."""
+        return self.schema["tables"][table]["num_rows"]
+
+    def column_names(self, table:str):
+        """Returns the column names of a table."""
+        return list(self.schema["tables"][table]["columns"])
+
+    def _load(self, file_name:str):
+        return np.load(os.path.join(self.directory, file_name), mmap_mode=self.mmap_mode)
+
+    def _distinct_values(self, column:dict):
+        if column["values_file"] not in self._values:
+            with open(os.path.join(self.directory, column["values_file"]), "r", encoding="utf-8") as f:
+                values = json.load(f)
+            if column["kind"] == "json":
+                values = [json.loads(value) for value in values]
+            self._values[column["values_file"]] = np.array(values + [None], dtype=object)
+        return self._values[column["values_file"]]
+
+    def null_mask(self, table:str, name:str):
+        """Returns a boolean array that is True where a column has no value, or None if it has no missing values."""
+        column = self.schema["tables"][table]["columns"][name]
+        if column["kind"] == "null":
+            return np.ones(self.num_rows(table), dtype=bool)
+        return self._load(column["null_file"]) if "null_file" in column else None
+
+    def codes(self, table:str, name:str):
+        """
+        Returns the dictionary codes and distinct values of a string column without decoding it.
+        Missing values have the code -1.
+        """
+        column = self.schema["tables"][table]["columns"][name]
+        if "values_file" not in column:
+            raise ValueError(f"Column {table}.{name} is not dictionary-encoded.")
+        return self._load(column["file"]), self._distinct_values(column)[:-1]
+
+    def column(self, table:str, name:str):
+        """
+        Returns one column as a NumPy array. Numeric and boolean columns are memory-mapped arrays, with
+        missing values as NaN for floats and as a masked array for ints and booleans. String and JSON
+        columns are decoded into object arrays with None for missing values.
+        """
+        column = self.schema["tables"][table]["columns"][name]
+        kind = column["kind"]
+        if kind == "null":
+            return np.full(self.num_rows(table), None, dtype=object)
+        array = self._load(column["file"])
+        if kind in ("string", "json"):
+            return self._distinct_values(column)[array]
+        nulls = self.null_mask(table, name)
+        if nulls is None:
+            return array
+        if kind in ("float", "number"):
+            return np.where(nulls, np.nan, array)
+        return np.ma.MaskedArray(array, mask=nulls)
+
+    def columns(self, table:str, names:list=None):
+        """Returns the given columns of a table, or all of them, as a dictionary of arrays."""
+        return {name: self.column(table, name) for name in (names or self.column_names(table))}
+
+    def records(self, table:str, names:list=None):
+        """Returns the records of a table as a list of dictionaries, exactly as they were saved."""
+        table_schema = self.schema["tables"][table]
+        names = names or list(table_schema["columns"])
+        n_rows = table_schema["num_rows"]
+        value_lists = {}
+        present_masks = {}
+        for name in names:
+            column = table_schema["columns"][name]
+            kind = column["kind"]
+            if kind == "null":
+                values = [None] * n_rows
+            elif kind in ("string", "json"):
+                values = self.column(table, name).tolist()
+            else:
+                values = self._load(column["file"]).tolist()
+                if kind == "number":
+                    is_int = self._load(column["int_mask_file"]).tolist()
+                    values = [int(value) if integer else value for value, integer in zip(values, is_int)]
+                if "null_file" in column:
+                    values = [None if null else value for value, null in zip(values, self._load(column["null_file"]).tolist())]
+            value_lists[name] = values
+            if "present_file" in column:
+                present_masks[name] = self._load(column["present_file"]).tolist()
+
+        if not present_masks:
+            return [dict(zip(names, row)) for row in zip(*(value_lists[name] for name in names))] if names else [{} for _ in range(n_rows)]
+        records = []
+        for i in range(n_rows):
+            records.append({name: value_lists[name][i] for name in names if name not in present_masks or present_masks[name][i]})
+        return records
+
+    def to_dict(self):
+        """Returns the whole dataset in the annotations.json schema."""
+        return {"info": self.info, **{table: self.records(table) for table in TABLES}}
+
+
+def load_columnar(directory:str, tables:list=None, columns:list=None, mmap_mode:str="r"):
+    """
+    Loads columns of a dataset written with save_columnar.
+
+    Args:
+        directory (str): The directory of the dataset.
+        tables (Optional[list]): The tables to load. Defaults to all of them.
+        columns (Optional[list]): The columns to load from every table, e.g. ["sound_id", "t_min", "t_max", "category_id"].
+            Columns a table does not have are skipped. Defaults to all columns.
+        mmap_mode (Optional[str]): The mmap_mode passed to numpy.load.
+
+    Returns:
+        data (dict): Maps every table name to a dictionary of column arrays.
+    """
+    dataset = ColumnarDataset(directory, mmap_mode)
+    data = {}
+    for table in tables or TABLES:
+        names = dataset.column_names(table)
+        data[table] = dataset.columns(table, [name for name in names if name in columns] if columns else names)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert datasets between annotations.json and the columnar format.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Convert an annotations.json file to a columnar directory.")
+    export_parser.add_argument("json_path", help="The annotations.json file to convert.")
+    export_parser.add_argument("directory", help="The columnar directory to write.")
+    import_parser = subparsers.add_parser("import", help="Convert a columnar directory back to an annotations.json file.")
+    import_parser.add_argument("directory", help="The columnar directory to read.")
+    import_parser.add_argument("json_path", help="The annotations.json file to write.")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        with open(args.json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        save_columnar(data, args.directory)
+        print(f"✅ Wrote {len(data['annotations'])} annotations to {args.directory}")
+    else:
+        data = ColumnarDataset(args.directory, mmap_mode=None).to_dict()
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        print(f"✅ Wrote {len(data['annotations'])} annotations to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,63 @@
+from json_stream import iter_json_array, load_json_section, JsonStreamWriter
+from taxonomy_resolver import TaxonomyResolver, INATURALIST_SEARCH_URL
+from taxonomy_index import TaxonomyIndex
+from taxonomy_cache import TaxonomyCache
+from columnar_format import save_columnar
+from annotation_index import OffsetIndexBuilder, write_dataset_json
+import numpy as np
+import argparse
 import json
 import os
 import requests
 import time
-import csv
 
 def load_or_create_cache(cache_file):
-    name_cache = {}
-
-    if os.path.exists(cache_file):
-        with open(cache_file, newline='', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader, None)  # skip header
-            for row in reader:
-                if len(row) == 2:
-                    original, standard = row
-                    name_cache[original] = standard
-    else:
-        with open(cache_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["original_name", "standard_name"])
+    """Load the name cache once, creating the file if it does not exist."""
+    return TaxonomyCache(cache_file)
 
-    return name_cache
+def resolve_species_names(names, name_cache, resolver=None, taxonomy_index=None):
+    """
+    Resolve every name that is not cached yet and store the results in the cache. Names are first
+    looked up offline in the taxonomy index (by default built from the cache itself), and only the
+    remaining misses, including approximate matches the index does not trust, are queried in one
+    concurrent batch. Names that cannot be resolved fall back to
+    themselves, as in get_standard_species_name.
+    """
+    missing = [name for name in dict.fromkeys(names) if name not in name_cache]
+    if not missing:
+        return
+    if taxonomy_index is None:
+        taxonomy_index = TaxonomyIndex.from_name_cache(name_cache)
 
-def save_to_cache(name_cache, cache_file, original, standard):
-    """Append a new entry to the CSV and update in-memory cache."""
-    # Verify if the original name is already in the cache
-    if original in name_cache:
+    offline_misses = []
+    for name in missing:
+        match = taxonomy_index.resolve(name)
+        if match is None:
+            offline_misses.append(name)
+            continue
+        standard_name, approximate = match
+        # Approximate matches are cached as fallbacks, so they expire and are resolved online later
+        name_cache.put(name, standard_name, source="taxonomy_index", fallback=approximate)
+    print(taxonomy_index.report())
+    if not offline_misses:
+        name_cache.flush()
         return
-    # Append to the cache
-    name_cache[original] = standard
-    with open(cache_file, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([original, standard])
 
-def get_standard_species_name(name, name_cache, cache_file, language='en', max_retries=3, delay=2.0):
+    print(f"Resolving {len(offline_misses)} uncached species names online...")
+    resolved = (resolver or TaxonomyResolver()).resolve(offline_misses)
+    for name in offline_misses:
+        standard_name = resolved.get(name)
+        if standard_name is None:
+            print(f"Fallback: using original name for '{name}'")
+            name_cache.put(name, name, source="fallback", fallback=True)
+        else:
+            name_cache.put(name, standard_name, source="inaturalist")
+    name_cache.flush()
+
+def get_standard_species_name(name, name_cache, language='en', max_retries=3, delay=2.0, url=INATURALIST_SEARCH_URL):
     if name in name_cache:
         return name_cache[name]
 
-    url = "https://api.inaturalist.org/v1/search"
     params = {
         'q': name,
         'sources': 'taxa',
@@ -54,7 +74,8 @@ def get_standard_species_name(name, name_cache, cache_file, language='en', max_r
                 if data.get("results"):
                     standard_name = data["results"][0]["record"]["name"]
                     print(f"Standardized '{name}' → '{standard_name}'")
-                    save_to_cache(name_cache, cache_file, name, standard_name)
+                    name_cache.put(name, standard_name, source="inaturalist")
+                    name_cache.flush()
                     return standard_name
                 else:
                     print(f"No match found for '{name}' (attempt {attempt+1})")
@@ -74,114 +95,259 @@ def get_standard_species_name(name, name_cache, cache_file, language='en', max_r
         time.sleep(delay * (attempt + 1))
 
     print(f"Fallback: using original name for '{name}'")
-    save_to_cache(name_cache, cache_file, name, name)
+    name_cache.put(name, name, source="fallback", fallback=True)
+    name_cache.flush()
     return name
 
-def combine_annotation_jsons(json_paths, output_path, cache_file="cache.csv"):
+def new_combined_info():
+    return {
+        "title": "Combined Dataset: ",
+        "license": [],
+        "publication_date": [],
+        "description": [],
+        "creators": [],
+        "version": [],
+        "url": [],
+    }
+
+def merge_info(combined_info, info, is_last):
+    """Append the info fields of one dataset to the combined info."""
+    if not is_last:
+        combined_info["title"] += info["title"] + "," + " "
+    else:
+        combined_info["title"] += info["title"]
+    combined_info["license"].append(info["license"])
+    combined_info["publication_date"].append(info["publication_date"])
+    combined_info["description"].append(info["description"])
+    combined_info["creators"].append(info["creators"])
+    combined_info["version"].append(info["version"])
+    combined_info["url"].append(info["url"])
+
+def normalize_categories(categories, combined_categories, standard_name_to_id, name_cache):
+    """Map the categories of one dataset to standardized combined ids, adding new standard names to combined_categories."""
+    local_category_map = {}
+    for category in categories:
+        original_name = category["name"]
+        standard_name = get_standard_species_name(original_name, name_cache)
+        if standard_name not in standard_name_to_id:
+            standard_name_to_id[standard_name] = len(combined_categories)
+            combined_categories.append({
+                "id": standard_name_to_id[standard_name],
+                "name": standard_name
+            })
+
+        local_category_map[original_name] = standard_name_to_id[standard_name]
+    return local_category_map
+
+def remap_annotations(annotations, old_sound_ids, new_sound_ids, local_category_map, category_names, annotation_id_offset):
+    """
+    Remap the sound, category and annotation ids of one dataset's annotations in place. The id maps
+    are applied to whole arrays at once, so the only per-annotation work left is writing the results back.
+
+    Args:
+        annotations (list): The annotations of the dataset.
+        old_sound_ids (np.ndarray): The sound ids of the dataset.
+        new_sound_ids (np.ndarray): The combined sound ids, aligned with old_sound_ids.
+        local_category_map (dict): Maps the original category names of the dataset to combined category ids.
+        category_names (dict): Maps combined category ids to standardized names.
+        annotation_id_offset (int): The offset added to the annotation ids.
+    """
+    if not annotations:
+        return
+    n_annotations = len(annotations)
+
+    # Sound ids: look the annotation sound ids up in the sorted original ids
+    order = np.argsort(old_sound_ids, kind="stable")
+    sorted_old_ids = old_sound_ids[order]
+    anno_sound_ids = np.fromiter((annotation["sound_id"] for annotation in annotations), dtype=np.int64, count=n_annotations)
+    positions = np.clip(np.searchsorted(sorted_old_ids, anno_sound_ids), 0, max(len(sorted_old_ids) - 1, 0))
+    if len(sorted_old_ids) == 0 or not np.array_equal(sorted_old_ids[positions], anno_sound_ids):
+        raise KeyError("Some annotations reference sound ids that are not in the dataset.")
+    remapped_sound_ids = new_sound_ids[order][positions]
+
+    # Categories: map every distinct original name once and broadcast it back
+    name_codes = {}
+    inverse = np.fromiter((name_codes.setdefault(annotation["category"], len(name_codes)) for annotation in annotations), dtype=np.int64, count=n_annotations)
+    unique_ids = np.array([local_category_map[name] for name in name_codes], dtype=np.int64)
+    remapped_category_ids = unique_ids[inverse]
+
+    anno_ids = np.fromiter((annotation["anno_id"] for annotation in annotations), dtype=np.int64, count=n_annotations) + annotation_id_offset
+
+    for annotation, anno_id, sound_id, category_id in zip(annotations, anno_ids.tolist(), remapped_sound_ids.tolist(), remapped_category_ids.tolist()):
+        annotation["anno_id"] = anno_id
+        annotation["sound_id"] = sound_id
+        annotation["category_id"] = category_id
+        annotation["category"] = category_names[category_id]
+
+def combine_annotation_jsons(json_paths, output_path, cache_file="cache.csv", streaming=False, resolver=None, taxonomy_index=None):
+
+    if streaming:
+        return combine_annotation_jsons_streaming(json_paths, output_path, cache_file, resolver, taxonomy_index)
+
+    # Normalize the category names of all datasets at once using iNaturalist
+    name_cache = load_or_create_cache(cache_file)
+    all_category_names = [category["name"] for json_path in json_paths for category in load_json_section(json_path, "categories") or []]
+    resolve_species_names(all_category_names, name_cache, resolver, taxonomy_index)
 
     combined_data = {
-        "info": {
-            "title": "Combined Dataset: ",
-            "license": [],
-            "publication_date": [],
-            "description": [],
-            "creators": [],
-            "version": [],
-            "url": [],
-        },
+        "info": new_combined_info(),
         "categories": [],
         "sounds": [],
         "annotations": []
     }
 
-    category_map = {}  # maps original name -> standardized id
     standard_name_to_id = {}  # maps standardized scientific name -> id
+    category_names = {}  # maps id -> standardized scientific name
     sound_id_offset = 0
     annotation_id_offset = 0
-    next_category_id = 0
 
     for json_path in json_paths:
         with open(json_path, "r", encoding="utf-8") as file:
             data = json.load(file)
 
         # Merge info fields
-        if json_path != json_paths[-1]:
-            combined_data["info"]["title"] += data["info"]["title"] + "," + " "
-        else:
-            combined_data["info"]["title"] += data["info"]["title"]
-        combined_data["info"]["license"].append(data["info"]["license"])
-        combined_data["info"]["publication_date"].append(data["info"]["publication_date"])
-        combined_data["info"]["description"].append(data["info"]["description"])
-        combined_data["info"]["creators"].append(data["info"]["creators"])
-        combined_data["info"]["version"].append(data["info"]["version"])
-        combined_data["info"]["url"].append(data["info"]["url"])
-
-        # Normalize categories using iNaturalist
-        name_cache = load_or_create_cache(cache_file)
-        local_category_map = {}
-        for category in data["categories"]:
-            original_name = category["name"]
-            standard_name = get_standard_species_name(original_name, name_cache, cache_file)
-            if standard_name not in standard_name_to_id:
-                standard_name_to_id[standard_name] = next_category_id
-                combined_data["categories"].append({
-                    "id": next_category_id,
-                    "name": standard_name
-                })
-                next_category_id += 1
-
-            local_category_map[original_name] = standard_name_to_id[standard_name]
+        merge_info(combined_data["info"], data["info"], json_path == json_paths[-1])
+
+        # Map categories to their standardized names
+        local_category_map = normalize_categories(data["categories"], combined_data["categories"], standard_name_to_id, name_cache)
+        for category in combined_data["categories"][len(category_names):]:
+            category_names[category["id"]] = category["name"]
 
         # Merge sounds and update IDs
-        sound_id_map = {}
-        for sound in data["sounds"]:
-            new_sound_id = sound_id_offset
-            sound_id_map[sound["id"]] = new_sound_id
+        sounds = data["sounds"]
+        old_sound_ids = np.fromiter((sound["id"] for sound in sounds), dtype=np.int64, count=len(sounds))
+        new_sound_ids = np.arange(sound_id_offset, sound_id_offset + len(sounds), dtype=np.int64)
+        for sound, new_sound_id in zip(sounds, new_sound_ids.tolist()):
             sound["id"] = new_sound_id
-            combined_data["sounds"].append(sound)
-            sound_id_offset += 1
+        combined_data["sounds"].extend(sounds)
+        sound_id_offset += len(sounds)
 
         # Merge annotations with updated IDs
-        for annotation in data["annotations"]:
-            annotation["anno_id"] += annotation_id_offset
-            annotation["sound_id"] = sound_id_map[annotation["sound_id"]]
-
-            original_cat_name = annotation["category"]
-            standard_id = local_category_map[original_cat_name]
-            annotation["category_id"] = standard_id
-            annotation["category"] = [c["name"] for c in combined_data["categories"] if c["id"] == standard_id][0]
-
-            combined_data["annotations"].append(annotation)
+        remap_annotations(data["annotations"], old_sound_ids, new_sound_ids, local_category_map, category_names, annotation_id_offset)
+        combined_data["annotations"].extend(data["annotations"])
 
         annotation_id_offset += len(data["annotations"])
-        time.sleep(1)  # to avoid hitting API rate limits
 
     # Save merged JSON
+    write_dataset_json(combined_data, output_path)
+
+    name_cache.compact()
+
+def combine_annotation_jsons_streaming(json_paths, output_path, cache_file="cache.csv", resolver=None, taxonomy_index=None):
+    """
+    Same as combine_annotation_jsons, but the sounds and annotations of every dataset are read
+    incrementally and written to the output as they are remapped, so peak memory does not grow
+    with the number or size of the datasets. Only the info and categories sections, and a map of
+    old to new sound ids per dataset, are kept in memory.
+    """
+    combined_info = new_combined_info()
+    combined_categories = []
+    standard_name_to_id = {}
+    local_category_maps = []
+
+    dataset_categories = []
+    for json_path in json_paths:
+        merge_info(combined_info, load_json_section(json_path, "info"), json_path == json_paths[-1])
+        dataset_categories.append(list(iter_json_array(json_path, "categories")))
+
+    name_cache = load_or_create_cache(cache_file)
+    resolve_species_names([category["name"] for categories in dataset_categories for category in categories], name_cache, resolver, taxonomy_index)
+    for categories in dataset_categories:
+        local_category_maps.append(normalize_categories(categories, combined_categories, standard_name_to_id, name_cache))
+
+    category_names = {category["id"]: category["name"] for category in combined_categories}
+
+    index = OffsetIndexBuilder()
     with open(output_path, "w", encoding="utf-8") as out_file:
-        json.dump(combined_data, out_file, indent=4)
-
-
-# Lista de archivos JSON a combinar
-dataset_names = [
-    "Enabirds",
-    "Colombia_Costa_Rica_Birds", 
-    "Hawaii_Birds",
-    "Southern_Sierra_Nevada_Birds",
-    "Southwestern_Amazon_Basin_Soundscape", 
-    "Western_United_States_Soundscapes"
-    ]
-
-json_files = []
-filename = ""
-for dataset in dataset_names:
-    json_files.append(os.path.join("data", dataset, "annotations.json"))
-    filename += f"{dataset}_"
-    
-# Delete last underscore
-if filename.endswith("_"):
-    filename = filename[:-1]
-
-output_path = os.path.join("data", "combined_datasets", f"{filename}.json")
-
-combine_annotation_jsons(json_files, output_path)
-print(f"✅ Combined dataset json saved in {output_path}")
+        writer = JsonStreamWriter(out_file)
+        index.add("info", combined_info, *writer.write_value("info", combined_info))
+        writer.begin_array("categories")
+        for category in combined_categories:
+            index.add("categories", category, *writer.write_item(category))
+        writer.end_array()
+
+        # Merge sounds and update IDs
+        sound_id_maps = []
+        sound_id_offset = 0
+        writer.begin_array("sounds")
+        for json_path in json_paths:
+            sound_id_map = {}
+            for sound in iter_json_array(json_path, "sounds"):
+                sound_id_map[sound["id"]] = sound_id_offset
+                sound["id"] = sound_id_offset
+                index.add("sounds", sound, *writer.write_item(sound))
+                sound_id_offset += 1
+            sound_id_maps.append(sound_id_map)
+        writer.end_array()
+
+        # Merge annotations with updated IDs
+        annotation_id_offset = 0
+        writer.begin_array("annotations")
+        for json_path, sound_id_map, local_category_map in zip(json_paths, sound_id_maps, local_category_maps):
+            n_annotations = 0
+            for annotation in iter_json_array(json_path, "annotations"):
+                annotation["anno_id"] += annotation_id_offset
+                annotation["sound_id"] = sound_id_map[annotation["sound_id"]]
+                standard_id = local_category_map[annotation["category"]]
+                annotation["category_id"] = standard_id
+                annotation["category"] = category_names[standard_id]
+                index.add("annotations", annotation, *writer.write_item(annotation))
+                n_annotations += 1
+            annotation_id_offset += n_annotations
+        writer.end_array()
+        writer.close()
+    index.save(output_path)
+
+    name_cache.compact()
+
+def main():
+
+    # Lista de archivos JSON a combinar
+    dataset_names = [
+        "Enabirds",
+        "Colombia_Costa_Rica_Birds", 
+        "Hawaii_Birds",
+        "Southern_Sierra_Nevada_Birds",
+        "Southwestern_Amazon_Basin_Soundscape", 
+        "Western_United_States_Soundscapes"
+        ]
+
+    parser = argparse.ArgumentParser(description="Combine the annotations of several datasets into a single JSON file.")
+    parser.add_argument("--datasets", nargs="+", default=dataset_names, help="Names of the datasets to combine.")
+    parser.add_argument("--streaming", action="store_true", help="Read and write the annotations incrementally to keep memory usage constant.")
+    parser.add_argument("--taxonomy-url", default=None, help="Taxonomy search endpoint, e.g. a local mock_taxonomy_server. Defaults to iNaturalist.")
+    parser.add_argument("--taxonomy-file", default=None, help="Taxonomy CSV (e.g. the eBird taxonomy) used to resolve names offline before querying the API.")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Maximum number of taxonomy requests in flight.")
+    parser.add_argument("--rate", type=float, default=1.0, help="Maximum number of taxonomy requests per second.")
+    parser.add_argument("--columnar", action="store_true", help="Also export the combined dataset in the memory-mappable columnar format.")
+    args = parser.parse_args()
+
+    resolver_kwargs = {"max_concurrency": args.max_concurrency, "rate": args.rate}
+    if args.taxonomy_url:
+        resolver_kwargs["url"] = args.taxonomy_url
+    resolver = TaxonomyResolver(**resolver_kwargs)
+    taxonomy_index = TaxonomyIndex.from_files(cache_file="cache.csv", taxonomy_file=args.taxonomy_file)
+
+    json_files = []
+    filename = ""
+    for dataset in args.datasets:
+        json_files.append(os.path.join("data", dataset, "annotations.json"))
+        filename += f"{dataset}_"
+        
+    # Delete last underscore
+    if filename.endswith("_"):
+        filename = filename[:-1]
+
+    output_path = os.path.join("data", "combined_datasets", f"{filename}.json")
+
+    combine_annotation_jsons(json_files, output_path, streaming=args.streaming, resolver=resolver, taxonomy_index=taxonomy_index)
+    print(f"✅ Combined dataset json saved in {output_path}")
+
+    if args.columnar:
+        columnar_path = os.path.splitext(output_path)[0] + "_columnar"
+        with open(output_path, "r", encoding="utf-8") as f:
+            save_columnar(json.load(f), columnar_path)
+        print(f"✅ Combined dataset columns saved in {columnar_path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd  
 import numpy as np
 import crowsetta
@@ -52,28 +53,109 @@ class csv_bbox:
         return crowsetta.Annotation(annot_path=self.annot_path, notated_path=self.notated_path, bboxes=bboxes)
 
 
-def get_annotations(annotations_path, format, sounds_path, annot_col=None, annot_ext="txt", sounds_ext="wav"):
+def _candidate_stems(file_name:str):
+    """Yields the name of a file with one more extension removed at a time, e.g. "a.Table.1.selections.txt", "a.Table.1.selections", ..., "a"."""
+    while True:
+        file_name, ext = os.path.splitext(file_name)
+        if not ext:
+            return
+        yield file_name
 
+
+def pair_annotation_files(annotation_paths:list, sounds_paths:list):
+    """
+    Pairs every annotation file with the sound file of the same name. An annotation file matches a sound
+    file whose stem equals its name with one or more extensions removed, so both "a.txt" and
+    "a.Table.1.selections.txt" match "a.wav". Every sound file is paired at most once.
+
+    Args:
+        annotation_paths (list): The paths of the annotation files.
+        sounds_paths (list): The paths of the sound files.
+
+    Returns:
+        pairs (list): (annotation path, sound path) tuples, in the order of annotation_paths.
+        unmatched_annotations (list): The annotation files with no sound file.
+        unmatched_sounds (list): The sound files with no annotation file.
+    """
+    sounds_by_stem = {}
+    for sound_path in sounds_paths:
+        sounds_by_stem.setdefault(pathlib.Path(sound_path).stem, sound_path)
+    pairs = []
+    unmatched_annotations = []
+    for annotation_path in annotation_paths:
+        stem = next((stem for stem in _candidate_stems(pathlib.Path(annotation_path).name) if stem in sounds_by_stem), None)
+        if stem is None:
+            unmatched_annotations.append(annotation_path)
+        else:
+            pairs.append((annotation_path, sounds_by_stem.pop(stem)))
+    paired = {sound_path for _, sound_path in pairs}
+    unmatched_sounds = [sound_path for sound_path in sounds_paths if sound_path not in paired]
+    return pairs, unmatched_annotations, unmatched_sounds
+
+
+def _transcribe(format, annotation_path, sound_path, annot_col=None):
+    """Reads one annotation file with crowsetta. Runs in a worker process."""
+    scribe = crowsetta.Transcriber(format=format)
+    if annot_col != None:
+        return scribe.from_file(annotation_path, annot_col=annot_col, audio_path=sound_path).to_annot()
+    return scribe.from_file(annotation_path, notated_path=sound_path).to_annot()
+
+
+def iter_annotations(annotations_path, format, sounds_path, annot_col=None, annot_ext="txt", sounds_ext="wav", max_workers=None, strict=False):
+    """
+    Transcribes the annotation files of a directory with crowsetta in a pool of worker processes, pairing
+    every file with its sound file by name. The annotations are yielded in the order of the sorted
+    annotation files as soon as they are transcribed, so they can be converted while the rest are read.
+
+    Args:
+        annotations_path (str): The directory of the annotation files.
+        format (str): The crowsetta format of the annotation files, e.g. "raven" or "aud-seq".
+        sounds_path (str): The directory of the sound files.
+        annot_col (Optional[str]): The column with the labels, for formats that need one.
+        annot_ext (str): The extension of the annotation files.
+        sounds_ext (str): The extension of the sound files.
+        max_workers (Optional[int]): The number of worker processes. 1 transcribes in the current process.
+            Defaults to the number of CPUs.
+        strict (bool): Raise an error if any file has no counterpart, instead of reporting and skipping it.
+
+    Yields:
+        annotation (crowsetta.Annotation): The annotation of one pair of files.
+
+    Raises:
+        ValueError: If no annotation file matches a sound file, or if strict and some files do not match.
+    """
     paths = sorted(pathlib.Path(annotations_path).glob(f'*.{annot_ext}'))
     sounds_paths = sorted(pathlib.Path(sounds_path).glob(f'*.{sounds_ext}'))
-    assert len(paths) == len(sounds_paths), "Number of annotations and sounds must be the same"
+    pairs, unmatched_annotations, unmatched_sounds = pair_annotation_files(paths, sounds_paths)
+    if unmatched_annotations or unmatched_sounds:
+        report = (f"Paired {len(pairs)} of {len(paths)} annotation files in {annotations_path} with the {len(sounds_paths)} sound files in {sounds_path}."
+                  + "".join(f"\n  no sound file for {path.name}" for path in unmatched_annotations)
+                  + "".join(f"\n  no annotation file for {path.name}" for path in unmatched_sounds))
+        if strict or not pairs:
+            raise ValueError(report)
+        print(report)
 
-    scribe = crowsetta.Transcriber(format=format)
-    annots = []
-    for i in range(len(paths)):
-        if annot_col != None:
-            annots.append(scribe.from_file(paths[i], annot_col=annot_col, audio_path=sounds_paths[i]).to_annot())
-        else:
-            annots.append(scribe.from_file(paths[i], notated_path=sounds_paths[i]).to_annot())
-    
-    return annots
+    if max_workers == 1 or len(pairs) <= 1:
+        for annotation_path, sound_path in pairs:
+            yield _transcribe(format, annotation_path, sound_path, annot_col)
+        return
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # Files are sent in chunks, since most annotation files take less time to read than a round trip to a worker
+        yield from executor.map(_transcribe, *zip(*((format, annotation_path, sound_path, annot_col) for annotation_path, sound_path in pairs)),
+                                chunksize=max(1, len(pairs) // (max_workers * 4)))
+
+
+def get_annotations(annotations_path, format, sounds_path, annot_col=None, annot_ext="txt", sounds_ext="wav", max_workers=None, strict=False):
+    """Transcribes the annotation files of a directory with iter_annotations and returns them as a list."""
+    return list(iter_annotations(annotations_path, format, sounds_path, annot_col, annot_ext, sounds_ext, max_workers, strict))
 
 if __name__ == "__main__":
 
     # Example with Domestic Canari dataset
     audacity_annotations_path = os.path.join(".","data","Domestic_Canari","M1-2016-spring_audacity_annotations","audacity-annotations")
     audacity_sounds_path = os.path.join(".","data","Domestic_Canari","M1-2016-sping_audio", "audio")
-    audacity_annotations = get_annotations(audacity_annotations_path, "aud-seq", sounds_path=audacity_sounds_path)
+    audacity_annotations = iter_annotations(audacity_annotations_path, "aud-seq", sounds_path=audacity_sounds_path)
     creator_audacity = AnnotationCreator()
     creator_audacity.convert_crowsetta_seq_annotations(audacity_annotations)
     creator_audacity.save_to_file(os.path.join(".","annotations_results","audacity_annotations_from_crowsetta.json"))
@@ -81,7 +163,7 @@ if __name__ == "__main__":
     # Example with Enabirds dataset
     raven_annotations_path = os.path.join(".","data","Enabirds","annotation_Files","Recording_3")
     raven_sounds_path = os.path.join(".","data","Enabirds","wav_Files", "Recording_3")
-    raven_annotations = get_annotations(raven_annotations_path, "raven", annot_col="Species", sounds_path=raven_sounds_path)
+    raven_annotations = iter_annotations(raven_annotations_path, "raven", annot_col="Species", sounds_path=raven_sounds_path)
     creator_raven = AnnotationCreator()
     creator_raven.convert_crowsetta_bbox_annotations(raven_annotations)
     creator_raven.save_to_file(os.path.join(".","annotations_results","raven_annotations_from_crowsetta.json"))
@@ -89,7 +171,7 @@ if __name__ == "__main__":
     # Example with Colombia_Costa_Rica_Birds
     custom_annotations_path = split_csv_by_filename(os.path.join(".","data","Colombia_Costa_Rica_Birds","annotations.csv"))
     custom_sounds_path = os.path.join(".","data","Colombia_Costa_Rica_Birds","soundscape_data")
-    custom_annotations = get_annotations(custom_annotations_path, "csv_bbox", sounds_path=custom_sounds_path, annot_ext="csv", sounds_ext="flac")
+    custom_annotations = iter_annotations(custom_annotations_path, "csv_bbox", sounds_path=custom_sounds_path, annot_ext="csv", sounds_ext="flac")
     creator_custom = AnnotationCreator() 
     creator_custom.convert_crowsetta_bbox_annotations(custom_annotations)
     creator_custom.save_to_file(os.path.join(".","annotations_results","custom_annotations_from_crowsetta.json"))
@@ -0,0 +1,276 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse, unquote
+from datetime import datetime, timezone
+import threading
+import hashlib
+import json
+import time
+import re
+import os
+
+ZENODO_API_URL = "https://zenodo.org/api"
+CHUNK_SIZE = 1 << 20
+MANIFEST_FILE = "download_manifest.json"
+DOWNLOAD_DIR = ".downloads"
+
+
+def parse_record_id(url:str):
+    """Returns the Zenodo record id of a record, files-archive or file URL, or None if url is not one."""
+    match = re.search(r"/records/(\d+)", url)
+    return match.group(1) if match else None
+
+
+def fetch_record_files(session, record_id:str, api_url:str=ZENODO_API_URL, timeout:float=60):
+    """
+    Lists the files of a Zenodo record with the size and MD5 checksum Zenodo publishes for them.
+
+    Returns:
+        files (list): One dictionary per file with its key (file name), url, size and md5.
+    """
+    response = session.get(f"{api_url}/records/{record_id}", timeout=timeout)
+    response.raise_for_status()
+    files = []
+    for file in response.json()["files"]:
+        algorithm, _, checksum = file.get("checksum", "").partition(":")
+        files.append({
+            "key": file["key"],
+            "url": file["links"]["self"],
+            "size": file.get("size"),
+            "md5": checksum if algorithm == "md5" else None,
+        })
+    return files
+
+
+def download_file(session, url:str, path:str, size:int=None, md5:str=None, chunk_size:int=CHUNK_SIZE, timeout:float=60, max_retries:int=5):
+    """
+    Downloads a file to path through a .part file. If the .part file already exists, for example after an
+    interrupted run, the download resumes from its end with an HTTP Range request. Dropped connections are
+    retried the same way. The size and MD5 checksum are verified before the file is moved to path.
+
+    Args:
+        session (requests.Session): The session used for the requests.
+        url (str): The URL of the file.
+        path (str): The path to save the file to.
+        size (Optional[int]): The expected size in bytes.
+        md5 (Optional[str]): The expected MD5 checksum as a hex string.
+        chunk_size (int): The number of bytes read and written at a time.
+        timeout (float): The connect and read timeout in seconds.
+        max_retries (int): The number of times a failed request is retried.
+
+    Returns:
+        downloaded (int): The number of bytes downloaded in this call.
+
+    Raises:
+        ValueError: If the size or checksum of the downloaded file does not match.
+    """
+    import requests  # only needed for downloads, so it is not imported with the module
+
+    part_path = path + ".part"
+    downloaded = 0
+    for attempt in range(max_retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if size is not None and offset == size:
+            break
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416:
+                    # The .part file is longer than the file on the server
+                    os.remove(part_path)
+                    continue
+                response.raise_for_status()
+                mode = "ab" if offset and response.status_code == 206 else "wb"
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        downloaded += len(chunk)
+            if size is None or os.path.getsize(part_path) >= size:
+                break
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == max_retries:
+                raise
+            print(f"Download of {os.path.basename(path)} interrupted ({type(e).__name__}), resuming")
+            time.sleep(min(2 ** attempt, 30))
+
+    actual_size = os.path.getsize(part_path)
+    if size is not None and actual_size != size:
+        raise ValueError(f"{os.path.basename(path)} has {actual_size} bytes, expected {size}.")
+    if md5 is not None:
+        digest = hashlib.md5()
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        if digest.hexdigest() != md5:
+            os.remove(part_path)
+            raise ValueError(f"Checksum mismatch for {os.path.basename(path)}: got {digest.hexdigest()}, expected {md5}.")
+    os.replace(part_path, path)
+    return downloaded
+
+
+class DownloadManifest:
+    """
+    Records the files downloaded into a directory with their size and checksum, so later runs skip them.
+
+    Attributes:
+        path (str): The path of the manifest file.
+        files (dict): Maps file keys to their url, size, md5, completion time and whether they were extracted.
+    """
+
+    version = 1
+
+    def __init__(self, path:str):
+        self.path = path
+        self.files = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == self.version:
+                self.files = manifest.get("files", {})
+
+    def is_complete(self, file:dict):
+        """
+        Checks whether a file of a record was already downloaded with the same checksum, and is still in the
+        directory of the manifest or was extracted.
+        """
+        entry = self.files.get(file["key"])
+        if entry is None or entry.get("md5") != file.get("md5") or entry.get("size") != file.get("size"):
+            return False
+        return entry.get("extracted") or os.path.exists(os.path.join(os.path.dirname(self.path), file["key"]))
+
+    def add(self, file:dict):
+        """Records a completed download and saves the manifest."""
+        with self._lock:
+            self.files[file["key"]] = {"url": file["url"], "size": file.get("size"), "md5": file.get("md5"),
+                                       "completed_at": datetime.now(timezone.utc).isoformat(), "extracted": False}
+            self._save()
+
+    def mark_extracted(self, key:str):
+        with self._lock:
+            self.files[key]["extracted"] = True
+            self._save()
+
+    def _save(self):
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "files": self.files}, f, indent=4)
+        os.replace(temporary_path, self.path)
+
+
+class DatasetDownloader:
+    """
+    Downloads the files of several datasets concurrently. Zenodo URLs are resolved through the records API
+    into the individual files of the record, which are downloaded with their published MD5 checksums
+    instead of the files-archive zip, which has none. Other URLs are downloaded as they are.
+
+    Every dataset gets a .downloads directory with the downloaded files and a manifest of the completed
+    downloads. Interrupted downloads are kept as .part files and resumed on the next run.
+
+    Attributes:
+        data_dir (str): The directory with one subdirectory per dataset.
+        api_url (str): The base URL of the Zenodo API, e.g. the api_url of a MockZenodoServer.
+        max_workers (int): The maximum number of files downloaded at the same time.
+        chunk_size (int): The number of bytes read and written at a time.
+        timeout (float): The connect and read timeout of the requests in seconds.
+        max_retries (int): The number of times an interrupted download is resumed.
+    """
+
+    def __init__(self, data_dir:str="data", api_url:str=ZENODO_API_URL, max_workers:int=4, chunk_size:int=CHUNK_SIZE, timeout:float=60, max_retries:int=5):
+        self.data_dir = data_dir
+        self.api_url = api_url
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._local = threading.local()
+
+    def _session(self):
+        """Returns the requests session of the current thread."""
+        if not hasattr(self._local, "session"):
+            import requests
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def download_dir(self, dataset_name:str):
+        return os.path.join(self.data_dir, dataset_name, DOWNLOAD_DIR)
+
+    def list_files(self, urls:list):
+        """Resolves the URLs of a dataset into the files to download."""
+        files = []
+        for url in urls:
+            record_id = parse_record_id(url)
+            if record_id is not None:
+                files += fetch_record_files(self._session(), record_id, self.api_url, self.timeout)
+            else:
+                files.append({"key": os.path.basename(unquote(urlparse(url).path)), "url": url, "size": None, "md5": None})
+        return files
+
+    def _download(self, dataset_name:str, file:dict, manifest:DownloadManifest, on_start=None):
+        path = os.path.join(self.download_dir(dataset_name), file["key"])
+        if on_start is not None:
+            on_start(dataset_name, file, path)
+        start = time.perf_counter()
+        downloaded = download_file(self._session(), file["url"], path, file.get("size"), file.get("md5"), self.chunk_size, self.timeout, self.max_retries)
+        manifest.add(file)
+        return downloaded, time.perf_counter() - start
+
+    def download(self, datasets:dict, on_start=None, on_done=None):
+        """
+        Downloads the files of the datasets, skipping the ones the manifests list as complete.
+
+        Args:
+            datasets (dict): Maps dataset names to lists of URLs.
+            on_start (Optional[callable]): Called with the dataset name, file and path of every file right
+                before its download starts, in the download thread. The file grows at path + ".part" and is
+                renamed to path once it is complete and verified.
+            on_done (Optional[callable]): Called with the dataset name, manifest and list of errors of every
+                dataset as soon as all of its files are finished, while the other datasets still download.
+
+        Returns:
+            downloads (dict): Maps dataset names to their manifest, whose files are in download_dir(dataset_name).
+        """
+        manifests = {}
+        jobs = []
+        for dataset_name, urls in datasets.items():
+            os.makedirs(self.download_dir(dataset_name), exist_ok=True)
+            manifest = DownloadManifest(os.path.join(self.download_dir(dataset_name), MANIFEST_FILE))
+            manifests[dataset_name] = manifest
+            for file in self.list_files(urls):
+                if manifest.is_complete(file):
+                    print(f"{dataset_name}/{file['key']} already downloaded")
+                else:
+                    jobs.append((dataset_name, file))
+
+        remaining = {dataset_name: sum(job[0] == dataset_name for job in jobs) for dataset_name in datasets}
+        dataset_errors = {dataset_name: [] for dataset_name in datasets}
+        if on_done is not None:
+            for dataset_name, count in remaining.items():
+                if count == 0:
+                    on_done(dataset_name, manifests[dataset_name], [])
+
+        start = time.perf_counter()
+        total = 0
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._download, dataset_name, file, manifests[dataset_name], on_start): (dataset_name, file) for dataset_name, file in jobs}
+            for future in as_completed(futures):
+                dataset_name, file = futures[future]
+                remaining[dataset_name] -= 1
+                try:
+                    downloaded, seconds = future.result()
+                except Exception as e:
+                    errors.append(f"{dataset_name}/{file['key']}: {type(e).__name__}: {e}")
+                    dataset_errors[dataset_name].append(errors[-1])
+                    print(f"❌ Failed to download {dataset_name}/{file['key']}: {e}")
+                else:
+                    total += downloaded
+                    print(f"✅ Downloaded {dataset_name}/{file['key']} ({downloaded / (1 << 20):.1f} MiB in {seconds:.1f}s)")
+                if on_done is not None and remaining[dataset_name] == 0:
+                    on_done(dataset_name, manifests[dataset_name], dataset_errors[dataset_name])
+
+        elapsed = time.perf_counter() - start
+        if jobs:
+            print(f"Downloaded {total / (1 << 20):.1f} MiB in {elapsed:.1f}s ({total / (1 << 20) / max(elapsed, 1e-9):.1f} MiB/s)")
+        if errors:
+            raise RuntimeError(f"{len(errors)} downloads failed:\n" + "\n".join(errors))
+        return manifests
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+
+
+def file_fingerprint(file_path:str, previous:dict=None, chunk_size:int=1 << 20):
+    """
+    Computes the fingerprint of a file: its size, modification time and a BLAKE2 digest of its content.
+    If a previous fingerprint with the same size and modification time is given, its digest is reused
+    instead of reading the file again.
+
+    Args:
+        file_path (str): The path of the file.
+        previous (Optional[dict]): A fingerprint computed earlier for the same file.
+        chunk_size (int): The number of bytes hashed at a time.
+
+    Returns:
+        fingerprint (dict): A dictionary with the size, mtime_ns and digest of the file.
+    """
+    stat = os.stat(file_path)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": previous["digest"]}
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest.hexdigest()}
+
+
+def is_unchanged(file_path:str, previous:dict):
+    """
+    Checks whether a file still has the content it had when a fingerprint was taken. Files whose size
+    and modification time match are not read. Files that were only touched are hashed and compared by content.
+
+    Returns:
+        unchanged (bool): True if the file exists and its content matches the fingerprint.
+    """
+    if not previous or not os.path.exists(file_path):
+        return False
+    return file_fingerprint(file_path, previous)["digest"] == previous.get("digest")
+
+
+class DatasetManifest:
+    """
+    The manifest of the inputs a dataset was built from, stored next to annotations.json. For every
+    annotation table it records the fingerprints of the table and of the files it depends on, and the
+    range of annotations it produced, so unchanged tables can be reused by incremental runs. Tables whose
+    anno_ids are their positions in the dataset are marked with positional_ids, so reused annotations
+    are renumbered to their new positions.
+
+    Attributes:
+        path (str): The path of the manifest file.
+        tables (dict): Maps table paths relative to the dataset directory to their entries.
+    """
+
+    version = 1
+
+    def __init__(self, path:str, tables:dict=None):
+        self.path = path
+        self.tables = tables or {}
+
+    @classmethod
+    def load(cls, path:str):
+        """Loads a manifest, or returns an empty one if the file does not exist or has another version."""
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != cls.version:
+            return cls(path)
+        return cls(path, data.get("tables", {}))
+
+    def save(self):
+        """Writes the manifest atomically."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "tables": self.tables}, f, indent=4)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,236 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from archive_extraction import extract_zip_stream, extract_archive, nested_extract_dir
+from dataset_downloader import DatasetDownloader, ZENODO_API_URL
+from prepare_data import DATASETS, extract_downloads
+import threading
+import argparse
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "readers"))
+from BaseReader import Prefetcher, discover_readers
+
+
+class _GrowingFile:
+    """
+    Reads a file that a download is still writing, through its .part file. A read at the current end waits
+    for more data until the download renames the .part file to its final path or finished is set.
+    """
+
+    def __init__(self, path:str, finished:threading.Event, poll_interval:float=0.05):
+        self.path = path
+        self.finished = finished
+        self.poll_interval = poll_interval
+        self._file = None
+
+    def _complete(self):
+        return self.finished.is_set() or os.path.exists(self.path)
+
+    def __enter__(self):
+        while self._file is None:
+            # An open .part file can still be read after it is renamed, so the file is opened once
+            for path in (self.path + ".part", self.path):
+                try:
+                    self._file = open(path, "rb")
+                    break
+                except FileNotFoundError:
+                    continue
+            else:
+                if self.finished.is_set():
+                    raise FileNotFoundError(f"The download of {os.path.basename(self.path)} did not start.")
+                time.sleep(self.poll_interval)
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+    def read(self, n:int=-1):
+        while True:
+            data = self._file.read(n)
+            if data:
+                return data
+            if self._complete():
+                # Data may have been written between the read and the check
+                return self._file.read(n)
+            time.sleep(self.poll_interval)
+
+
+class StreamingPipeline:
+    """
+    Downloads datasets and turns them into annotations.json files in one pipelined pass. Zip files are
+    extracted from their .part file while they download, by following the local headers of their members,
+    and every extracted file is handed to the Prefetcher of its dataset, which probes audio headers and reads
+    selection tables in a thread pool. As soon as all files of a dataset are downloaded, the remaining
+    members are extracted (archives that cannot be streamed are extracted from the complete file), and the
+    reader of the dataset runs with the prefetched headers and tables while other datasets still download.
+
+    Attributes:
+        data_dir (str): The directory with one subdirectory per dataset.
+        downloader (DatasetDownloader): The downloader of the files.
+        keep_archives (bool): Keep the downloaded files in the .downloads directory of every dataset.
+        visualize (bool): Plot the visualizations of every dataset.
+        features (bool): Precompute the spectrograms of every dataset.
+        results (dict): Maps dataset names to their status, elapsed seconds since the start and error.
+    """
+
+    def __init__(self, data_dir:str="data", api_url:str=ZENODO_API_URL, max_workers:int=4, prefetch_workers:int=8, keep_archives:bool=False, visualize:bool=False, features:bool=False):
+        self.data_dir = data_dir
+        self.downloader = DatasetDownloader(data_dir=data_dir, api_url=api_url, max_workers=max_workers)
+        self.keep_archives = keep_archives
+        self.visualize = visualize
+        self.features = features
+        self.results = {}
+        self.registry, _ = discover_readers()
+        self._prefetch_workers = prefetch_workers
+        self._lock = threading.Lock()
+        self._finished = {}
+        self._prefetchers = {}
+        self._followers = {}
+        self._prefetches = {}
+
+    def _dataset_dir(self, dataset_name:str):
+        return os.path.join(self.data_dir, dataset_name)
+
+    def _state(self, dataset_name:str):
+        """Creates the finished event, prefetcher and follower list of a dataset on first use."""
+        with self._lock:
+            if dataset_name not in self._finished:
+                self._finished[dataset_name] = threading.Event()
+                self._prefetchers[dataset_name] = Prefetcher(self._dataset_dir(dataset_name))
+                self._followers[dataset_name] = []
+                self._prefetches[dataset_name] = []
+            return self._finished[dataset_name], self._prefetchers[dataset_name], self._followers[dataset_name]
+
+    def _prefetch(self, dataset_name:str, file_path:str):
+        _, prefetcher, _ = self._state(dataset_name)
+        future = self._prefetch_executor.submit(prefetcher.add, file_path)
+        with self._lock:
+            self._prefetches[dataset_name].append(future)
+
+    def _on_member(self, dataset_name:str, file_path:str):
+        if not file_path.lower().endswith(".zip"):
+            self._prefetch(dataset_name, file_path)
+            return
+        # Nested zips are complete once written, so they are extracted right away
+        extract_to = nested_extract_dir(os.path.dirname(file_path), os.path.basename(file_path))
+        extract_archive(file_path, extract_to, max_workers=1)
+        os.remove(file_path)
+        for root, _, files in os.walk(extract_to):
+            for file in files:
+                self._prefetch(dataset_name, os.path.join(root, file))
+
+    def _follow(self, dataset_name:str, path:str, result:dict):
+        finished, _, _ = self._state(dataset_name)
+        extract_to = nested_extract_dir(self._dataset_dir(dataset_name), os.path.basename(path))
+        try:
+            with _GrowingFile(path, finished) as stream:
+                result["stats"] = extract_zip_stream(stream, extract_to, lambda file_path: self._on_member(dataset_name, file_path))
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+
+    def _on_start(self, dataset_name:str, file:dict, path:str):
+        if not file["key"].lower().endswith(".zip"):
+            return
+        _, _, followers = self._state(dataset_name)
+        result = {"path": path, "stats": None, "error": None}
+        thread = threading.Thread(target=self._follow, args=(dataset_name, path, result), daemon=True)
+        with self._lock:
+            followers.append((thread, result))
+        thread.start()
+
+    def _finish(self, dataset_name:str, manifest, errors:list):
+        """Waits for the extraction and prefetching of a dataset, extracts what was not streamed and runs its reader."""
+        _, prefetcher, followers = self._state(dataset_name)
+        dataset_dir = self._dataset_dir(dataset_name)
+        for thread, _ in followers:
+            thread.join()
+        if errors:
+            raise RuntimeError(f"{len(errors)} downloads failed:\n" + "\n".join(errors))
+
+        for _, result in followers:
+            key = os.path.basename(result["path"])
+            # The download renames the file to its final path only once it is complete and verified
+            if result["error"] is None and os.path.exists(result["path"]):
+                print(f"✅ Extracted {dataset_name}/{key} while downloading ({result['stats']['files']} files, {result['stats']['bytes'] / (1 << 20):.1f} MiB)")
+                manifest.mark_extracted(key)
+                if not self.keep_archives:
+                    os.remove(result["path"])
+            else:
+                print(f"Extracting {dataset_name}/{key} after its download: {result['error']}")
+        extract_downloads(dataset_dir, manifest, self.keep_archives)
+
+        with self._lock:
+            prefetches = list(self._prefetches[dataset_name])
+        wait(prefetches)
+        prefetcher.audio_metadata.save()
+        if dataset_name not in self.registry:
+            print(f"No reader is registered for {dataset_name}, so no annotations.json is written")
+            return
+        reader = self.registry[dataset_name](dataset_dir)
+        reader.use_prefetched(prefetcher)
+        reader.process_dataset(visualize=self.visualize, features=self.features)
+
+    def _run_finish(self, dataset_name:str, manifest, errors:list):
+        start = time.perf_counter()
+        try:
+            self._finish(dataset_name, manifest, errors)
+            self.results[dataset_name] = {"status": "ok", "elapsed": time.perf_counter() - self._start, "error": None}
+            print(f"✅ {dataset_name} ready {self.results[dataset_name]['elapsed']:.1f}s after the start, {time.perf_counter() - start:.1f}s after its download")
+        except Exception as e:
+            self.results[dataset_name] = {"status": "failed", "elapsed": time.perf_counter() - self._start, "error": f"{type(e).__name__}: {e}"}
+            print(f"❌ {dataset_name} failed: {type(e).__name__}: {e}")
+
+    def run(self, datasets:dict):
+        """
+        Downloads, extracts and reads the datasets.
+
+        Args:
+            datasets (dict): Maps dataset names to lists of URLs.
+
+        Returns:
+            results (dict): Maps dataset names to their status, elapsed seconds since the start and error.
+        """
+        self._start = time.perf_counter()
+        self.results = {}
+        # Readers run one at a time, next to the downloads and extractions of the other datasets
+        with ThreadPoolExecutor(max_workers=self._prefetch_workers) as self._prefetch_executor, ThreadPoolExecutor(max_workers=1) as finish_executor:
+            def on_done(dataset_name, manifest, errors):
+                finished, _, _ = self._state(dataset_name)
+                finished.set()
+                finish_executor.submit(self._run_finish, dataset_name, manifest, list(errors))
+
+            try:
+                self.downloader.download(datasets, on_start=self._on_start, on_done=on_done)
+            except RuntimeError:
+                # The failed downloads are reported with their dataset
+                pass
+        elapsed = time.perf_counter() - self._start
+        failed = [name for name, result in self.results.items() if result["status"] != "ok"]
+        print(f"Prepared {len(self.results) - len(failed)} of {len(datasets)} datasets in {elapsed:.1f}s")
+        return self.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download datasets and write their annotations.json, reading every file as soon as it is extracted.")
+    parser.add_argument("--dataset", nargs="+", choices=DATASETS.keys(), help="Names of the datasets to prepare.")
+    parser.add_argument("--all", action="store_true", help="Prepare every dataset.")
+    parser.add_argument("--data-dir", default="data", help="Directory with one subdirectory per dataset.")
+    parser.add_argument("--api-url", default=ZENODO_API_URL, help="Base URL of the Zenodo API, e.g. a local mock_zenodo_server.")
+    parser.add_argument("--max-workers", type=int, default=4, help="Maximum number of files downloaded at the same time.")
+    parser.add_argument("--keep-archives", action="store_true", help="Keep the downloaded archives after extracting them.")
+    parser.add_argument("--visualize", action="store_true", help="Plot the visualizations of every dataset.")
+    parser.add_argument("--features", action="store_true", help="Precompute the spectrograms of every dataset.")
+    args = parser.parse_args()
+
+    if not args.all and not args.dataset:
+        parser.error("Pass --dataset or --all.")
+    dataset_names = list(DATASETS) if args.all else args.dataset
+    pipeline = StreamingPipeline(args.data_dir, args.api_url, args.max_workers, keep_archives=args.keep_archives, visualize=args.visualize, features=args.features)
+    results = pipeline.run({name: DATASETS[name] for name in dataset_names})
+    if any(result["status"] != "ok" for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
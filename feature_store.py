@@ -0,0 +1,311 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from clip_extraction import read_frames
+from dataset_manifest import file_fingerprint
+import soundfile as sf
+import numpy as np
+import argparse
+import hashlib
+import json
+import os
+
+DEFAULT_CONFIG = {"kind": "linear", "n_fft": 2048, "hop_length": 512, "n_mels": 128, "fmin": 0.0, "fmax": None}
+INDEX_FILE = "index.json"
+
+
+def feature_config(**overrides):
+    """
+    Returns a complete feature configuration: DEFAULT_CONFIG updated with the given values.
+
+    Args:
+        kind (str): "linear" for a power spectrogram or "log-mel" for a mel spectrogram, both in dB.
+        n_fft (int): The FFT size in samples.
+        hop_length (int): The step between frames in samples.
+        n_mels (int): The number of mel bands, used by "log-mel".
+        fmin (float): The lowest frequency of the mel bands, used by "log-mel".
+        fmax (Optional[float]): The highest frequency of the mel bands, used by "log-mel". Defaults to the Nyquist frequency.
+    """
+    unknown = set(overrides) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown feature settings: {', '.join(sorted(unknown))}.")
+    config = {**DEFAULT_CONFIG, **overrides}
+    if config["kind"] not in ("linear", "log-mel"):
+        raise ValueError(f"Unknown feature kind '{config['kind']}'. Expected 'linear' or 'log-mel'.")
+    return config
+
+
+def config_key(config:dict):
+    """Returns a short hash of a feature configuration, used as the name of its directory in the store."""
+    return hashlib.blake2b(json.dumps(config, sort_keys=True).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def num_frames(n_samples:int, hop_length:int):
+    """Returns the number of centered frames of a signal, as librosa.stft(center=True) computes them."""
+    return 1 + n_samples // hop_length
+
+
+def compute_spectrogram(sound_file:sf.SoundFile, config:dict, out, chunk_frames:int=4096):
+    """
+    Computes the spectrogram of an open sound file chunk by chunk and writes it to out, so long soundscapes
+    never have to be decoded at once. Frames are centered and the signal is padded with zeros, which gives
+    the same values as librosa.stft(center=True, pad_mode="constant") with a Hann window.
+
+    Args:
+        sound_file (SoundFile): The sound file, read as mono.
+        config (dict): The feature configuration.
+        out (ndarray): The array of shape (frames, bins) to write the spectrogram to, in dB.
+        chunk_frames (int): The number of frames computed at a time.
+    """
+    n_fft, hop_length = config["n_fft"], config["hop_length"]
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+    mel_basis = None
+    if config["kind"] == "log-mel":
+        import librosa
+        mel_basis = librosa.filters.mel(sr=sound_file.samplerate, n_fft=n_fft, n_mels=config["n_mels"], fmin=config["fmin"], fmax=config["fmax"])
+
+    for first_frame in range(0, len(out), chunk_frames):
+        n_chunk = min(chunk_frames, len(out) - first_frame)
+        samples = read_frames(sound_file, first_frame * hop_length - n_fft // 2, (n_chunk - 1) * hop_length + n_fft)
+        frames = np.lib.stride_tricks.sliding_window_view(samples, n_fft)[::hop_length]
+        power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+        if mel_basis is not None:
+            power = power @ mel_basis.T
+        out[first_frame:first_frame + n_chunk] = 10 * np.log10(np.maximum(power, 1e-10))
+
+
+def _compute_sound(file_path:str, config:dict, shard_path:str, start:int, n_frames:int):
+    """Computes the spectrogram of one sound into its rows of a shard."""
+    shard = np.load(shard_path, mmap_mode="r+")
+    with sf.SoundFile(file_path) as sound_file:
+        compute_spectrogram(sound_file, config, shard[start:start + n_frames])
+    shard.flush()
+    return file_path
+
+
+class FeatureStore:
+    """
+    A store of precomputed spectrograms. Every feature configuration has its own directory, named after a
+    hash of the configuration, with .npy shards holding the spectrograms of many sounds one after the other
+    as (frames, bins) float32 arrays, and an index.json with the shard, first frame and frame count of every
+    sound. Shards are memory-mapped when read, so a window of a spectrogram is a slice with no decoding.
+
+    Sounds are cached by the content hash of their audio file: sounds whose file did not change, and sounds
+    whose content was already computed for another sound, are not computed again.
+
+    Attributes:
+        directory (str): The directory of the configuration in the store.
+        config (dict): The feature configuration.
+    """
+
+    def __init__(self, root:str, config:dict=None):
+        self.config = config or feature_config()
+        self.directory = os.path.join(root, config_key(self.config))
+        self.index_path = os.path.join(self.directory, INDEX_FILE)
+        self.sounds = {}
+        self.shards = []
+        self._shards = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self.sounds = {int(sound_id): entry for sound_id, entry in index["sounds"].items()}
+            self.shards = index["shards"]
+
+    def __contains__(self, sound_id:int):
+        return sound_id in self.sounds
+
+    def has_sound(self, sound_id:int, file_name_path:str):
+        """Checks whether the store holds the spectrogram of a sound id computed from the given file."""
+        return sound_id in self.sounds and self.sounds[sound_id]["file_name_path"] == file_name_path
+
+    def _save_index(self):
+        temporary_path = self.index_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump({"config": self.config, "shards": self.shards, "sounds": {str(sound_id): entry for sound_id, entry in self.sounds.items()}}, f, indent=4)
+        os.replace(temporary_path, self.index_path)
+
+    def compact(self):
+        """
+        Saves the index and deletes the shards no sound refers to anymore, such as the shards of removed
+        sounds or the shards a crashed build left behind.
+
+        Returns:
+            removed (list): The names of the deleted shards.
+        """
+        referenced = {entry["shard"] for entry in self.sounds.values()}
+        self.shards = [shard_name for shard_name in self.shards if shard_name in referenced]
+        # The index is saved first, so it never refers to a deleted shard
+        self._save_index()
+        self._shards = {}
+        removed = [file for file in sorted(os.listdir(self.directory))
+                   if file.startswith("shard_") and file.endswith(".npy") and file not in referenced]
+        for shard_name in removed:
+            os.remove(os.path.join(self.directory, shard_name))
+        if removed:
+            print(f"Removed {len(removed)} unused shards from {self.directory}")
+        return removed
+
+    def build(self, sounds:list, audio_root:str, max_workers:int=None, shard_frames:int=1 << 20):
+        """
+        Computes the spectrograms of the sounds that are not in the store yet or whose file changed. The
+        store afterwards holds exactly the given sounds: the entries of other sounds are dropped and the
+        shards nothing refers to are deleted. The index is saved every time a shard is complete, so a run
+        that crashes or fails on a file keeps the spectrograms it finished.
+
+        Args:
+            sounds (list): The sounds in the annotations.json schema.
+            audio_root (str): The directory the file_name_path of the sounds are relative to.
+            max_workers (Optional[int]): The number of worker processes. Defaults to the number of CPUs.
+            shard_frames (int): The maximum number of frames per shard, unless a single sound is longer.
+
+        Returns:
+            computed (int): The number of sounds whose spectrogram was computed.
+
+        Raises:
+            RuntimeError: If some spectrograms could not be computed, after the others are saved.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "config.json"), "w", encoding="utf-8") as f:
+            json.dump(self.config, f, indent=4)
+
+        by_digest = {entry["fingerprint"]["digest"]: entry for entry in self.sounds.values()}
+        by_path = {entry["file_name_path"]: entry for entry in self.sounds.values()}
+        current = {}
+        pending = []
+        duplicates = []
+        new_by_digest = {}
+        for sound in sounds:
+            file_path = os.path.join(audio_root, sound["file_name_path"])
+            # Sound ids can be reassigned between runs, so previous fingerprints are looked up by file
+            previous = by_path.get(sound["file_name_path"])
+            fingerprint = file_fingerprint(file_path, previous["fingerprint"] if previous else None)
+            cached = by_digest.get(fingerprint["digest"])
+            if cached is not None:
+                current[sound["id"]] = {**cached, "file_name_path": sound["file_name_path"], "fingerprint": fingerprint}
+                continue
+            if fingerprint["digest"] in new_by_digest:
+                # Sounds with the same content as a sound computed in this run share its rows
+                duplicates.append((sound["id"], sound["file_name_path"], fingerprint))
+                continue
+            info = sf.info(file_path)
+            entry = {"file_name_path": sound["file_name_path"], "fingerprint": fingerprint, "sample_rate": info.samplerate,
+                     "frames": num_frames(info.frames, self.config["hop_length"])}
+            new_by_digest[fingerprint["digest"]] = entry
+            pending.append((sound["id"], file_path, entry))
+        self.sounds = current
+        self.compact()
+
+        # Pack the new sounds into new shards, numbered after the existing ones
+        n_bins = self.config["n_mels"] if self.config["kind"] == "log-mel" else self.config["n_fft"] // 2 + 1
+        next_shard = 1 + max((int(shard_name[6:-4]) for shard_name in self.shards), default=-1)
+        shard_sounds = {}
+        jobs = []
+        batch = []
+        for i, (sound_id, file_path, entry) in enumerate(pending):
+            batch.append((sound_id, file_path, entry))
+            batch_frames = sum(batch_entry["frames"] for _, _, batch_entry in batch)
+            if batch_frames >= shard_frames or i == len(pending) - 1:
+                shard_name = f"shard_{next_shard:05d}.npy"
+                next_shard += 1
+                np.lib.format.open_memmap(os.path.join(self.directory, shard_name), mode="w+", dtype=np.float32, shape=(batch_frames, n_bins)).flush()
+                shard_sounds[shard_name] = [(batch_sound_id, batch_entry) for batch_sound_id, _, batch_entry in batch]
+                start = 0
+                for _, batch_path, batch_entry in batch:
+                    batch_entry.update({"shard": shard_name, "start": start})
+                    jobs.append((batch_path, self.config, os.path.join(self.directory, shard_name), start, batch_entry["frames"]))
+                    start += batch_entry["frames"]
+                batch = []
+
+        remaining = {shard_name: len(entries) for shard_name, entries in shard_sounds.items()}
+        failed = set()
+        errors = []
+        if jobs:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(_compute_sound, *job): job for job in jobs}
+                for done, future in enumerate(as_completed(futures), 1):
+                    file_path, _, shard_path, _, _ = futures[future]
+                    shard_name = os.path.basename(shard_path)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed.add(file_path)
+                        errors.append(f"{file_path}: {type(e).__name__}: {e}")
+                        print(f"❌ Failed to compute the spectrogram of {file_path}: {e}")
+                    remaining[shard_name] -= 1
+                    if remaining[shard_name] == 0:
+                        self._add_shard(shard_name, shard_sounds[shard_name], duplicates, audio_root, failed)
+                    if done % 100 == 0 or done == len(jobs):
+                        print(f"Computed {done} of {len(jobs)} spectrograms")
+        # Shards whose sounds all failed are deleted
+        self.compact()
+        if errors:
+            raise RuntimeError(f"{len(errors)} spectrograms could not be computed:\n" + "\n".join(errors))
+        return len(jobs)
+
+    def _add_shard(self, shard_name:str, entries:list, duplicates:list, audio_root:str, failed:set):
+        """Adds the computed sounds of a complete shard, and the sounds sharing their content, to the index and saves it."""
+        by_digest = {}
+        for sound_id, entry in entries:
+            if os.path.join(audio_root, entry["file_name_path"]) in failed:
+                continue
+            self.sounds[sound_id] = entry
+            by_digest[entry["fingerprint"]["digest"]] = entry
+        for sound_id, file_name_path, fingerprint in duplicates:
+            source = by_digest.get(fingerprint["digest"])
+            if source is not None:
+                self.sounds[sound_id] = {**source, "file_name_path": file_name_path, "fingerprint": fingerprint}
+        if by_digest:
+            self.shards.append(shard_name)
+            self._save_index()
+
+    def _shard(self, shard_name:str):
+        if shard_name not in self._shards:
+            self._shards[shard_name] = np.load(os.path.join(self.directory, shard_name), mmap_mode="r")
+        return self._shards[shard_name]
+
+    def get(self, sound_id:int, t_start:float=None, t_end:float=None):
+        """
+        Returns the spectrogram of a sound, or of the frames centered between t_start and t_end, as a
+        memory-mapped (frames, bins) array in dB.
+
+        Raises:
+            KeyError: If the sound is not in the store.
+        """
+        entry = self.sounds[sound_id]
+        frames_per_second = entry["sample_rate"] / self.config["hop_length"]
+        first = 0 if t_start is None else min(max(int(np.ceil(t_start * frames_per_second)), 0), entry["frames"])
+        last = entry["frames"] if t_end is None else min(max(int(np.floor(t_end * frames_per_second)) + 1, first), entry["frames"])
+        return self._shard(entry["shard"])[entry["start"] + first:entry["start"] + last]
+
+    def frame_times(self, sound_id:int, t_start:float=None, t_end:float=None):
+        """Returns the times in seconds of the frames get returns for the same arguments."""
+        entry = self.sounds[sound_id]
+        frames_per_second = entry["sample_rate"] / self.config["hop_length"]
+        first = 0 if t_start is None else min(max(int(np.ceil(t_start * frames_per_second)), 0), entry["frames"])
+        n_frames = len(self.get(sound_id, t_start, t_end))
+        return (first + np.arange(n_frames)) / frames_per_second
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the spectrograms of the sounds of a dataset.")
+    parser.add_argument("json_path", help="The annotations.json file of the dataset.")
+    parser.add_argument("--store", default=None, help="The feature store directory. Defaults to a features directory next to json_path.")
+    parser.add_argument("--audio-root", default=None, help="The directory the sound paths are relative to. Defaults to the directory of json_path.")
+    parser.add_argument("--kind", choices=["linear", "log-mel"], default=DEFAULT_CONFIG["kind"], help="The kind of spectrogram.")
+    parser.add_argument("--n-fft", type=int, default=DEFAULT_CONFIG["n_fft"], help="The FFT size in samples.")
+    parser.add_argument("--hop-length", type=int, default=DEFAULT_CONFIG["hop_length"], help="The step between frames in samples.")
+    parser.add_argument("--n-mels", type=int, default=DEFAULT_CONFIG["n_mels"], help="The number of mel bands.")
+    parser.add_argument("--fmin", type=float, default=DEFAULT_CONFIG["fmin"], help="The lowest frequency of the mel bands.")
+    parser.add_argument("--fmax", type=float, default=DEFAULT_CONFIG["fmax"], help="The highest frequency of the mel bands.")
+    parser.add_argument("--max-workers", type=int, default=None, help="Number of worker processes. Defaults to the number of CPUs.")
+    args = parser.parse_args()
+
+    dataset_dir = os.path.dirname(os.path.abspath(args.json_path))
+    with open(args.json_path, "r", encoding="utf-8") as f:
+        sounds = json.load(f)["sounds"]
+    config = feature_config(kind=args.kind, n_fft=args.n_fft, hop_length=args.hop_length, n_mels=args.n_mels, fmin=args.fmin, fmax=args.fmax)
+    store = FeatureStore(args.store or os.path.join(dataset_dir, "features"), config)
+    computed = store.build(sounds, args.audio_root or dataset_dir, args.max_workers)
+    print(f"✅ Computed {computed} spectrograms, {len(sounds) - computed} cached, in {store.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+from columnar_format import ColumnarDataset
+import numpy as np
+
+
+def _as_float(values):
+    """Converts a sequence that may contain None to a float array with NaN for the missing values."""
+    return np.array([np.nan if value is None else value for value in values], dtype=float) if isinstance(values, list) else np.asarray(values, dtype=float)
+
+
+class IntervalIndex:
+    """
+    Answers overlap queries over the annotations of a dataset: which annotations of a sound overlap the
+    time window [t_min, t_max], optionally restricted to those overlapping the band [f_min, f_max].
+
+    The annotations are grouped by sound and by duration class (durations within a factor of two of each
+    other) and sorted by t_min. An annotation of a group overlaps a window only if its t_min lies in
+    (t_min - longest duration of the group, t_max), so every group is answered with two binary searches
+    and a scan of its candidates. Since the durations of a group differ by less than a factor of two, only
+    annotations starting just before the window can be false candidates, and a query costs about
+    O(log n + k) for k results. query_batch answers many windows with vectorized searches.
+
+    Annotations without f_min or f_max cover the whole band and match every frequency filter. Intervals
+    overlap when they share more than an endpoint.
+
+    Attributes:
+        annotations (Optional[list]): The annotation dictionaries the index was built from, if any.
+    """
+
+    def __init__(self, sound_ids, t_min, t_max, f_min=None, f_max=None, annotations:list=None):
+        sound_ids = np.asarray(sound_ids, dtype=np.int64)
+        t_min = _as_float(t_min)
+        t_max = _as_float(t_max)
+        f_min = np.full(len(sound_ids), -np.inf) if f_min is None else np.nan_to_num(_as_float(f_min), nan=-np.inf)
+        f_max = np.full(len(sound_ids), np.inf) if f_max is None else np.nan_to_num(_as_float(f_max), nan=np.inf)
+        self.annotations = annotations
+
+        _, duration_class = np.frexp(np.maximum(t_max - t_min, 0))
+        order = np.lexsort((t_min, duration_class, sound_ids))
+        self._positions = order
+        self._sound_ids = sound_ids[order]
+        self._t_min = t_min[order]
+        self._t_max = t_max[order]
+        self._f_min = f_min[order]
+        self._f_max = f_max[order]
+
+        # Groups of annotations with the same sound and duration class
+        duration_class = duration_class[order]
+        boundaries = np.flatnonzero((np.diff(self._sound_ids) != 0) | (np.diff(duration_class) != 0)) + 1
+        self._group_starts = np.concatenate(([0], boundaries)).astype(np.int64) if len(order) else np.zeros(0, dtype=np.int64)
+        self._group_ends = np.concatenate((boundaries, [len(order)])).astype(np.int64) if len(order) else np.zeros(0, dtype=np.int64)
+        self._group_sound_ids = self._sound_ids[self._group_starts]
+        durations = self._t_max - self._t_min
+        self._group_max_duration = np.maximum.reduceat(durations, self._group_starts) if len(order) else np.zeros(0)
+
+    def __len__(self):
+        return len(self._positions)
+
+    @classmethod
+    def from_annotations(cls, annotations:list):
+        """Builds an index from a list of annotations in the annotations.json schema."""
+        return cls(
+            [anno["sound_id"] for anno in annotations],
+            [anno["t_min"] for anno in annotations],
+            [anno["t_max"] for anno in annotations],
+            [anno.get("f_min") for anno in annotations],
+            [anno.get("f_max") for anno in annotations],
+            annotations=annotations,
+        )
+
+    @classmethod
+    def from_columnar(cls, directory:str):
+        """Builds an index from the sound_id, t_min, t_max, f_min and f_max columns of a columnar dataset."""
+        dataset = ColumnarDataset(directory)
+        names = dataset.column_names("annotations")
+        columns = dataset.columns("annotations", [name for name in ["sound_id", "t_min", "t_max", "f_min", "f_max"] if name in names])
+        return cls(columns["sound_id"], columns["t_min"], columns["t_max"], columns.get("f_min"), columns.get("f_max"))
+
+    def query_batch(self, sound_ids, t_min, t_max, f_min=None, f_max=None):
+        """
+        Finds the annotations overlapping many windows at once, e.g. all the training windows of a dataset.
+
+        Args:
+            sound_ids (array-like): The sound of every window.
+            t_min (array-like): The start of every window, in seconds.
+            t_max (array-like): The end of every window, in seconds.
+            f_min (Optional[float or array-like]): The lower edge of the frequency band, for all windows or for each one.
+            f_max (Optional[float or array-like]): The upper edge of the frequency band, for all windows or for each one.
+
+        Returns:
+            results (list): For every window, an array with the positions of its annotations in the list the
+                index was built from, sorted by t_min.
+        """
+        sound_ids = np.atleast_1d(np.asarray(sound_ids, dtype=np.int64))
+        n_queries = len(sound_ids)
+        t_min = np.broadcast_to(np.asarray(t_min, dtype=float), n_queries)
+        t_max = np.broadcast_to(np.asarray(t_max, dtype=float), n_queries)
+        f_min = np.broadcast_to(np.asarray(-np.inf if f_min is None else f_min, dtype=float), n_queries)
+        f_max = np.broadcast_to(np.asarray(np.inf if f_max is None else f_max, dtype=float), n_queries)
+
+        found_queries = []
+        found_rows = []
+        query_order = np.argsort(sound_ids, kind="stable")
+        sorted_sound_ids = sound_ids[query_order]
+        unique_sound_ids, query_starts = np.unique(sorted_sound_ids, return_index=True)
+        query_ends = np.append(query_starts[1:], n_queries)
+        group_bounds = np.searchsorted(self._group_sound_ids, np.stack([unique_sound_ids, unique_sound_ids + 1]))
+
+        for sound_index in range(len(unique_sound_ids)):
+            queries = query_order[query_starts[sound_index]:query_ends[sound_index]]
+            for group in range(group_bounds[0, sound_index], group_bounds[1, sound_index]):
+                start, end = self._group_starts[group], self._group_ends[group]
+                group_t_min = self._t_min[start:end]
+                low = start + np.searchsorted(group_t_min, t_min[queries] - self._group_max_duration[group], side="right")
+                high = start + np.searchsorted(group_t_min, t_max[queries], side="left")
+                counts = np.maximum(high - low, 0)
+                total = counts.sum()
+                if total == 0:
+                    continue
+                candidate_queries = np.repeat(queries, counts)
+                # Positions low[i], low[i] + 1, ..., high[i] - 1 for every query i
+                candidate_rows = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(low, counts)
+                overlap = (self._t_max[candidate_rows] > t_min[candidate_queries]) \
+                    & (self._f_min[candidate_rows] < f_max[candidate_queries]) \
+                    & (self._f_max[candidate_rows] > f_min[candidate_queries])
+                found_queries.append(candidate_queries[overlap])
+                found_rows.append(candidate_rows[overlap])
+
+        if not found_rows:
+            return [np.zeros(0, dtype=np.int64) for _ in range(n_queries)]
+        found_queries = np.concatenate(found_queries)
+        found_rows = np.concatenate(found_rows)
+        order = np.lexsort((self._positions[found_rows], self._t_min[found_rows], found_queries))
+        found_queries = found_queries[order]
+        positions = self._positions[found_rows[order]]
+        splits = np.searchsorted(found_queries, np.arange(1, n_queries))
+        return np.split(positions, splits)
+
+    def query_indices(self, sound_id:int, t_min:float=-np.inf, t_max:float=np.inf, f_min:float=None, f_max:float=None):
+        """Returns the positions of the annotations of a sound overlapping a window and band, sorted by t_min."""
+        return self.query_batch([sound_id], [t_min], [t_max], f_min, f_max)[0]
+
+    def query(self, sound_id:int, t_min:float=-np.inf, t_max:float=np.inf, f_min:float=None, f_max:float=None):
+        """
+        Returns the annotations of a sound overlapping a window and band, sorted by t_min. Without a window,
+        returns all the annotations of the sound.
+
+        Raises:
+            ValueError: If the index was not built from annotation dictionaries.
+        """
+        if self.annotations is None:
+            raise ValueError("The index was not built from annotation dictionaries. Use query_indices instead.")
+        return [self.annotations[position] for position in self.query_indices(sound_id, t_min, t_max, f_min, f_max)]
@@ -0,0 +1,233 @@
+import json
+
+
+class _JsonStream:
+    """
+    A small incremental scanner over a text file containing JSON. Values are decoded one at a time
+    with json.JSONDecoder.raw_decode, so only the value being decoded has to be held in memory.
+    """
+
+    def __init__(self, file, chunk_size:int=1 << 16):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.offset = 0  # number of characters dropped from the front of the buffer
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it, or an empty string at the end."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos] if self.pos < len(self.buffer) else ""
+            self._fill()
+
+    def next_char(self):
+        """Consumes and returns the next non-whitespace character."""
+        char = self.peek()
+        if not char:
+            raise ValueError("Unexpected end of JSON file.")
+        self.pos += 1
+        return char
+
+    def expect(self, expected:str):
+        char = self.next_char()
+        if char != expected:
+            raise ValueError(f"Expected '{expected}' in JSON file but found '{char}'.")
+
+    def tell(self):
+        """Returns the position of the scanner in the file, in characters."""
+        return self.offset + self.pos
+
+    def decode(self):
+        """Decodes the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # A value that ends exactly at the end of the buffer (e.g. a number) may continue in the next chunk
+            if end == len(self.buffer) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_top_level(json_path:str, keys, chunk_size:int, encoding:str="utf-8"):
+    """
+    Walks the top-level object of a JSON file and yields (key, "value", value, start, end) for a non-array
+    value stored under one of keys, or (key, "item", item, start, end) for every item of an array stored
+    under one of keys, where start and end are the character offsets of the value in the file. Other
+    sections are skipped item by item, and the walk stops as soon as all the requested sections have been read.
+    """
+    remaining = set(keys)
+    with open(json_path, "r", encoding=encoding) as f:
+        stream = _JsonStream(f, chunk_size)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            name = stream.decode()
+            stream.expect(":")
+            if stream.peek() == "[":
+                stream.expect("[")
+                if stream.peek() == "]":
+                    stream.expect("]")
+                else:
+                    while True:
+                        stream.peek()
+                        start = stream.tell()
+                        item = stream.decode()
+                        if name in remaining:
+                            yield name, "item", item, start, stream.tell()
+                        if stream.next_char() == "]":
+                            break
+            else:
+                stream.peek()
+                start = stream.tell()
+                value = stream.decode()
+                if name in remaining:
+                    yield name, "value", value, start, stream.tell()
+            remaining.discard(name)
+            if not remaining or stream.next_char() == "}":
+                return
+
+
+def iter_json_array(json_path:str, key:str, chunk_size:int=1 << 16):
+    """
+    Iterates over the items of a top-level array of a JSON file without loading the whole file.
+
+    Args:
+        json_path (str): The path of the JSON file.
+        key (str): The top-level key of the array, e.g. "sounds" or "annotations".
+        chunk_size (int): The number of characters read from the file at a time.
+
+    Yields:
+        item: The decoded items of the array, in order.
+    """
+    for _, kind, item, _, _ in _iter_top_level(json_path, [key], chunk_size):
+        if kind == "item":
+            yield item
+
+
+def load_json_section(json_path:str, key:str, chunk_size:int=1 << 16):
+    """
+    Loads a single top-level value of a JSON file (e.g. "info") without loading the whole file.
+
+    Args:
+        json_path (str): The path of the JSON file.
+        key (str): The top-level key of the value.
+        chunk_size (int): The number of characters read from the file at a time.
+
+    Returns:
+        value: The decoded value, a list if the value is an array, or None if the key does not exist.
+    """
+    items = []
+    for _, kind, item, _, _ in _iter_top_level(json_path, [key], chunk_size):
+        if kind == "value":
+            return item
+        items.append(item)
+    return items if items else None
+
+
+def iter_json_offsets(json_path:str, keys:list, chunk_size:int=1 << 16):
+    """
+    Iterates over the values and array items stored under the given top-level keys of a JSON file,
+    together with their byte offsets in the file.
+
+    Args:
+        json_path (str): The path of the JSON file.
+        keys (list): The top-level keys to read, e.g. ["sounds", "annotations"].
+        chunk_size (int): The number of bytes read from the file at a time.
+
+    Yields:
+        key, value, start, end: The key of the section, the decoded value or array item, and its byte offsets.
+    """
+    # Latin-1 maps every byte to one character, so character offsets are byte offsets. Multi-byte
+    # UTF-8 characters only occur inside strings, which are decoded again as UTF-8 when they are needed.
+    for key, _, value, start, end in _iter_top_level(json_path, keys, chunk_size, encoding="latin-1"):
+        yield key, value, start, end
+
+
+class JsonStreamWriter:
+    """
+    Writes a JSON object section by section, so arrays can be filled one item at a time. The output
+    is identical to json.dump(data, f, indent=4) for the same data. Non-ASCII characters are escaped
+    as in json.dump, so the character offsets returned by the write methods are also byte offsets.
+
+    Attributes:
+        file: The text file the JSON is written to.
+        position (int): The number of characters written so far.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.position = 0
+        self._n_keys = 0
+        self._n_items = 0
+
+    def _write(self, text:str):
+        self.file.write(text)
+        self.position += len(text)
+
+    def _write_key(self, key:str):
+        prefix = "{" if self._n_keys == 0 else ","
+        self._write(f"{prefix}\n    {json.dumps(key)}: ")
+        self._n_keys += 1
+
+    def write_value(self, key:str, value):
+        """
+        Writes a complete top-level value.
+
+        Returns:
+            start, end (int): The character offsets of the value in the output.
+        """
+        self._write_key(key)
+        start = self.position
+        self._write(json.dumps(value, indent=4).replace("\n", "\n    "))
+        return start, self.position
+
+    def begin_array(self, key:str):
+        """Opens a top-level array that is filled with write_item."""
+        self._write_key(key)
+        self._write("[")
+        self._n_items = 0
+
+    def write_item(self, item):
+        """
+        Appends an item to the array opened with begin_array.
+
+        Returns:
+            start, end (int): The character offsets of the item in the output.
+        """
+        self._write("," if self._n_items else "")
+        self._write("\n        ")
+        start = self.position
+        self._write(json.dumps(item, indent=4).replace("\n", "\n        "))
+        self._n_items += 1
+        return start, self.position
+
+    def end_array(self):
+        """Closes the array opened with begin_array."""
+        self._write("\n    ]" if self._n_items else "]")
+
+    def close(self):
+        """Closes the top-level object."""
+        self._write("{}" if self._n_keys == 0 else "\n}")
@@ -0,0 +1,149 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import threading
+import argparse
+import json
+import time
+import csv
+import os
+
+
+class MockTaxonomyServer:
+    """
+    A local stand-in for the iNaturalist search API, used to test and benchmark taxonomy resolution offline.
+    It answers GET /v1/search?q=<name> in the same format as iNaturalist, can add a fixed latency to every
+    request and can enforce a rate limit by answering 429 with a Retry-After header.
+
+    Attributes:
+        synonyms (dict): Maps query names to the standardized names returned. Names that are not in the
+            dictionary are returned unchanged, unless unknown_names_match is False.
+        latency (float): Seconds the server waits before answering each request.
+        rate_limit (float): Maximum number of requests per second before answering 429, or None for no limit.
+        retry_after (float): The value of the Retry-After header sent with 429 responses.
+        unknown_names_match (bool): Whether names missing from synonyms are found.
+        request_count (int): Number of requests received.
+        rate_limited_count (int): Number of requests answered with 429.
+    """
+
+    def __init__(self, synonyms:dict=None, latency:float=0.0, rate_limit:float=None, retry_after:float=1.0, unknown_names_match:bool=True, host:str="127.0.0.1", port:int=0):
+        self.synonyms = synonyms or {}
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.unknown_names_match = unknown_names_match
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self._request_times = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @classmethod
+    def from_cache(cls, cache_file:str, **kwargs):
+        """Creates a server whose synonyms are the original → standard names of a cache CSV."""
+        synonyms = {}
+        with open(cache_file, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if len(row) >= 2:
+                    synonyms[row[0]] = row[1]
+        return cls(synonyms=synonyms, **kwargs)
+
+    @property
+    def url(self):
+        """The search endpoint to pass to TaxonomyResolver."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/search"
+
+    def _is_rate_limited(self):
+        if self.rate_limit is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._request_times = [t for t in self._request_times if now - t < 1.0]
+            if len(self._request_times) >= self.rate_limit:
+                self.rate_limited_count += 1
+                return True
+            self._request_times.append(now)
+            return False
+
+    def _search(self, name:str):
+        if name in self.synonyms:
+            standard_name = self.synonyms[name]
+        elif self.unknown_names_match:
+            standard_name = name
+        else:
+            return {"total_results": 0, "page": 1, "per_page": 1, "results": []}
+        record = {"name": standard_name, "matched_term": name, "rank": "species"}
+        return {"total_results": 1, "page": 1, "per_page": 1, "results": [{"type": "Taxon", "record": record}]}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                url = urlparse(self.path)
+                if url.path != "/v1/search":
+                    self.send_error(404)
+                    return
+                if server._is_rate_limited():
+                    self.send_response(429)
+                    self.send_header("Retry-After", str(server.retry_after))
+                    self.end_headers()
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                name = parse_qs(url.query).get("q", [""])[0]
+                body = json.dumps(server._search(name)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Starts serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the iNaturalist taxonomy search API.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("--cache", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache.csv"), help="Cache CSV whose entries are served as synonyms.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each request.")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second before answering 429.")
+    args = parser.parse_args()
+
+    server = MockTaxonomyServer.from_cache(args.cache, latency=args.latency, rate_limit=args.rate_limit, port=args.port)
+    print(f"Serving mock taxonomy API at {server.url}")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
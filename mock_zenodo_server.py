@@ -0,0 +1,223 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, unquote
+from zipfile import ZipFile
+from io import BytesIO
+import threading
+import argparse
+import hashlib
+import json
+import time
+import re
+import os
+
+
+class MockZenodoServer:
+    """
+    A local stand-in for the Zenodo records API, used to test and benchmark dataset downloads offline.
+    It answers GET /api/records/<id> with the metadata and files of a record, including their MD5
+    checksums, serves every file at /api/records/<id>/files/<key>/content with support for HTTP Range
+    requests, and serves the whole record as a zip at /api/records/<id>/files-archive.
+
+    Attributes:
+        records (dict): Maps record ids to dictionaries with the "metadata" of the record and its "files",
+            a dictionary from file names to their content as bytes.
+        latency (float): Seconds the server waits before answering each request.
+        bandwidth (float): Maximum bytes per second sent per response, or None for no limit.
+        interrupt_after (int): Drop the connection after sending this many bytes of the first response of
+            every file, to test resumed downloads. None sends files whole.
+        corrupt (set): Keys of the files served with one byte changed, to test checksum verification.
+        request_count (int): Number of requests received.
+        range_request_count (int): Number of requests with a Range header.
+    """
+
+    def __init__(self, records:dict=None, latency:float=0.0, bandwidth:float=None, interrupt_after:int=None, corrupt:set=None, host:str="127.0.0.1", port:int=0):
+        self.records = {str(record_id): record for record_id, record in (records or {}).items()}
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.interrupt_after = interrupt_after
+        self.corrupt = set(corrupt or ())
+        self.request_count = 0
+        self.range_request_count = 0
+        self._interrupted = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @classmethod
+    def from_directory(cls, directory:str, **kwargs):
+        """
+        Creates a server whose records are the subdirectories of directory, named after their record id.
+        The files of a subdirectory are the files of the record, and an optional metadata.json holds its metadata.
+        """
+        records = {}
+        for record_id in sorted(os.listdir(directory)):
+            record_dir = os.path.join(directory, record_id)
+            if not os.path.isdir(record_dir):
+                continue
+            metadata = {"title": f"Record {record_id}"}
+            files = {}
+            for file_name in sorted(os.listdir(record_dir)):
+                with open(os.path.join(record_dir, file_name), "rb") as f:
+                    if file_name == "metadata.json":
+                        metadata = json.load(f)
+                    else:
+                        files[file_name] = f.read()
+            records[record_id] = {"metadata": metadata, "files": files}
+        return cls(records=records, **kwargs)
+
+    @property
+    def api_url(self):
+        """The base URL of the API, to pass as the api_url of the downloader."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def archive_url(self, record_id):
+        """The files-archive URL of a record, as listed in the dataset table of prepare_data."""
+        return f"{self.api_url}/records/{record_id}/files-archive"
+
+    def _record_json(self, record_id:str):
+        record = self.records[record_id]
+        files = [{
+            "key": key,
+            "size": len(content),
+            "checksum": f"md5:{hashlib.md5(content).hexdigest()}",
+            "links": {"self": f"{self.api_url}/records/{record_id}/files/{key}/content"},
+        } for key, content in record["files"].items()]
+        return {"id": int(record_id) if record_id.isdigit() else record_id, "metadata": record.get("metadata", {}), "files": files}
+
+    def _archive(self, record_id:str):
+        buffer = BytesIO()
+        with ZipFile(buffer, "w") as archive:
+            for key, content in self.records[record_id]["files"].items():
+                archive.writestr(key, content)
+        return buffer.getvalue()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_body(self, body:bytes, limit:int=None):
+                """Sends the body in blocks, throttled to the bandwidth and cut after limit bytes."""
+                block_size = 1 << 16
+                sent = 0
+                while sent < len(body):
+                    if limit is not None and sent >= limit:
+                        self.close_connection = True
+                        return
+                    block = body[sent:sent + min(block_size, limit - sent if limit is not None else block_size)]
+                    self.wfile.write(block)
+                    sent += len(block)
+                    if server.bandwidth:
+                        time.sleep(len(block) / server.bandwidth)
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                path = unquote(urlparse(self.path).path)
+                match = re.fullmatch(r"/api/records/([^/]+)(/files-archive|/files/(.+)/content)?", path)
+                if not match or match.group(1) not in server.records:
+                    self.send_error(404)
+                    return
+                record_id, suffix, key = match.groups()
+
+                if suffix is None:
+                    body = json.dumps(server._record_json(record_id)).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                if suffix == "/files-archive":
+                    body = server._archive(record_id)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/zip")
+                    self.send_header("Content-Disposition", f'attachment; filename="{record_id}.zip"')
+                    self.end_headers()
+                    self.close_connection = True
+                    self._send_body(body)
+                    return
+
+                files = server.records[record_id]["files"]
+                if key not in files:
+                    self.send_error(404)
+                    return
+                body = files[key]
+                if key in server.corrupt and body:
+                    body = bytes([body[0] ^ 0xFF]) + body[1:]
+                start = 0
+                range_header = self.headers.get("Range")
+                if range_header:
+                    with server._lock:
+                        server.range_request_count += 1
+                    range_match = re.fullmatch(r"bytes=(\d+)-", range_header.strip())
+                    if not range_match or int(range_match.group(1)) >= len(body):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(body)}")
+                        self.end_headers()
+                        return
+                    start = int(range_match.group(1))
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Disposition", f'attachment; filename="{key}"')
+                self.send_header("Content-Length", str(len(body) - start))
+                self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+
+                limit = None
+                with server._lock:
+                    if server.interrupt_after is not None and (record_id, key) not in server._interrupted:
+                        server._interrupted.add((record_id, key))
+                        limit = server.interrupt_after
+                self._send_body(body[start:], limit)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Starts serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Zenodo records API.")
+    parser.add_argument("directory", help="Directory with one subdirectory of files per record, named after the record id.")
+    parser.add_argument("--port", type=int, default=8766, help="Port to listen on.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each request.")
+    parser.add_argument("--bandwidth", type=float, default=None, help="Maximum bytes per second per response.")
+    parser.add_argument("--interrupt-after", type=int, default=None, help="Drop the first response of every file after this many bytes.")
+    args = parser.parse_args()
+
+    server = MockZenodoServer.from_directory(args.directory, latency=args.latency, bandwidth=args.bandwidth, interrupt_after=args.interrupt_after, port=args.port)
+    print(f"Serving mock Zenodo API at {server.api_url} with records {', '.join(server.records)}")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import platform
+import json
+import time
+import sys
+import os
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of the current process in MiB, or None where it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+
+class PipelineMetrics:
+    """
+    Collects the wall time, CPU time, peak memory and item counts of the stages of a pipeline, and saves
+    them as a JSON file so runs over different dataset sizes can be compared.
+
+    Attributes:
+        name (str): The name of the pipeline run, e.g. the dataset name.
+        stages (list): One dictionary per finished stage.
+    """
+
+    def __init__(self, name:str):
+        self.name = name
+        self.stages = []
+        self.started_at = datetime.now(timezone.utc)
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    @contextmanager
+    def stage(self, name:str, count=None, unit:str="items"):
+        """
+        Measures a stage of the pipeline.
+
+        Args:
+            name (str): The name of the stage.
+            count (Optional[callable]): Called without arguments when the stage ends, returns the number of
+                items the stage processed. Used to compute the throughput.
+            unit (str): What the counted items are, e.g. "sounds" or "annotations".
+        """
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        status = "failed"
+        try:
+            yield
+            status = "ok"
+        finally:
+            wall_time = time.perf_counter() - start_wall
+            items = count() if count is not None and status == "ok" else None
+            self.stages.append({
+                "stage": name,
+                "status": status,
+                "wall_time": wall_time,
+                "cpu_time": time.process_time() - start_cpu,
+                "peak_rss_mb": peak_rss_mb(),
+                "items": items,
+                "unit": unit if items is not None else None,
+                "throughput": items / wall_time if items is not None and wall_time > 0 else None,
+            })
+
+    def to_dict(self):
+        """Returns the metrics as a JSON-serializable dictionary."""
+        return {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "total": {
+                "wall_time": time.perf_counter() - self._start_wall,
+                "cpu_time": time.process_time() - self._start_cpu,
+                "peak_rss_mb": peak_rss_mb(),
+            },
+            "stages": self.stages,
+        }
+
+    def save(self, path:str):
+        """Writes the metrics to a JSON file."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    def report(self):
+        """Returns a table with the metrics of every stage."""
+        lines = [f"{'stage':<20} {'wall (s)':>9} {'cpu (s)':>9} {'peak RSS (MiB)':>15} {'items':>10} {'items/s':>11}"]
+        for stage in self.stages:
+            peak = f"{stage['peak_rss_mb']:.1f}" if stage["peak_rss_mb"] is not None else "-"
+            items = f"{stage['items']}" if stage["items"] is not None else "-"
+            throughput = f"{stage['throughput']:.1f}" if stage["throughput"] is not None else "-"
+            status = "" if stage["status"] == "ok" else f" ({stage['status']})"
+            lines.append(f"{stage['stage'] + status:<20} {stage['wall_time']:>9.2f} {stage['cpu_time']:>9.2f} {peak:>15} {items:>10} {throughput:>11}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profiled(output_path:str, profiler:str=None):
+    """
+    Profiles the code in the block with cProfile or pyinstrument and writes the result next to output_path.
+    cProfile results are saved as <output_path>.prof and can be opened with pstats or snakeviz, and
+    pyinstrument results as <output_path>.html. Does nothing if profiler is None.
+
+    Args:
+        output_path (str): The path of the profile without extension.
+        profiler (Optional[str]): "cprofile", "pyinstrument" or None.
+    """
+    if profiler is None:
+        yield
+        return
+    if profiler == "cprofile":
+        import cProfile
+        import pstats
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(f"{output_path}.prof")
+            pstats.Stats(profile).sort_stats("cumulative").print_stats(20)
+            print(f"Profile saved to {output_path}.prof")
+    elif profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ImportError("pyinstrument is required for profiler='pyinstrument'. Install it with: pip install pyinstrument")
+        profile = Profiler()
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            with open(f"{output_path}.html", "w", encoding="utf-8") as f:
+                f.write(profile.output_html())
+            print(profile.output_text())
+            print(f"Profile saved to {output_path}.html")
+    else:
+        raise ValueError(f"Unknown profiler '{profiler}'. Expected 'cprofile' or 'pyinstrument'.")
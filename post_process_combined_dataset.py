@@ -0,0 +1,180 @@
+from annotation_index import write_dataset_json
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+import argparse
+import heapq
+import json
+
+
+def sweep_overlap_group(t_min, t_max, category_ids):
+    """
+    Finds the annotations of an overlap group that overlap an annotation of a different category.
+
+    The annotations are swept in t_min order while a heap keeps the ones still active. Every active
+    annotation that is not marked yet is kept in a set of its category, so each annotation is marked
+    once and the sweep takes O(n log n).
+
+    Args:
+        t_min (ndarray): The start times of the annotations, sorted.
+        t_max (ndarray): The end times of the annotations.
+        category_ids (ndarray): The category ids of the annotations.
+
+    Returns:
+        multilabel (ndarray): A boolean array that is True for the annotations overlapping another category.
+    """
+    multilabel = np.zeros(len(t_min), dtype=bool)
+    active = []
+    active_counts = {}
+    unmarked = {}
+    for i, (start, end, category) in enumerate(zip(t_min.tolist(), t_max.tolist(), category_ids.tolist())):
+        while active and active[0][0] <= start:
+            _, j, ended_category = heapq.heappop(active)
+            active_counts[ended_category] -= 1
+            if not active_counts[ended_category]:
+                del active_counts[ended_category]
+            unmarked.get(ended_category, set()).discard(j)
+        others = [other for other in active_counts if other != category]
+        if others:
+            multilabel[i] = True
+            for other in others:
+                for j in unmarked.pop(other, ()):
+                    multilabel[j] = True
+        else:
+            unmarked.setdefault(category, set()).add(i)
+        heapq.heappush(active, (end, i, category))
+        active_counts[category] = active_counts.get(category, 0) + 1
+    return multilabel
+
+
+def _sweep_overlap_groups(t_min, t_max, category_ids, group_starts, group_ends):
+    """Sweeps the groups of a contiguous slice of sorted annotations. Group bounds are relative to the slice."""
+    multilabel = np.zeros(len(t_min), dtype=bool)
+    for start, end in zip(group_starts.tolist(), group_ends.tolist()):
+        multilabel[start:end] = sweep_overlap_group(t_min[start:end], t_max[start:end], category_ids[start:end])
+    return multilabel
+
+
+def compute_overlaps(annotations:list, max_workers:int=None, chunk_size:int=10000):
+    """
+    Computes the overlap groups and the ismultilabel flag of the annotations of a dataset.
+
+    The annotations of every sound are sorted by t_min and swept once: a new overlap group starts when an
+    annotation begins at or after the end of all the previous ones, so every group is a maximal run of
+    annotations chained by overlaps. Groups with a single category have no multilabel annotations; the
+    others are swept again to find the annotations that overlap one of a different category. The groups
+    are independent, so they are split in chunks and swept by a process pool.
+
+    Args:
+        annotations (list): The annotations in the annotations.json schema.
+        max_workers (Optional[int]): The number of worker processes. 1 sweeps in the current process.
+            Defaults to the number of CPUs.
+        chunk_size (int): The number of multi-category groups sent to a worker at once.
+
+    Returns:
+        overlap_groups (ndarray): The overlap group of every annotation, numbered from 0 in t_min order within its sound.
+        multilabel (ndarray): True for the annotations that overlap an annotation of a different category.
+    """
+    df = pd.DataFrame({
+        "sound_id": [anno["sound_id"] for anno in annotations],
+        "t_min": [anno["t_min"] for anno in annotations],
+        "t_max": [anno["t_max"] for anno in annotations],
+        "category_id": [anno["category_id"] for anno in annotations],
+    })
+    order = np.lexsort((df["t_max"].to_numpy(), df["t_min"].to_numpy(), df["sound_id"].to_numpy()))
+    df = df.iloc[order].reset_index(drop=True)
+
+    previous_end = df.groupby("sound_id")["t_max"].cummax().groupby(df["sound_id"]).shift()
+    new_group = previous_end.isna().to_numpy() | (df["t_min"] >= previous_end).to_numpy()
+    group_ids = np.cumsum(new_group) - 1
+
+    sorted_multilabel = np.zeros(len(df), dtype=bool)
+    categories_per_group = df.groupby(group_ids)["category_id"].nunique().to_numpy()
+    group_starts = np.flatnonzero(new_group)
+    group_ends = np.append(group_starts[1:], len(df))
+    mixed_groups = np.flatnonzero(categories_per_group > 1)
+
+    t_min = df["t_min"].to_numpy(dtype=float)
+    t_max = df["t_max"].to_numpy(dtype=float)
+    category_ids = df["category_id"].to_numpy()
+    # Every chunk is a contiguous slice of the sorted annotations, so it is sent to a worker as three arrays
+    chunks = []
+    for i in range(0, len(mixed_groups), chunk_size):
+        groups = mixed_groups[i:i + chunk_size]
+        first, last = group_starts[groups[0]], group_ends[groups[-1]]
+        chunks.append((first, last, (t_min[first:last], t_max[first:last], category_ids[first:last], group_starts[groups] - first, group_ends[groups] - first)))
+    if max_workers == 1 or len(chunks) <= 1:
+        results = [_sweep_overlap_groups(*arguments) for _, _, arguments in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_sweep_overlap_groups, *zip(*(arguments for _, _, arguments in chunks))))
+    for (first, last, _), multilabel in zip(chunks, results):
+        sorted_multilabel[first:last] = multilabel
+
+    # Number the groups from 0 within every sound, so they stay valid when datasets are combined
+    first_group_ids = pd.Series(group_ids).groupby(df["sound_id"]).transform("min").to_numpy()
+    overlap_groups = np.empty(len(df), dtype=np.int64)
+    overlap_groups[order] = group_ids - first_group_ids
+    multilabel = np.empty(len(df), dtype=bool)
+    multilabel[order] = sorted_multilabel
+    return overlap_groups, multilabel
+
+
+def cooccurrence_statistics(annotations:list):
+    """
+    Counts how often the categories of a dataset are heard together. Two categories co-occur once for
+    every overlap group of a sound that contains both.
+
+    Args:
+        annotations (list): The annotations, with their overlap_group already set.
+
+    Returns:
+        cooccurrences (DataFrame): One row per pair of categories, with the columns category_a, category_b and groups.
+    """
+    df = pd.DataFrame({"sound_id": [anno["sound_id"] for anno in annotations],
+                       "overlap_group": [anno["overlap_group"] for anno in annotations],
+                       "category": [anno["category"] for anno in annotations]}).drop_duplicates()
+    df = df[df.groupby(["sound_id", "overlap_group"])["category"].transform("size") > 1]
+    pairs = df.merge(df, on=["sound_id", "overlap_group"], suffixes=("_a", "_b"))
+    pairs = pairs[pairs["category_a"] < pairs["category_b"]]
+    counts = pairs.groupby(["category_a", "category_b"]).size().rename("groups").reset_index()
+    return counts.sort_values("groups", ascending=False).reset_index(drop=True)
+
+
+def post_process_annotations(annotations:list, max_workers:int=None):
+    """
+    Sets the ismultilabel and overlap_group fields of every annotation in place.
+
+    Returns:
+        n_multilabel (int): The number of multilabel annotations.
+    """
+    if not annotations:
+        return 0
+    overlap_groups, multilabel = compute_overlaps(annotations, max_workers=max_workers)
+    for anno, group, is_multilabel in zip(annotations, overlap_groups.tolist(), multilabel.tolist()):
+        anno["ismultilabel"] = is_multilabel
+        anno["overlap_group"] = group
+    return int(multilabel.sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Set the ismultilabel and overlap_group fields of the annotations of a dataset.")
+    parser.add_argument("json_path", help="The annotations JSON file to update in place, e.g. a combined dataset in data/combined_datasets.")
+    parser.add_argument("--max-workers", type=int, default=None, help="Number of worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("--cooccurrences", default=None, help="Write the category co-occurrence counts to this CSV file.")
+    args = parser.parse_args()
+
+    with open(args.json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    n_multilabel = post_process_annotations(data["annotations"], max_workers=args.max_workers)
+    write_dataset_json(data, args.json_path)
+    print(f"✅ {n_multilabel} of {len(data['annotations'])} annotations are multilabel")
+
+    if args.cooccurrences:
+        cooccurrences = cooccurrence_statistics(data["annotations"])
+        cooccurrences.to_csv(args.cooccurrences, index=False)
+        print(f"✅ Saved {len(cooccurrences)} category co-occurrences to {args.cooccurrences}")
+
+
+if __name__ == "__main__":
+    main()
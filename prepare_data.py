@@ -1,110 +1,127 @@
-from zipfile import ZipFile  
-from tqdm import tqdm  
-from io import BytesIO 
+from dataset_downloader import DatasetDownloader, ZENODO_API_URL, DOWNLOAD_DIR
+from archive_extraction import extract_archive, nested_extract_dir
 import argparse
-import requests  
-import tempfile 
+import shutil
 import os  
 
-def unzip_nested_files(directory):  
+# Dictionary of datasets, where keys are the dataset names and values are lists of URLs (some datasets may have multiple parts)
+DATASETS = {  
+    "BirdVox-DCASE-20k": ["https://zenodo.org/api/records/1208080/files-archive"],
+    "Beehive": ["https://zenodo.org/api/records/2667806/files-archive"],
+    "Chiffchaff_LittleOwl_TreePipit": ["https://zenodo.org/api/records/1413495/files-archive"],
+    "Colombia_Costa_Rica_Birds": ["https://zenodo.org/api/records/7525349/files-archive"],
+    "Domestic_Canari": ["https://zenodo.org/api/records/6521932/files-archive"],  
+    "DV3V": ["https://zenodo.org/api/records/11544734/files-archive"],
+    "HumBugDB": ["https://zenodo.org/api/records/4904800/files-archive"],
+    "North_American_Bird_Species": ["https://zenodo.org/api/records/1250690/files-archive"],  
+    "Southwestern_Amazon_Basin_Soundscape": ["https://zenodo.org/api/records/7079124/files-archive"],
+    "Pin-tailed_Whydah": ["https://zenodo.org/api/records/6330711/files-archive"], 
+    "Thyolo_Alethe": ["https://zenodo.org/api/records/6328244/files-archive"],
+    "Hawaii_Birds": ["https://zenodo.org/api/records/7078499/files-archive"],
+    "Northeastern_US_Soundscapes": ["https://zenodo.org/api/records/7079380/files-archive"],
+    "Southern_Sierra_Nevada_Birds": ["https://zenodo.org/api/records/7525805/files-archive"],
+    "WABAD": ["https://zenodo.org/api/records/14191524/files-archive"],
+    "Western_United_States_Soundscapes": ["https://zenodo.org/api/records/7050014/files-archive"],
+}  
+
+def unzip_nested_files(directory, max_workers=None):  
+    """Extracts every zip file under directory into a folder named after it, and removes the zip file."""
     for root, dirs, files in os.walk(directory):  
+        # Skip the files kept by the downloader
+        dirs[:] = [d for d in dirs if d != DOWNLOAD_DIR]
         for file in files:  
             if file.endswith('.zip'):  
                 file_path = os.path.join(root, file)  
-                folder_name = os.path.splitext(file)[0]  
-                extract_path = os.path.join(root, folder_name)  
-                  
-                # Create the directory if it doesn't exist  
-                os.makedirs(extract_path, exist_ok=True)  
-                  
-                with ZipFile(file_path, 'r') as zip_ref:  
-                    zip_ref.extractall(extract_path)  
-                  
+                extract_path = nested_extract_dir(root, file)
+                extract_archive(file_path, extract_path, max_workers)
                 os.remove(file_path)  # Remove the zip file after extracting  
                 print(f"Extracted nested zip file {file_path} into {extract_path}")
   
-def download_and_unzip(url, extract_to='data'):  
-    # Ensure the data directory exists  
-    if not os.path.exists(extract_to):  
-        os.makedirs(extract_to)  
-      
-    # Download the file from the URL  
-    response = requests.get(url, stream=True)  
-    if response.status_code == 200:
-        
-        total_size = int(response.headers.get('content-length', 0))  
-        block_size = 1024  # 1 Kibibyte 
+def extract_downloads(dataset_dir, manifest, keep_archives=False, max_workers=None):
+    """
+    Extracts the downloaded files of a dataset into its directory, as if the files-archive of the record
+    had been extracted there: zip files, and the zip files nested in them, go to folders named after them,
+    and other files are moved as they are.
 
-        content_disposition = response.headers.get("content-disposition")  
-        filename = content_disposition.split('filename=')[1].strip('"')
-        
-        if filename.endswith('.zip'):
+    Args:
+        dataset_dir (str): The directory of the dataset.
+        manifest (DownloadManifest): The manifest of the downloads of the dataset.
+        keep_archives (bool): Keep the downloaded files in .downloads.
+        max_workers (Optional[int]): The number of extraction processes. Defaults to the number of CPUs.
+    """
+    download_dir = os.path.dirname(manifest.path)
+    for key, entry in manifest.files.items():
+        if entry["extracted"]:
+            continue
+        path = os.path.join(download_dir, key)
+        if key.endswith('.zip'):
+            extract_archive(path, nested_extract_dir(dataset_dir, key), max_workers)
+            if not keep_archives:
+                os.remove(path)
+        elif keep_archives:
+            shutil.copy2(path, os.path.join(dataset_dir, key))
+        else:
+            os.replace(path, os.path.join(dataset_dir, key))
+        manifest.mark_extracted(key)
+    print(f"Extracted to {dataset_dir}")
 
-            temp_file = tempfile.NamedTemporaryFile(delete=False)  
-            temp_file_path = temp_file.name  
-    
-            t = tqdm(total=total_size, unit='iB', unit_scale=True, desc="Downloading")  
-            for data in response.iter_content(block_size):  
-                t.update(len(data))  
-                temp_file.write(data)  
-            t.close()  
-            temp_file.close()  
-            if total_size != 0 and t.n != total_size:  
-                print("ERROR, something went wrong")  
-                return  
-    
-            print(f"Successfully downloaded from {url}")  
+def prepare_datasets(datasets, data_dir='data', api_url=ZENODO_API_URL, max_workers=4, keep_archives=False):
+    """
+    Downloads several datasets concurrently and extracts every dataset as soon as all of its files are
+    downloaded. Datasets with failed downloads are not extracted, but do not keep the others from it.
 
-            # Unzip the file into the directory with a progress bar  
-            with ZipFile(temp_file_path) as zipfile:  
-                zip_info_list = zipfile.infolist()  
-                for zip_info in tqdm(zip_info_list, desc="Extracting"):  
-                    zipfile.extract(zip_info, extract_to)  
-    
-            print(f"Extracted to {extract_to}")  
-    
-            # Check for nested zip files and unzip them  
-            unzip_nested_files(extract_to)  
-    
-            # Remove the temporary file  
-            os.remove(temp_file_path)  
+    Args:
+        datasets (dict): Maps dataset names to lists of URLs.
+        data_dir (str): The directory with one subdirectory per dataset.
+        api_url (str): The base URL of the Zenodo API.
+        max_workers (int): The maximum number of files downloaded at the same time.
+        keep_archives (bool): Keep the downloaded files in the .downloads directory of every dataset.
 
-        else:
-            print("The file is not a zip file")
+    Raises:
+        RuntimeError: If any download or extraction failed, after the other datasets are extracted.
+    """
+    extraction_errors = []
 
-    else:  
-        print(f"Failed to download from {url}, status code: {response.status_code}")  
-  
-def main():
+    def on_done(dataset_name, manifest, errors):
+        if errors:
+            print(f"❌ Not extracting {dataset_name}: {len(errors)} of its downloads failed")
+            return
+        try:
+            extract_downloads(os.path.join(data_dir, dataset_name), manifest, keep_archives)
+        except Exception as e:
+            extraction_errors.append(f"{dataset_name}: {type(e).__name__}: {e}")
+            print(f"❌ Failed to extract {dataset_name}: {e}")
+
+    downloader = DatasetDownloader(data_dir=data_dir, api_url=api_url, max_workers=max_workers)
+    downloader.download(datasets, on_done=on_done)
+    if extraction_errors:
+        raise RuntimeError(f"{len(extraction_errors)} extractions failed:\n" + "\n".join(extraction_errors))
 
-    # Dictionary of datasets, where keys are the dataset names and values are lists of URLs (some datasets may have multiple parts)
-    datasets = {  
-        "BirdVox-DCASE-20k": ["https://zenodo.org/api/records/1208080/files-archive"],
-        "Beehive": ["https://zenodo.org/api/records/2667806/files-archive"],
-        "Chiffchaff_LittleOwl_TreePipit": ["https://zenodo.org/api/records/1413495/files-archive"],
-        "Colombia_Costa_Rica_Birds": ["https://zenodo.org/api/records/7525349/files-archive"],
-        "Domestic_Canari": ["https://zenodo.org/api/records/6521932/files-archive"],  
-        "DV3V": ["https://zenodo.org/api/records/11544734/files-archive"],
-        "HumBugDB": ["https://zenodo.org/api/records/4904800/files-archive"],
-        "North_American_Bird_Species": ["https://zenodo.org/api/records/1250690/files-archive"],  
-        "Southwestern_Amazon_Basin_Soundscape": ["https://zenodo.org/api/records/7079124/files-archive"],
-        "Pin-tailed_Whydah": ["https://zenodo.org/api/records/6330711/files-archive"], 
-        "Thyolo_Alethe": ["https://zenodo.org/api/records/6328244/files-archive"],
-        "Hawaii_Birds": ["https://zenodo.org/api/records/7078499/files-archive"],
-        "Northeastern_US_Soundscapes": ["https://zenodo.org/api/records/7079380/files-archive"],
-        "Southern_Sierra_Nevada_Birds": ["https://zenodo.org/api/records/7525805/files-archive"],
-        "WABAD": ["https://zenodo.org/api/records/14191524/files-archive"],
-        "Western_United_States_Soundscapes": ["https://zenodo.org/api/records/7050014/files-archive"],
-    }  
+def download_and_unzip(url, extract_to='data', api_url=ZENODO_API_URL):
+    """Downloads the files of a URL into the dataset directory extract_to and extracts them."""
+    prepare_datasets({os.path.basename(os.path.normpath(extract_to)): [url]}, os.path.dirname(os.path.normpath(extract_to)) or '.', api_url)
 
+def main():
     parser = argparse.ArgumentParser(description="Download and extract datasets.")
-    parser.add_argument("--dataset", choices=datasets.keys(), help="Name of the dataset to download.")
+    parser.add_argument("--dataset", nargs="+", choices=DATASETS.keys(), help="Names of the datasets to download.")
+    parser.add_argument("--all", action="store_true", help="Download every dataset.")
+    parser.add_argument("--data-dir", default="data", help="Directory with one subdirectory per dataset.")
+    parser.add_argument("--api-url", default=ZENODO_API_URL, help="Base URL of the Zenodo API, e.g. a local mock_zenodo_server.")
+    parser.add_argument("--max-workers", type=int, default=4, help="Maximum number of files downloaded at the same time.")
+    parser.add_argument("--keep-archives", action="store_true", help="Keep the downloaded archives after extracting them.")
+    parser.add_argument("--pipeline", action="store_true", help="Extract the archives while they download and run the reader of every dataset as soon as it is complete.")
     args = parser.parse_args()
 
-    dataset_name = args.dataset
-    dataset_dir = os.path.join('data', dataset_name)
-    for url in datasets[dataset_name]:
-        download_and_unzip(url, extract_to=dataset_dir)
+    if not args.all and not args.dataset:
+        parser.error("Pass --dataset or --all.")
+    dataset_names = list(DATASETS) if args.all else args.dataset
+    datasets = {name: DATASETS[name] for name in dataset_names}
+    if args.pipeline:
+        # The readers import pandas and the audio libraries, which the plain download does not need
+        from download_pipeline import StreamingPipeline
+        StreamingPipeline(args.data_dir, args.api_url, args.max_workers, keep_archives=args.keep_archives).run(datasets)
+    else:
+        prepare_datasets(datasets, args.data_dir, args.api_url, args.max_workers, args.keep_archives)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,28 +1,164 @@
 import sys
 import os
+import io
+import csv
 import json
-import matplotlib.pyplot as plt
-import seaborn as sns
+import pandas as pd
 import numpy as np
-import librosa
-import librosa.display
 import argparse
-import matplotlib.ticker as ticker
+import importlib
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from coco_standard_format import AnnotationCreator
+from audio_metadata import AudioMetadataCache
+from dataset_manifest import DatasetManifest, file_fingerprint, is_unchanged
+from pipeline_metrics import PipelineMetrics, profiled
+from interval_index import IntervalIndex
+from clip_extraction import read_segment
+from feature_store import FeatureStore, feature_config
+from post_process_combined_dataset import post_process_annotations
+
+
+READERS_DIR = os.path.dirname(os.path.abspath(__file__))
+RAVEN_ANNOTATION_COLUMNS = ['Begin Time (s)', 'End Time (s)', 'Low Freq (Hz)', 'High Freq (Hz)', 'Species']
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.mp3', '.ogg', '.aiff', '.aif')
+
+
+def _read_text(file_path):
+    with open(file_path, mode='r') as file:
+        return file.read()
+
+
+def read_selection_tables(file_paths, max_workers=8, texts=None):
+    """
+    Reads many tab-separated Raven selection tables. The files are read in a thread pool, and the tables
+    that share a header are parsed together with a single pandas.read_csv call, which is much faster than
+    parsing thousands of small files one by one.
+
+    Args:
+        file_paths (list): The paths of the selection tables.
+        max_workers (int): The number of files read at the same time.
+        texts (Optional[dict]): Contents of tables that were already read, by absolute path. Only the other files are read.
+
+    Returns:
+        headers (dict): Maps the path of every table to its column names, in the order of file_paths.
+        rows (DataFrame): The rows of all the tables, with a table_path column naming the file of each row
+            and a row column with the position of the row in its file. Blank lines are left out.
+    """
+    known = texts or {}
+
+    def read(file_path):
+        path = os.path.abspath(file_path)
+        return known[path] if path in known else _read_text(file_path)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        texts = list(executor.map(read, file_paths))
+
+    headers = {}
+    groups = {}
+    for file_path, text in zip(file_paths, texts):
+        header, _, body = text.partition('\n')
+        columns = [column.strip() for column in header.split('\t')] if header.strip() else []
+        headers[file_path] = columns
+        if not columns:
+            continue
+        if body and not body.endswith('\n'):
+            body += '\n'
+        groups.setdefault(tuple(columns), []).append((file_path, body))
+
+    frames = []
+    for columns, tables in groups.items():
+        text = '\t'.join(columns) + '\n' + ''.join(body for _, body in tables)
+        # Blank lines are kept as empty rows so that every line of a body is one row, and quoting is off
+        # because Raven does not quote fields; only empty cells are missing values, so codes like "NA" are kept
+        df = pd.read_csv(io.StringIO(text), sep='\t', dtype={'Species': str}, keep_default_na=False, na_values=[''],
+                         skip_blank_lines=False, quoting=csv.QUOTE_NONE)
+        df.insert(0, 'table_path', np.repeat([file_path for file_path, _ in tables], [body.count('\n') for _, body in tables]))
+        frames.append(df.dropna(how='all', subset=df.columns[1:]))
+
+    if not frames:
+        return headers, pd.DataFrame(columns=['table_path', 'row'])
+    rows = pd.concat(frames, ignore_index=True)
+    rows['row'] = rows.groupby('table_path', sort=False).cumcount()
+    order = {file_path: i for i, file_path in enumerate(file_paths)}
+    rows = rows.sort_values('table_path', key=lambda paths: paths.map(order), kind='stable', ignore_index=True)
+    return headers, rows
+
+
+def _has_positional_ids(annotations, start):
+    """Checks whether the anno_ids of a range of annotations are their positions in the dataset, as add_annotations_bulk numbers them."""
+    return all(annotation["anno_id"] == start + i for i, annotation in enumerate(annotations))
+
+
+class Prefetcher:
+    """
+    Does the work the reader of a dataset needs for every file as soon as the file is available, e.g. while
+    the rest of the dataset is still being downloaded, and before the reader itself can be created. The
+    headers of audio files are probed into the metadata cache of the dataset, and text files are read for
+    load_selection_tables. Hand it to the reader with use_prefetched. Safe to call from several threads.
+
+    Attributes:
+        audio_metadata (AudioMetadataCache): The audio metadata cache of the dataset.
+        texts (dict): Maps the absolute paths of the text files read so far to their contents.
+    """
+
+    def __init__(self, data_path):
+        self.audio_metadata = AudioMetadataCache(os.path.join(data_path, "audio_metadata_cache.csv"))
+        self.texts = {}
+
+    def add(self, file_path):
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension in AUDIO_EXTENSIONS:
+            self.audio_metadata.get(file_path)
+        elif extension == '.txt':
+            self.texts[os.path.abspath(file_path)] = _read_text(file_path)
 
 
 class BaseReader:
+    # Maps dataset names to reader classes. Every subclass is registered under the name of the module
+    # it is defined in, which is also the name of the dataset directory, unless it sets dataset_name_override.
+    registry = {}
+    dataset_name_override = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        dataset_name = cls.dataset_name_override or cls.__module__
+        if dataset_name != "__main__":
+            BaseReader.registry[dataset_name] = cls
+
     def __init__(self, data_path):
         self.data_path = data_path
         self.dataset_name = os.path.basename(data_path)
         self.output_path = os.path.join(data_path, "annotations.json")
+        self.metrics_path = os.path.join(data_path, "metrics.json")
+        self.feature_store_path = os.path.join(data_path, "features")
         self.annotation_creator = AnnotationCreator()
         self.visualization_dir = os.path.join(data_path, "visualizations")
+        self.audio_metadata = AudioMetadataCache(os.path.join(data_path, "audio_metadata_cache.csv"))
+        self.manifest = DatasetManifest(os.path.join(data_path, "manifest.json"))
+        self.previous_manifest = None
+        self.previous_data = None
+        self._changed_sound_ids = None
+        self._selection_tables = None
+        self._prefetched_texts = {}
+        self._interval_index = None
         self.data = None
     
+    def probe_sounds(self, file_paths):
+        """Reads the duration and sample rate of the given audio files, reusing cached headers of unchanged files."""
+        metadata = self.audio_metadata.probe(file_paths)
+        self.audio_metadata.save()
+        print(self.audio_metadata.report())
+        return metadata
+
+    def use_prefetched(self, prefetcher):
+        """Uses the audio headers and selection tables a Prefetcher gathered while the dataset was being downloaded."""
+        self.audio_metadata = prefetcher.audio_metadata
+        self._prefetched_texts = dict(prefetcher.texts)
+
     def add_dataset_info(self):
         """Method to add dataset metadata (to be implemented in subclasses)."""
         raise NotImplementedError("This method should be implemented in a subclass.")
@@ -39,9 +175,213 @@ class BaseReader:
         """Method to add annotations (to be implemented in subclasses)."""
         raise NotImplementedError("This method should be implemented in a subclass.")
 
+    def add_annotations_bulk(self, annotations_df):
+        """Adds a DataFrame of annotations at once and reports the rows that were rejected."""
+        rejected = self.annotation_creator.add_annotations_bulk(annotations_df)
+        if not rejected.empty:
+            print(f"Skipped {len(rejected)} of {len(annotations_df)} annotations:")
+            for reason, count in rejected["reason"].value_counts().items():
+                print(f"  {count} x {reason}")
+        return rejected
+
+    def load_selection_tables(self, directories, suffix=".txt", max_workers=8):
+        """
+        Walks the given directories once and reads every Raven selection table with read_selection_tables.
+        The result is cached, so add_categories and add_annotations share a single read of every file.
+
+        Returns:
+            headers (dict): Maps the path of every selection table to its column names.
+            rows (DataFrame): The rows of all the tables, with table_path and row columns.
+        """
+        if self._selection_tables is None:
+            file_paths = []
+            for directory in directories:
+                for root, _, files in os.walk(directory):
+                    file_paths.extend(os.path.join(root, file) for file in files if file.endswith(suffix))
+            self._selection_tables = read_selection_tables(file_paths, max_workers=max_workers, texts=self._prefetched_texts)
+            self._prefetched_texts = {}
+        return self._selection_tables
+
+    def add_selection_table_annotations(self, sound_ids):
+        """
+        Adds the annotations of the loaded Raven selection tables with a single add_annotations_bulk call.
+        Tables without the RAVEN_ANNOTATION_COLUMNS or without a sound contribute no annotations.
+
+        Args:
+            sound_ids (dict): Maps the path of every table to add to the id of its sound, or None.
+        """
+        headers, rows = self._selection_tables
+        table_paths = list(sound_ids)
+        sound_ids = {
+            file_path: sound_id for file_path, sound_id in sound_ids.items()
+            if sound_id is not None and set(RAVEN_ANNOTATION_COLUMNS).issubset(headers[file_path])
+        }
+        if not sound_ids:
+            self.add_annotation_tables(None, table_paths)
+            return
+        rows = rows[rows['table_path'].isin(sound_ids.keys())]
+        species, names = pd.factorize(rows['Species'])
+        category_ids = np.array([self.annotation_creator.get_category_id(name) for name in names] + [None], dtype=object)
+        annotations_df = pd.DataFrame({
+            'table_path': rows['table_path'],
+            'anno_id': rows['row'],
+            'sound_id': rows['table_path'].map(sound_ids),
+            'category_id': category_ids[species],
+            'category': rows['Species'],
+            't_min': rows['Begin Time (s)'],
+            't_max': rows['End Time (s)'],
+            'f_min': rows['Low Freq (Hz)'],
+            'f_max': rows['High Freq (Hz)'],
+        })
+        self.add_annotation_tables(annotations_df, table_paths)
+
+    def add_selection_tables(self, table_paths, get_sound_id):
+        """
+        Adds the annotations of Raven selection tables in the order of table_paths, reusing the annotations of
+        unchanged tables in incremental mode. Consecutive tables that have to be parsed are added together with
+        add_selection_table_annotations, so the annotations come out in the same order as in a full run.
+
+        Args:
+            table_paths (list): The paths of the selection tables.
+            get_sound_id (callable): Returns the id of the sound of a table path, or None.
+        """
+        sound_ids = {}
+        for file_path in table_paths:
+            if self.previous_data is not None and sound_ids:
+                self.add_selection_table_annotations(sound_ids)
+                sound_ids = {}
+            if self.reuse_annotations(file_path):
+                continue
+            sound_ids[file_path] = get_sound_id(file_path)
+        if sound_ids or not table_paths:
+            self.add_selection_table_annotations(sound_ids)
+
+    def add_annotation_tables(self, annotations_df, table_paths):
+        """
+        Adds the annotations of several annotation tables with a single add_annotations_bulk call, and records
+        the range of annotations each table produced in the manifest.
+
+        Args:
+            annotations_df (DataFrame): The annotations for add_annotations_bulk, with a table_path column.
+                The rows of every table must be contiguous and in the order of table_paths. None if there are no annotations.
+            table_paths (list): The paths of all the tables that were parsed, including those without annotations.
+        """
+        accepted_counts = {}
+        if annotations_df is not None and not annotations_df.empty:
+            rejected = self.add_annotations_bulk(annotations_df)
+            accepted_counts = annotations_df['table_path'].value_counts().sub(rejected['table_path'].value_counts(), fill_value=0).to_dict()
+        start = len(self.annotation_creator.data["annotations"]) - int(sum(accepted_counts.values()))
+        for table_path in table_paths:
+            end = start + int(accepted_counts.get(table_path, 0))
+            self.manifest.tables[self._relative_path(table_path)] = {"files": self._fingerprints([table_path]), "start": start, "end": end, "positional_ids": False}
+            start = end
+
+    def _relative_path(self, file_path):
+        return os.path.relpath(file_path, self.data_path)
+
+    def _fingerprints(self, file_paths, previous=None):
+        previous = previous or {}
+        return {self._relative_path(path): file_fingerprint(path, previous.get(self._relative_path(path))) for path in file_paths}
+
+    def load_previous_dataset(self):
+        """
+        Loads the annotations.json and manifest of the previous run for incremental processing, and makes
+        the annotation creator keep the ids of the sounds it already knows. Returns False if there is
+        nothing to reuse.
+        """
+        if not os.path.exists(self.output_path) or not os.path.exists(self.manifest.path):
+            return False
+        with open(self.output_path, 'r', encoding='utf-8') as f:
+            self.previous_data = json.load(f)
+        self.previous_manifest = DatasetManifest.load(self.manifest.path)
+        self.annotation_creator.set_stable_sound_ids({sound["file_name_path"]: sound["id"] for sound in self.previous_data["sounds"]})
+        return True
+
+    def _get_changed_sound_ids(self):
+        """Ids of the previous sounds that were deleted or whose duration or sample rate changed."""
+        if self._changed_sound_ids is None:
+            current = {sound["id"]: sound for sound in self.annotation_creator.data["sounds"]}
+            self._changed_sound_ids = {
+                sound["id"] for sound in self.previous_data["sounds"]
+                if sound["id"] not in current
+                or current[sound["id"]]["file_name_path"] != sound["file_name_path"]
+                or current[sound["id"]]["duration"] != sound["duration"]
+                or current[sound["id"]]["sample_rate"] != sound["sample_rate"]
+            }
+        return self._changed_sound_ids
+
+    def reuse_annotations(self, table_path, dependencies=()):
+        """
+        In incremental mode, copies the annotations that an annotation table produced in the previous run,
+        if neither the table nor its dependencies changed and none of the sounds they refer to changed.
+
+        Args:
+            table_path (str): The path of the annotation table.
+            dependencies (list): Other files the annotations depend on, e.g. a species table.
+
+        Returns:
+            reused (bool): True if the annotations were reused and the table does not need to be parsed.
+        """
+        if self.previous_data is None:
+            return False
+        entry = self.previous_manifest.tables.get(self._relative_path(table_path))
+        if entry is None:
+            return False
+        files = [table_path, *dependencies]
+        if set(entry["files"]) != {self._relative_path(path) for path in files}:
+            return False
+        if not all(is_unchanged(path, entry["files"][self._relative_path(path)]) for path in files):
+            return False
+
+        changed_sound_ids = self._get_changed_sound_ids()
+        previous_annotations = self.previous_data["annotations"][entry["start"]:entry["end"]]
+        positional_ids = entry.get("positional_ids", _has_positional_ids(previous_annotations, entry["start"]))
+        start = len(self.annotation_creator.data["annotations"])
+        annotations = []
+        for i, annotation in enumerate(previous_annotations):
+            if annotation["sound_id"] in changed_sound_ids:
+                return False
+            category_id = self.annotation_creator.get_category_id(annotation["category"])
+            if category_id is None and annotation["category_id"] is not None:
+                return False
+            annotation = {**annotation, "category_id": category_id}
+            if positional_ids:
+                # Ids numbered by position follow the annotations to their new position, as in a full run
+                annotation["anno_id"] = start + i
+            annotations.append(annotation)
+
+        self.annotation_creator.data["annotations"].extend(annotations)
+        self.manifest.tables[self._relative_path(table_path)] = {
+            "files": self._fingerprints(files, entry["files"]),
+            "start": start,
+            "end": len(self.annotation_creator.data["annotations"]),
+            "positional_ids": positional_ids,
+        }
+        return True
+
+    @contextmanager
+    def annotation_table(self, table_path, dependencies=()):
+        """
+        Records the annotations added while parsing an annotation table in the manifest, so that the next
+        incremental run can reuse them with reuse_annotations if the table does not change.
+
+        Args:
+            table_path (str): The path of the annotation table.
+            dependencies (list): Other files the annotations depend on, e.g. a species table.
+        """
+        start = len(self.annotation_creator.data["annotations"])
+        yield
+        self.manifest.tables[self._relative_path(table_path)] = {
+            "files": self._fingerprints([table_path, *dependencies]),
+            "start": start,
+            "end": len(self.annotation_creator.data["annotations"]),
+            "positional_ids": _has_positional_ids(self.annotation_creator.data["annotations"][start:], start),
+        }
+
     def save_dataset(self):
-        """Saves the processed dataset as a JSON file."""
+        """Saves the processed dataset as a JSON file, together with the manifest of its annotation tables."""
         self.annotation_creator.save_to_file(self.output_path)
+        self.manifest.save()
 
     def load_dataset(self):
         """Loads the dataset from the JSON file."""
@@ -51,12 +391,26 @@ class BaseReader:
         self.categories = {cat["id"]: cat["name"] for cat in self.data["categories"]}
         self.sounds = self.data["sounds"]
         self.annotations = self.data["annotations"]
+        self._interval_index = None
         
         if not os.path.exists(self.visualization_dir):
             os.makedirs(self.visualization_dir)
 
+    @property
+    def interval_index(self):
+        """The IntervalIndex of the loaded annotations, built on first use and reset by load_dataset."""
+        if self._interval_index is None:
+            self._interval_index = IntervalIndex.from_annotations(self.annotations)
+        return self._interval_index
+
     def visualizations(self):
         """Generates visualizations for the dataset."""
+        # Plotting and audio analysis libraries take seconds to import, so they are only loaded when plotting
+        import matplotlib.pyplot as plt
+        import matplotlib.ticker as ticker
+        import seaborn as sns
+        import librosa
+        import librosa.display
 
         def show_summary(self):
             """Displays a general summary of the dataset."""
@@ -122,10 +476,7 @@ class BaseReader:
                 print(f"Audio ID {sound_id} not found.")
                 return
             
-            relevant_annotations = sorted(
-                [anno for anno in self.annotations if anno['sound_id'] == sound_id], 
-                key=lambda x: x['t_min']
-            )
+            relevant_annotations = self.interval_index.query(sound_id)
 
             if not relevant_annotations:
                 print(f"No annotations found for sound_id {sound_id}")
@@ -134,24 +485,26 @@ class BaseReader:
             relevant_annotations = relevant_annotations[0:5]  # Limit to 5 annotations
             
             audio_path = os.path.join(self.data_path, sound['file_name_path'])
-            y, sr = librosa.load(audio_path, sr=sound['sample_rate'])
             
             t_min_global = min(anno['t_min'] for anno in relevant_annotations)
             t_max_global = max(anno['t_max'] for anno in relevant_annotations)
             # Añadir un margen para mejor visualización (5 segundos antes y después)
             margin = 1
             t_min_display = max(0, t_min_global - margin)
-            t_max_display = min(len(y) / sr, t_max_global + margin)
+            t_max_display = min(sound['duration'], t_max_global + margin)
             
-            # Extraer el segmento relevante del audio
-            segment_start_sample = int(t_min_display * sr)
-            segment_end_sample = int(t_max_display * sr)
-            y_segment = y[segment_start_sample:segment_end_sample]
-            
-            # Calcular el espectrograma
             n_fft = 2048
             hop_length = 512
-            D = librosa.amplitude_to_db(np.abs(librosa.stft(y_segment, n_fft=n_fft, hop_length=hop_length)), ref=np.max)
+            feature_store = FeatureStore(self.feature_store_path, feature_config(n_fft=n_fft, hop_length=hop_length))
+            if feature_store.has_sound(sound_id, sound['file_name_path']):
+                # Usar el espectrograma precalculado, con la misma escala que amplitude_to_db(ref=np.max)
+                D = feature_store.get(sound_id, t_min_display, t_max_display).T
+                D = np.maximum(D - D.max(), -80.0)
+                sr = feature_store.sounds[sound_id]["sample_rate"]
+            else:
+                # Leer solo el segmento relevante del audio y calcular el espectrograma
+                y_segment, sr = read_segment(audio_path, t_min_display, t_max_display)
+                D = librosa.amplitude_to_db(np.abs(librosa.stft(y_segment, n_fft=n_fft, hop_length=hop_length)), ref=np.max)
             
             # Crear la figura
             plt.figure(figsize=(15, 8))
@@ -252,12 +605,66 @@ class BaseReader:
         if self.annotations[0]["f_min"] != None and self.annotations[0]["f_max"] != None:
             plot_spectrogram_bbox(self, sound_id=0)
 
-    def process_dataset(self):
-        """Executes the full dataset processing pipeline."""
-        self.add_dataset_info()
-        self.add_sounds()
-        self.add_categories()
-        self.add_annotations()
-        self.save_dataset()
-        self.load_dataset()
-        self.visualizations()
+    def process_dataset(self, visualize=True, incremental=False, profiler=None, features=False):
+        """
+        Executes the full dataset processing pipeline. With incremental=True, the ids of known sounds are
+        kept and the annotations of unchanged annotation tables are copied from the previous annotations.json.
+        Before saving, the ismultilabel and overlap_group fields of the annotations are computed. With
+        features=True, the spectrograms of the sounds are precomputed in the feature store of the dataset.
+        The wall time, CPU time, peak memory and throughput of every stage are written to metrics.json, and
+        with profiler="cprofile" or "pyinstrument" the whole run is also profiled.
+        """
+        self.metrics = PipelineMetrics(self.dataset_name)
+        sounds = lambda: len(self.annotation_creator.data["sounds"])
+        categories = lambda: len(self.annotation_creator.data["categories"])
+        annotations = lambda: len(self.annotation_creator.data["annotations"])
+        try:
+            with profiled(os.path.join(self.data_path, "profile"), profiler):
+                if incremental:
+                    with self.metrics.stage("load_previous"):
+                        if self.load_previous_dataset():
+                            print(f"Incremental run based on the previous {self.output_path}")
+                with self.metrics.stage("add_dataset_info"):
+                    self.add_dataset_info()
+                with self.metrics.stage("add_sounds", count=sounds, unit="sounds"):
+                    self.add_sounds()
+                with self.metrics.stage("add_categories", count=categories, unit="categories"):
+                    self.add_categories()
+                with self.metrics.stage("add_annotations", count=annotations, unit="annotations"):
+                    self.add_annotations()
+                with self.metrics.stage("post_process", count=annotations, unit="annotations"):
+                    post_process_annotations(self.annotation_creator.data["annotations"])
+                with self.metrics.stage("save_dataset", count=annotations, unit="annotations"):
+                    self.save_dataset()
+                with self.metrics.stage("load_dataset", count=annotations, unit="annotations"):
+                    self.load_dataset()
+                if features:
+                    with self.metrics.stage("features", count=sounds, unit="sounds"):
+                        FeatureStore(self.feature_store_path).build(self.annotation_creator.data["sounds"], self.data_path)
+                if visualize:
+                    with self.metrics.stage("visualizations"):
+                        self.visualizations()
+        finally:
+            self.metrics.save(self.metrics_path)
+            print(self.metrics.report())
+
+def discover_readers(readers_dir=READERS_DIR):
+    """
+    Imports every reader module in readers_dir so its BaseReader subclasses register themselves.
+
+    Returns:
+        registry (dict): Maps dataset names to reader classes.
+        errors (dict): Maps the names of the modules that failed to import to the error message.
+    """
+    if readers_dir not in sys.path:
+        sys.path.insert(0, readers_dir)
+    errors = {}
+    for file in sorted(os.listdir(readers_dir)):
+        module_name, ext = os.path.splitext(file)
+        if ext != ".py" or module_name == "BaseReader":
+            continue
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            errors[module_name] = f"{type(e).__name__}: {e}"
+    return dict(BaseReader.registry), errors
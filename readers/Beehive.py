@@ -1,7 +1,5 @@
 from BaseReader import BaseReader
 import pandas as pd
-import requests
-import csv
 import os
 
 class Beehive(BaseReader):
@@ -24,9 +22,10 @@ class Beehive(BaseReader):
         for path in self.sound_files_path:
             wav_files.extend([os.path.join(path, f) for f in os.listdir(path) if f.endswith('.wav')])
         
+        metadata = self.probe_sounds(wav_files)
         for i, file_path in enumerate(wav_files):
-            duration, sample_rate = self.annotation_creator._get_duration_and_sample_rate(file_path)
-            date_recorded = os.path.dirname(file_path).split('_')[1:]
+            duration, sample_rate = metadata[file_path]
+            date_recorded = os.path.basename(os.path.dirname(file_path)).split('_')[1:]
             date_recorded = date_recorded[2] + date_recorded[1] + date_recorded[0]
 
             self.annotation_creator.add_sound(
@@ -47,29 +46,19 @@ class Beehive(BaseReader):
         self.annotation_creator.add_categories(categories_df)
 
     def add_annotations(self):
-        
-        with open(self.annotation_file, mode='r') as file:
-            csv_reader = csv.DictReader(file)
-            for row in csv_reader:
-                filename, category = row['sample_name'], row['label']
-                sound_id = next((s["id"] for s in self.annotation_creator.data["sounds"] if filename in s["file_name_path"]), None)
-                if sound_id is None:
-                    continue
-
-                category_match = [cat for cat in self.annotation_creator.data["categories"] if cat["name"] == category]
-                if not category_match:
-                    continue
-                category_id = category_match[0]["id"]
-
-                anno_id = csv_reader.line_num - 2
-                self.annotation_creator.add_annotation(
-                    anno_id=anno_id, 
-                    sound_id=sound_id, 
-                    category_id=category_id, 
-                    category=category, 
-                    t_min=0, 
-                    t_max=round(self.annotation_creator.data["sounds"][sound_id]['duration'],1), 
-                )
+        if self.reuse_annotations(self.annotation_file):
+            return
+        with self.annotation_table(self.annotation_file):
+            df = pd.read_csv(self.annotation_file)
+            df["anno_id"] = df.index
+            df["sound_id"] = df["sample_name"].map(self.annotation_creator.get_sound_id)
+            df["category_id"] = df["label"].map(self.annotation_creator.get_category_id)
+            df = df[df["sound_id"].notna() & df["category_id"].notna()].copy()
+            durations = {sound["id"]: round(sound["duration"], 1) for sound in self.annotation_creator.data["sounds"]}
+            df["category"] = df["label"]
+            df["t_min"] = 0
+            df["t_max"] = df["sound_id"].map(durations)
+            self.add_annotations_bulk(df)
 
 if __name__ == "__main__":
     dataset_path = os.path.join("..","data", "Beehive")
@@ -1,7 +1,5 @@
 from BaseReader import BaseReader
 import pandas as pd
-import requests
-import csv
 import os
 
 class DomesticCanari(BaseReader):
@@ -30,21 +28,22 @@ class DomesticCanari(BaseReader):
     
     def add_sounds(self):
         """Extracts sound file information from the dataset directory."""
-        for file in os.listdir(self.sound_files_path):
-            if file.endswith(".wav"):
-                file_path = os.path.join(self.sound_files_path, file)
-                duration, sample_rate = self.annotation_creator._get_duration_and_sample_rate(file_path)
-                sound_id = len(self.annotation_creator.data["sounds"])
-                # TODO: Add date_recorded from filename
-                self.annotation_creator.add_sound(
-                    id=sound_id,
-                    file_name_path= os.path.join(os.path.relpath(self.sound_files_path, self.data_path), file),
-                    duration=duration,
-                    sample_rate=sample_rate,
-                    latitude=None,
-                    longitude=None,
-                    date_recorded=None
-                )
+        wav_files = [f for f in os.listdir(self.sound_files_path) if f.endswith(".wav")]
+        metadata = self.probe_sounds([os.path.join(self.sound_files_path, f) for f in wav_files])
+        for file in wav_files:
+            file_path = os.path.join(self.sound_files_path, file)
+            duration, sample_rate = metadata[file_path]
+            sound_id = len(self.annotation_creator.data["sounds"])
+            # TODO: Add date_recorded from filename
+            self.annotation_creator.add_sound(
+                id=sound_id,
+                file_name_path= os.path.join(os.path.relpath(self.sound_files_path, self.data_path), file),
+                duration=duration,
+                sample_rate=sample_rate,
+                latitude=None,
+                longitude=None,
+                date_recorded=None
+            )
     
     def add_categories(self):
         """Extracts unique categories from all annotation files."""
@@ -63,31 +62,25 @@ class DomesticCanari(BaseReader):
         """Parses the Audacity annotation files and adds the annotations."""
         for sound_file_audacity, file_list in self.annotation_files.items():
             sound_file = sound_file_audacity.split(".")[0]
-            sound_entry = next((s for s in self.annotation_creator.data["sounds"] if sound_file in s["file_name_path"]), None)
-            if sound_entry is None:
+            sound_id = self.annotation_creator.get_sound_id(sound_file)
+            if sound_id is None:
                 continue
-            sound_id = sound_entry["id"]
             
             for annotation_file in file_list:
-                df = pd.read_csv(annotation_file, sep='\t', header=None, names=["start_time", "end_time", "label"])
-                df.dropna(inplace=True)
-                for _, row in df.iterrows():
-                    category_id = next(
-                        (cat["id"] for cat in self.annotation_creator.data["categories"] if cat["name"] == row["label"]), None
-                    )
-                    if category_id is not None:
-                        self.annotation_creator.add_annotation(
-                            anno_id=len(self.annotation_creator.data["annotations"]),
-                            sound_id=sound_id,
-                            category_id=category_id,
-                            category=row["label"],
-                            t_min=row["start_time"],
-                            t_max=row["end_time"]
-                        )
+                if self.reuse_annotations(annotation_file):
+                    continue
+                with self.annotation_table(annotation_file):
+                    df = pd.read_csv(annotation_file, sep='\t', header=None, names=["start_time", "end_time", "label"])
+                    df.dropna(inplace=True)
+                    df["sound_id"] = sound_id
+                    df["category_id"] = df["label"].map(self.annotation_creator.get_category_id)
+                    df = df[df["category_id"].notna()]
+                    df = df.rename(columns={"label": "category", "start_time": "t_min", "end_time": "t_max"})
+                    self.add_annotations_bulk(df)
     
-    def process_dataset(self):
+    def process_dataset(self, **kwargs):
         """Runs the full dataset processing pipeline."""
-        super().process_dataset()
+        super().process_dataset(**kwargs)
 
 if __name__ == "__main__":
     dataset_path = os.path.join("..", "data", "Domestic_Canari")
@@ -1,7 +1,6 @@
 from BaseReader import BaseReader
 import pandas as pd
 import os
-import csv
 
 class EnabirdsReader(BaseReader):
     def __init__(self, data_path):
@@ -19,23 +18,9 @@ class EnabirdsReader(BaseReader):
 
     def add_categories(self):
         unique_categories = set()
-        annotation_files = []
-        for root, _, files in os.walk(self.annotation_files_path):
-            for file in files:
-                if file.endswith(".txt"):
-                    annotation_files.append(os.path.join(root, file))
-        
-        for file_path in annotation_files:
-            with open(file_path, mode='r') as file:
-                lines = file.readlines()
-                header = [h.strip() for h in lines[0].split('\t')]
-                
-                if 'Species' not in header:
-                    continue
-                
-                reader = csv.DictReader(lines[1:], delimiter='\t', fieldnames=header)
-                for row in reader:
-                    unique_categories.add(row['Species'])
+        _, rows = self.load_selection_tables([self.annotation_files_path])
+        if 'Species' in rows:
+            unique_categories.update(rows['Species'].dropna())
         
         categories_df = pd.DataFrame({'name': list(unique_categories)})
         self.annotation_creator.add_categories(categories_df)
@@ -47,8 +32,9 @@ class EnabirdsReader(BaseReader):
                 if file.endswith(".wav"):
                     wav_files.append(os.path.join(root, file))
         
+        metadata = self.probe_sounds(wav_files)
         for i, file_path in enumerate(wav_files):
-            duration, sample_rate = self.annotation_creator._get_duration_and_sample_rate(file_path)
+            duration, sample_rate = metadata[file_path]
             rel_path = os.path.relpath(file_path, self.data_path)
             
             self.annotation_creator.add_sound(
@@ -62,42 +48,8 @@ class EnabirdsReader(BaseReader):
             )
 
     def add_annotations(self):
-        annotation_files = []
-        for root, _, files in os.walk(self.annotation_files_path):
-            for file in files:
-                if file.endswith(".txt"):
-                    annotation_files.append(os.path.join(root, file))
-        
-        for file_path in annotation_files:
-            with open(file_path, mode='r') as file:
-                lines = file.readlines()
-                header = [h.strip() for h in lines[0].split('\t')]
-                
-                if not {'Begin Time (s)', 'End Time (s)', 'Low Freq (Hz)', 'High Freq (Hz)', 'Species'}.issubset(set(header)):
-                    continue
-                
-                reader = csv.DictReader(lines[1:], delimiter='\t', fieldnames=header)
-                for i, row in enumerate(reader):
-                    filename = os.path.basename(file_path).replace(".Table.1.selections.txt", ".wav")
-                    sound_id = next((s["id"] for s in self.annotation_creator.data["sounds"] if filename in s["file_name_path"]), None)
-                    if sound_id is None:
-                        continue
-                    
-                    category = row['Species']
-                    category_id = next((cat["id"] for cat in self.annotation_creator.data["categories"] if cat["name"] == category), None)
-                    t_min, t_max = float(row['Begin Time (s)']), float(row['End Time (s)'])
-                    f_min, f_max = float(row['Low Freq (Hz)']), float(row['High Freq (Hz)'])
-                    
-                    self.annotation_creator.add_annotation(
-                        anno_id=i,
-                        sound_id=sound_id,
-                        category_id=None,
-                        category=category,
-                        t_min=t_min,
-                        t_max=t_max,
-                        f_min=f_min,
-                        f_max=f_max
-                    )
+        headers, _ = self.load_selection_tables([self.annotation_files_path])
+        self.add_selection_tables(list(headers), lambda file_path: self.annotation_creator.get_sound_id(os.path.basename(file_path).replace(".Table.1.selections.txt", ".wav")))
 
 if __name__ == "__main__":
     dataset_path = os.path.join("..", "data", "Enabirds")
@@ -1,7 +1,5 @@
 from BaseReader import BaseReader
 import pandas as pd
-import requests
-import csv
 import os
 
 class WABAD(BaseReader):
@@ -14,28 +12,14 @@ class WABAD(BaseReader):
     def add_dataset_info(self):
         self.annotation_creator.add_info(url="https://zenodo.org/records/14191524")
 
-    def add_categories(self):
+    def annotation_directories(self):
+        return [os.path.join(self.data_path, loc, loc, self.annotation_files_path) for loc in self.locations]
 
+    def add_categories(self):
         unique_categories = set()
-        annotation_files = []
-
-        for loc in self.locations:
-            for root, _, files in os.walk(os.path.join(self.data_path, loc, loc, self.annotation_files_path)):
-                for file in files:
-                    if file.endswith(".txt"):
-                        annotation_files.append(os.path.join(root, file))
-        
-        for file_path in annotation_files:
-            with open(file_path, mode='r') as file:
-                lines = file.readlines()
-                header = [h.strip() for h in lines[0].split('\t')]
-                
-                if 'Species' not in header:
-                    continue
-                
-                reader = csv.DictReader(lines[1:], delimiter='\t', fieldnames=header)
-                for row in reader:
-                    unique_categories.add(row['Species'])
+        _, rows = self.load_selection_tables(self.annotation_directories())
+        if 'Species' in rows:
+            unique_categories.update(rows['Species'].dropna())
         
         categories_df = pd.DataFrame({'name': list(unique_categories)})
         self.annotation_creator.add_categories(categories_df)
@@ -48,8 +32,9 @@ class WABAD(BaseReader):
                     if file.endswith(".wav"):
                         wav_files.append(os.path.join(root, file))
         
+        metadata = self.probe_sounds(wav_files)
         for i, file_path in enumerate(wav_files):
-            duration, sample_rate = self.annotation_creator._get_duration_and_sample_rate(file_path)
+            duration, sample_rate = metadata[file_path]
             rel_path = os.path.relpath(file_path, self.data_path)
             
             self.annotation_creator.add_sound(
@@ -63,44 +48,8 @@ class WABAD(BaseReader):
             )
 
     def add_annotations(self):
-        annotation_files = []
-
-        for loc in self.locations:
-            for root, _, files in os.walk(os.path.join(self.data_path, loc, loc, self.annotation_files_path)):
-                for file in files:
-                    if file.endswith(".txt"):
-                        annotation_files.append(os.path.join(root, file))
-        
-        for file_path in annotation_files:
-            with open(file_path, mode='r') as file:
-                lines = file.readlines()
-                header = [h.strip() for h in lines[0].split('\t')]
-                
-                if not {'Begin Time (s)', 'End Time (s)', 'Low Freq (Hz)', 'High Freq (Hz)', 'Species'}.issubset(set(header)):
-                    continue
-                
-                reader = csv.DictReader(lines[1:], delimiter='\t', fieldnames=header)
-                for i, row in enumerate(reader):
-                    filename = os.path.basename(file_path).replace(".txt", ".wav")
-                    sound_id = next((s["id"] for s in self.annotation_creator.data["sounds"] if filename in s["file_name_path"]), None)
-                    if sound_id is None:
-                        continue
-                    
-                    category = row['Species']
-                    category_id = next((cat["id"] for cat in self.annotation_creator.data["categories"] if cat["name"] == category), None)
-                    t_min, t_max = float(row['Begin Time (s)']), float(row['End Time (s)'])
-                    f_min, f_max = float(row['Low Freq (Hz)']), float(row['High Freq (Hz)'])
-                    
-                    self.annotation_creator.add_annotation(
-                        anno_id=i,
-                        sound_id=sound_id,
-                        category_id=None,
-                        category=category,
-                        t_min=t_min,
-                        t_max=t_max,
-                        f_min=f_min,
-                        f_max=f_max
-                    )
+        headers, _ = self.load_selection_tables(self.annotation_directories())
+        self.add_selection_tables(list(headers), lambda file_path: self.annotation_creator.get_sound_id(os.path.basename(file_path).replace(".txt", ".wav")))
 
 if __name__ == "__main__":
     dataset_path = os.path.join("..","data", "WABAD")
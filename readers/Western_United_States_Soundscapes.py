@@ -1,7 +1,5 @@
 from BaseReader import BaseReader
 import pandas as pd
-import requests
-import csv
 import os
 
 class WesternUnitedStatesSoundscapes(BaseReader):
@@ -18,10 +16,11 @@ class WesternUnitedStatesSoundscapes(BaseReader):
         flac_files = [f for f in os.listdir(self.sound_files_path) if f.endswith('.flac')]
         latitude, longitude = (38.49,-119.95)
 
+        metadata = self.probe_sounds([os.path.join(self.sound_files_path, f) for f in flac_files])
         for i, file_name in enumerate(flac_files):
 
             file_path = os.path.join(self.sound_files_path, file_name)
-            duration, sample_rate = self.annotation_creator._get_duration_and_sample_rate(file_path)
+            duration, sample_rate = metadata[file_path]
 
             date_recorded = file_name.split('_')[2]
 
@@ -41,33 +40,18 @@ class WesternUnitedStatesSoundscapes(BaseReader):
         self.annotation_creator.add_categories(categories_df)
 
     def add_annotations(self):
-        with open(self.annotation_file, mode='r') as file:
-            csv_reader = csv.DictReader(file)
-            for row in csv_reader:
-                filename, t_min, t_max, f_min, f_max, ebirdcode = row['Filename'], float(row['Start Time (s)']), float(row['End Time (s)']), float(row['Low Freq (Hz)']), float(row['High Freq (Hz)']), row['Species eBird Code']
-
-                sound_id = next((s["id"] for s in self.annotation_creator.data["sounds"] if filename in s["file_name_path"]), None)
-                if sound_id is None:
-                    continue
-                
-                category_match = [cat for cat in self.annotation_creator.data["categories"] if cat["Species eBird Code"] == ebirdcode]
-                if not category_match:
-                    continue
-
-                category_id = category_match[0]["id"]
-                category = category_match[0]["name"]
-
-                anno_id = csv_reader.line_num - 2
-                self.annotation_creator.add_annotation(
-                    anno_id=anno_id, 
-                    sound_id=sound_id, 
-                    category_id=category_id, 
-                    category=category, 
-                    t_min=t_min, 
-                    t_max=t_max, 
-                    f_min=f_min, 
-                    f_max=f_max
-                )
+        if self.reuse_annotations(self.annotation_file, [self.species_file]):
+            return
+        with self.annotation_table(self.annotation_file, [self.species_file]):
+            df = pd.read_csv(self.annotation_file)
+            df["anno_id"] = df.index
+            df["sound_id"] = df["Filename"].map(self.annotation_creator.get_sound_id)
+            category_match = df["Species eBird Code"].map(lambda ebirdcode: self.annotation_creator.get_category(ebirdcode, key="Species eBird Code"))
+            df = df[df["sound_id"].notna() & category_match.notna()].copy()
+            df["category_id"] = category_match[df.index].map(lambda category: category["id"])
+            df["category"] = category_match[df.index].map(lambda category: category["name"])
+            df.rename(columns={"Start Time (s)": "t_min", "End Time (s)": "t_max", "Low Freq (Hz)": "f_min", "High Freq (Hz)": "f_max"}, inplace=True)
+            self.add_annotations_bulk(df)
 
 if __name__ == "__main__":
     dataset_path = os.path.join("..","data", "Western_United_States_Soundscapes")
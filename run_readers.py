@@ -0,0 +1,113 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout, redirect_stderr
+import traceback
+import argparse
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "readers"))
+from BaseReader import discover_readers
+
+
+def run_reader(dataset_name, data_dir, log_dir, visualize=False, incremental=False, profiler=None, features=False):
+    """
+    Runs the reader of one dataset in the current process, writing everything it prints to its own
+    log file. Exceptions are caught so that one failing dataset does not stop the others.
+
+    Returns:
+        result (dict): The dataset name, status, elapsed time, number of sounds and annotations, and error.
+    """
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{dataset_name}.log")
+    result = {"dataset": dataset_name, "status": "failed", "elapsed": 0.0, "sounds": 0, "annotations": 0, "error": None, "log": log_path}
+
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            registry, _ = discover_readers()
+            reader = registry[dataset_name](os.path.join(data_dir, dataset_name))
+            reader.process_dataset(visualize=visualize, incremental=incremental, profiler=profiler, features=features)
+            result["sounds"] = len(reader.annotation_creator.data["sounds"])
+            result["annotations"] = len(reader.annotation_creator.data["annotations"])
+            result["status"] = "ok"
+        except Exception as e:
+            traceback.print_exc()
+            result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def print_summary(results, wall_time):
+    """Prints per-dataset and total throughput."""
+    print(f"\n{'dataset':<40} {'status':<7} {'seconds':>9} {'sounds':>8} {'annotations':>12} {'files/s':>9} {'annotations/s':>14}")
+    for result in sorted(results, key=lambda r: r["dataset"]):
+        elapsed = result["elapsed"] or float("nan")
+        print(f"{result['dataset']:<40} {result['status']:<7} {result['elapsed']:>9.1f} {result['sounds']:>8} {result['annotations']:>12} "
+              f"{result['sounds'] / elapsed:>9.1f} {result['annotations'] / elapsed:>14.1f}")
+    total_sounds = sum(result["sounds"] for result in results)
+    total_annotations = sum(result["annotations"] for result in results)
+    print(f"\nTotal: {total_sounds} sounds and {total_annotations} annotations in {wall_time:.1f}s "
+          f"({total_sounds / wall_time:.1f} files/s, {total_annotations / wall_time:.1f} annotations/s)")
+    for result in results:
+        if result["status"] != "ok":
+            print(f"❌ {result['dataset']} failed: {result['error']} (see {result['log']})")
+
+
+def main():
+    registry, import_errors = discover_readers()
+
+    parser = argparse.ArgumentParser(description="Run the readers of several datasets in parallel.")
+    parser.add_argument("--datasets", nargs="+", default=None, help="Datasets to process. Defaults to every registered dataset found in the data directory.")
+    parser.add_argument("--data-dir", default="data", help="Directory containing one subdirectory per dataset.")
+    parser.add_argument("--log-dir", default=os.path.join("data", "logs"), help="Directory for the per-dataset logs.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of datasets processed at the same time.")
+    parser.add_argument("--visualize", action="store_true", help="Also generate the visualizations of each dataset.")
+    parser.add_argument("--incremental", action="store_true", help="Reuse the annotations of the annotation tables that did not change since the previous run.")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], default=None, help="Profile every reader and save the profile in its dataset directory.")
+    parser.add_argument("--features", action="store_true", help="Precompute the spectrograms of every dataset in its feature store.")
+    parser.add_argument("--offline", action="store_true", help="Read Zenodo metadata only from the cache filled by zenodo_metadata.py, and fail on cache misses.")
+    parser.add_argument("--list", action="store_true", help="List the registered readers and exit.")
+    args = parser.parse_args()
+    if args.offline:
+        # Inherited by the worker processes, where AnnotationCreator.add_info reads it
+        os.environ["ZENODO_OFFLINE"] = "1"
+
+    if args.list:
+        for dataset_name, reader_class in sorted(registry.items()):
+            print(f"{dataset_name:<40} {reader_class.__name__}")
+        for module_name, error in sorted(import_errors.items()):
+            print(f"{module_name:<40} (failed to import: {error})")
+        return
+
+    if args.datasets is None:
+        datasets = [name for name in sorted(registry) if os.path.isdir(os.path.join(args.data_dir, name))]
+    else:
+        unknown = [name for name in args.datasets if name not in registry]
+        if unknown:
+            parser.error(f"No reader registered for {', '.join(unknown)}. Available: {', '.join(sorted(registry))}")
+        datasets = args.datasets
+    if not datasets:
+        print(f"No datasets to process in {args.data_dir}")
+        return
+
+    print(f"Processing {len(datasets)} datasets with {args.workers} workers, logs in {args.log_dir}")
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(run_reader, name, args.data_dir, args.log_dir, args.visualize, args.incremental, args.profile, args.features): name for name in datasets}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:  # e.g. the worker process died
+                result = {"dataset": futures[future], "status": "failed", "elapsed": 0.0, "sounds": 0, "annotations": 0,
+                          "error": f"{type(e).__name__}: {e}", "log": os.path.join(args.log_dir, f"{futures[future]}.log")}
+            print(f"{'✅' if result['status'] == 'ok' else '❌'} {result['dataset']} ({result['elapsed']:.1f}s)")
+            results.append(result)
+
+    print_summary(results, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import soundfile as sf
+import pandas as pd
+import numpy as np
+import argparse
+import os
+
+BEEHIVE_DIRECTORIES = ["Hive1_12_06_2018", "Hive1_31_05_2018", "Hive3_14_07_2017", "Hive3_28_07_2017"]
+RAVEN_COLUMNS = ["Selection", "View", "Channel", "Begin Time (s)", "End Time (s)", "Low Freq (Hz)", "High Freq (Hz)", "Species"]
+
+
+def species_table(n_species:int):
+    """
+    Creates a species table with made-up eBird codes, scientific names and common names.
+
+    Returns:
+        species (DataFrame): A DataFrame with the columns "Species eBird Code", "Scientific Name" and "Common Name".
+    """
+    return pd.DataFrame({
+        "Species eBird Code": [f"synsp{i}" for i in range(n_species)],
+        "Scientific Name": [f"Synthetica species{i}" for i in range(n_species)],
+        "Common Name": [f"Synthetic bird {i}" for i in range(n_species)],
+    })
+
+
+def random_events(rng:np.random.Generator, n_events:int, duration:float, sample_rate:int, n_species:int):
+    """
+    Draws random annotation boxes that fit inside a sound of the given duration and sample rate.
+
+    Returns:
+        events (DataFrame): A DataFrame with the columns t_min, t_max, f_min, f_max and species (an index into the species table).
+    """
+    nyquist = sample_rate / 2
+    # Keep t_max below the duration rounded down to 0.1s, which is what add_annotation checks against
+    max_time = max(np.floor(duration * 10) / 10 - 0.1, 0.2)
+    lengths = rng.uniform(0.1, min(3.0, max_time / 2), n_events)
+    t_min = rng.uniform(0, max_time - lengths)
+    f_min = rng.uniform(100, nyquist * 0.5, n_events)
+    f_max = f_min + rng.uniform(100, nyquist * 0.45, n_events)
+    return pd.DataFrame({
+        "t_min": t_min.round(4),
+        "t_max": (t_min + lengths).round(4),
+        "f_min": f_min.round(1),
+        "f_max": f_max.round(1),
+        "species": rng.integers(0, n_species, n_events),
+    })
+
+
+class SyntheticAudio:
+    """
+    Writes short noise recordings. A single buffer is generated and reused, so writing thousands of files
+    costs little more than the disk I/O.
+    """
+
+    def __init__(self, duration:float, sample_rate:int, seed:int=0):
+        self.duration = duration
+        self.sample_rate = sample_rate
+        rng = np.random.default_rng(seed)
+        self.samples = (rng.standard_normal(int(duration * sample_rate)) * 0.05).astype(np.float32)
+
+    def write(self, file_path:str):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        sf.write(file_path, self.samples, self.sample_rate, subtype="PCM_16")
+
+
+def generate_soundscape_dataset(output_dir:str, n_sounds:int, duration:float, sample_rate:int, n_species:int, annotations_per_sound:int, seed:int=0, site:str=None):
+    """
+    Writes a dataset in the layout of the soundscape datasets (e.g. Southern_Sierra_Nevada_Birds): FLAC files
+    in soundscape_data/, an annotations.csv with one row per box and a species.csv. With site set, the site
+    code is part of the file names (as in Colombia_Costa_Rica_Birds), which moves the date one field to the right.
+    """
+    rng = np.random.default_rng(seed)
+    audio = SyntheticAudio(duration, sample_rate, seed)
+    species = species_table(n_species)
+    species.to_csv(os.path.join(output_dir, "species.csv"), index=False)
+
+    tables = []
+    for i in range(n_sounds):
+        file_name = f"Recording_{i}_{site}_20200101_000000.flac" if site else f"Recording_{i}_20200101_000000.flac"
+        audio.write(os.path.join(output_dir, "soundscape_data", file_name))
+        events = random_events(rng, annotations_per_sound, duration, sample_rate, n_species)
+        events["Filename"] = file_name
+        tables.append(events)
+    annotations = pd.concat(tables, ignore_index=True)
+    annotations["Species eBird Code"] = species["Species eBird Code"].to_numpy()[annotations["species"]]
+    annotations = annotations.rename(columns={"t_min": "Start Time (s)", "t_max": "End Time (s)", "f_min": "Low Freq (Hz)", "f_max": "High Freq (Hz)"})
+    annotations[["Filename", "Start Time (s)", "End Time (s)", "Low Freq (Hz)", "High Freq (Hz)", "Species eBird Code"]].to_csv(
+        os.path.join(output_dir, "annotations.csv"), index=False)
+    return species["Scientific Name"].tolist()
+
+
+def _write_raven_table(file_path:str, events:pd.DataFrame, names:list):
+    table = pd.DataFrame({
+        "Selection": np.arange(1, len(events) + 1),
+        "View": "Spectrogram 1",
+        "Channel": 1,
+        "Begin Time (s)": events["t_min"],
+        "End Time (s)": events["t_max"],
+        "Low Freq (Hz)": events["f_min"],
+        "High Freq (Hz)": events["f_max"],
+        "Species": np.asarray(names)[events["species"]],
+    })
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    table[RAVEN_COLUMNS].to_csv(file_path, sep="\t", index=False)
+
+
+def generate_wabad_dataset(output_dir:str, n_sounds:int, duration:float, sample_rate:int, n_species:int, annotations_per_sound:int, seed:int=0, n_locations:int=4):
+    """Writes a dataset in the WABAD layout: <location>/<location>/Recordings/*.wav with one Raven table per recording."""
+    rng = np.random.default_rng(seed)
+    audio = SyntheticAudio(duration, sample_rate, seed)
+    names = species_table(n_species)["Scientific Name"].tolist()
+    for i in range(n_sounds):
+        location = f"LOC{i % n_locations:02d}"
+        stem = f"{location}_{i:06d}"
+        audio.write(os.path.join(output_dir, location, location, "Recordings", f"{stem}.wav"))
+        events = random_events(rng, annotations_per_sound, duration, sample_rate, n_species)
+        _write_raven_table(os.path.join(output_dir, location, location, "Raven_Pro_annotations", f"{stem}.txt"), events, names)
+    return names
+
+
+def generate_enabirds_dataset(output_dir:str, n_sounds:int, duration:float, sample_rate:int, n_species:int, annotations_per_sound:int, seed:int=0, n_recordings:int=4):
+    """Writes a dataset in the Enabirds layout: wav_Files/Recording_<n>/*.wav and annotation_Files/Recording_<n>/*.Table.1.selections.txt."""
+    rng = np.random.default_rng(seed)
+    audio = SyntheticAudio(duration, sample_rate, seed)
+    names = species_table(n_species)["Scientific Name"].tolist()
+    for i in range(n_sounds):
+        recording = f"Recording_{i % n_recordings + 1}"
+        stem = f"{recording}_Segment_{i:06d}"
+        audio.write(os.path.join(output_dir, "wav_Files", recording, f"{stem}.wav"))
+        events = random_events(rng, annotations_per_sound, duration, sample_rate, n_species)
+        _write_raven_table(os.path.join(output_dir, "annotation_Files", recording, f"{stem}.Table.1.selections.txt"), events, names)
+    return names
+
+
+def generate_domestic_canari_dataset(output_dir:str, n_sounds:int, duration:float, sample_rate:int, n_species:int, annotations_per_sound:int, seed:int=0):
+    """Writes a dataset in the Domestic_Canari layout: WAV files and one Audacity label file per recording."""
+    rng = np.random.default_rng(seed)
+    audio = SyntheticAudio(duration, sample_rate, seed)
+    names = [f"syllable_{i}" for i in range(n_species)]
+    annotations_dir = os.path.join(output_dir, "M1-2016-spring_audacity_annotations", "audacity-annotations")
+    os.makedirs(annotations_dir, exist_ok=True)
+    for i in range(n_sounds):
+        stem = f"canary_{i:06d}"
+        audio.write(os.path.join(output_dir, "M1-2016-sping_audio", "audio", f"{stem}.wav"))
+        events = random_events(rng, annotations_per_sound, duration, sample_rate, n_species).sort_values("t_min")
+        labels = pd.DataFrame({"t_min": events["t_min"], "t_max": events["t_max"], "label": np.asarray(names)[events["species"]]})
+        labels.to_csv(os.path.join(annotations_dir, f"{stem}.txt"), sep="\t", header=False, index=False)
+    return names
+
+
+def generate_beehive_dataset(output_dir:str, n_sounds:int, duration:float, sample_rate:int, n_species:int, annotations_per_sound:int=1, seed:int=0):
+    """
+    Writes a dataset in the Beehive layout: WAV files in the four hive directories and a state_labels.csv
+    with one label per recording. annotations_per_sound is ignored, since every recording has one state.
+    """
+    rng = np.random.default_rng(seed)
+    audio = SyntheticAudio(duration, sample_rate, seed)
+    names = [f"state_{i}" for i in range(n_species)]
+    rows = []
+    for i in range(n_sounds):
+        directory = BEEHIVE_DIRECTORIES[i % len(BEEHIVE_DIRECTORIES)]
+        sample_name = f"{directory}__segment{i:06d}"
+        audio.write(os.path.join(output_dir, directory, f"{sample_name}.wav"))
+        rows.append({"sample_name": sample_name, "label": names[rng.integers(0, n_species)]})
+    pd.DataFrame(rows).to_csv(os.path.join(output_dir, "state_labels.csv"), index=False)
+    return names
+
+
+# Maps dataset names to the generator of their layout and any extra arguments
+LAYOUTS = {
+    "Southern_Sierra_Nevada_Birds": (generate_soundscape_dataset, {}),
+    "Western_United_States_Soundscapes": (generate_soundscape_dataset, {}),
+    "Colombia_Costa_Rica_Birds": (generate_soundscape_dataset, {"site": "S01"}),
+    "Southwestern_Amazon_Basin_Soundscape": (generate_soundscape_dataset, {"site": "S01"}),
+    "WABAD": (generate_wabad_dataset, {}),
+    "Enabirds": (generate_enabirds_dataset, {}),
+    "Domestic_Canari": (generate_domestic_canari_dataset, {}),
+    "Beehive": (generate_beehive_dataset, {}),
+}
+
+
+def generate_dataset(dataset_name:str, data_dir:str, n_sounds:int=100, duration:float=10.0, sample_rate:int=16000, n_species:int=20, annotations_per_sound:int=10, seed:int=0):
+    """
+    Writes a synthetic dataset in the on-disk layout that the reader of dataset_name expects.
+
+    Args:
+        dataset_name (str): One of the datasets in LAYOUTS.
+        data_dir (str): The directory the dataset directory is created in.
+        n_sounds (int): The number of recordings.
+        duration (float): The duration of every recording in seconds.
+        sample_rate (int): The sample rate of the recordings.
+        n_species (int): The number of distinct categories.
+        annotations_per_sound (int): The number of annotations per recording.
+        seed (int): The seed of the random annotations.
+
+    Returns:
+        names (list): The category names used in the dataset.
+    """
+    if dataset_name not in LAYOUTS:
+        raise ValueError(f"No synthetic layout for '{dataset_name}'. Available: {', '.join(sorted(LAYOUTS))}")
+    generator, layout_kwargs = LAYOUTS[dataset_name]
+    output_dir = os.path.join(data_dir, dataset_name)
+    os.makedirs(output_dir, exist_ok=True)
+    return generator(output_dir, n_sounds, duration, sample_rate, n_species, annotations_per_sound, seed=seed, **layout_kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic datasets in the layouts the readers expect.")
+    parser.add_argument("--datasets", nargs="+", default=sorted(LAYOUTS), choices=sorted(LAYOUTS), help="Datasets to generate.")
+    parser.add_argument("--output", default="synthetic_data", help="Directory the datasets are written to.")
+    parser.add_argument("--sounds", type=int, default=100, help="Number of recordings per dataset.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Duration of every recording in seconds.")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="Sample rate of the recordings.")
+    parser.add_argument("--species", type=int, default=20, help="Number of categories per dataset.")
+    parser.add_argument("--annotations-per-sound", type=int, default=10, help="Number of annotations per recording.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random annotations.")
+    args = parser.parse_args()
+
+    for dataset_name in args.datasets:
+        generate_dataset(dataset_name, args.output, args.sounds, args.duration, args.sample_rate, args.species, args.annotations_per_sound, args.seed)
+        print(f"✅ {dataset_name}: {args.sounds} recordings in {os.path.join(args.output, dataset_name)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+from datetime import datetime, timedelta, timezone
+import threading
+import csv
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+FALLBACK_STANDARD_NAMES = {"Life"}
+
+
+class _FileLock:
+    """An exclusive inter-process lock held on a sidecar .lock file."""
+
+    def __init__(self, path:str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a+")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+
+class TaxonomyCache:
+    """
+    The on-disk cache of standardized species names, stored as a CSV with one row per original name.
+    The file is read once, new entries are buffered and appended in batches under an inter-process
+    lock, and compaction rewrites the file atomically with one row per name. Every entry records where
+    it came from and when, and fallback entries (names that could not be resolved) expire after
+    fallback_ttl so they are retried instead of being kept forever.
+
+    Files with only the original_name and standard_name columns are still read. Their rows have no
+    timestamp, so the fallback ones among them (standard name "Life") are retried straight away.
+
+    Attributes:
+        cache_file (str): The path of the CSV file.
+        fallback_ttl (timedelta): How long fallback entries are trusted.
+        batch_size (int): The number of buffered entries that triggers a flush.
+    """
+
+    fieldnames = ["original_name", "standard_name", "source", "timestamp", "fallback"]
+
+    def __init__(self, cache_file:str, fallback_ttl:timedelta=timedelta(days=30), batch_size:int=100):
+        self.cache_file = cache_file
+        self.fallback_ttl = fallback_ttl
+        self.batch_size = batch_size
+        self._entries = {}
+        self._pending = []
+        self._lock = threading.RLock()
+        self._lock_file = f"{cache_file}.lock"
+        with _FileLock(self._lock_file):
+            self._entries = self._read()
+            if not os.path.exists(self.cache_file):
+                self._write(self._entries)
+
+    @staticmethod
+    def _parse_row(row:list):
+        if len(row) < 2 or not row[0]:
+            return None
+        original, standard = row[0], row[1]
+        source = row[2] if len(row) > 2 and row[2] else "legacy"
+        timestamp = None
+        if len(row) > 3 and row[3]:
+            try:
+                timestamp = datetime.fromisoformat(row[3])
+                if timestamp.tzinfo is None:
+                    timestamp = timestamp.replace(tzinfo=timezone.utc)
+            except ValueError:
+                timestamp = None
+        if len(row) > 4 and row[4]:
+            fallback = row[4].strip().lower() in ("1", "true", "yes")
+        else:
+            fallback = standard in FALLBACK_STANDARD_NAMES
+        return original, {"standard_name": standard, "source": source, "timestamp": timestamp, "fallback": fallback}
+
+    def _read(self):
+        entries = {}
+        if not os.path.exists(self.cache_file):
+            return entries
+        with open(self.cache_file, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # skip header
+            for row in reader:
+                parsed = self._parse_row(row)
+                if parsed is None:
+                    continue
+                original, entry = parsed
+                if self._is_newer(entry, entries.get(original)):
+                    entries[original] = entry
+        return entries
+
+    @staticmethod
+    def _is_newer(entry:dict, other:dict):
+        if other is None:
+            return True
+        if entry["timestamp"] is None:
+            return other["timestamp"] is None
+        return other["timestamp"] is None or entry["timestamp"] >= other["timestamp"]
+
+    @staticmethod
+    def _row(original:str, entry:dict):
+        timestamp = entry["timestamp"].isoformat() if entry["timestamp"] else ""
+        return [original, entry["standard_name"], entry["source"], timestamp, str(entry["fallback"]).lower()]
+
+    def _write(self, entries:dict):
+        directory = os.path.dirname(os.path.abspath(self.cache_file))
+        os.makedirs(directory, exist_ok=True)
+        tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.fieldnames)
+            writer.writerows(self._row(original, entry) for original, entry in entries.items())
+        os.replace(tmp_file, self.cache_file)
+
+    def _is_valid(self, entry:dict):
+        if not entry["fallback"]:
+            return True
+        if entry["timestamp"] is None:
+            return False
+        return datetime.now(timezone.utc) - entry["timestamp"] < self.fallback_ttl
+
+    def get(self, original:str, default=None):
+        """Returns the standard name of a cached name, or default if it is missing or an expired fallback."""
+        with self._lock:
+            entry = self._entries.get(original)
+        if entry is None or not self._is_valid(entry):
+            return default
+        return entry["standard_name"]
+
+    def __contains__(self, original:str):
+        return self.get(original) is not None
+
+    def __getitem__(self, original:str):
+        standard_name = self.get(original)
+        if standard_name is None:
+            raise KeyError(original)
+        return standard_name
+
+    def __len__(self):
+        with self._lock:
+            return sum(1 for entry in self._entries.values() if self._is_valid(entry))
+
+    def items(self):
+        """Returns the (original_name, standard_name) pairs of the valid entries."""
+        with self._lock:
+            return [(original, entry["standard_name"]) for original, entry in self._entries.items() if self._is_valid(entry)]
+
+    def put(self, original:str, standard:str, source:str, fallback:bool=False):
+        """
+        Adds or replaces an entry. The entry is buffered and written with the next flush.
+
+        Args:
+            original (str): The name as it appears in a dataset.
+            standard (str): The standardized name.
+            source (str): Where the standard name came from, e.g. "inaturalist" or "taxonomy_index".
+            fallback (bool): Whether the name could not be resolved and the standard name is a placeholder.
+        """
+        fallback = fallback or standard in FALLBACK_STANDARD_NAMES
+        entry = {"standard_name": standard, "source": source, "timestamp": datetime.now(timezone.utc), "fallback": fallback}
+        with self._lock:
+            self._entries[original] = entry
+            self._pending.append((original, entry))
+            should_flush = len(self._pending) >= self.batch_size
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Appends the buffered entries to the file under the inter-process lock."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with _FileLock(self._lock_file):
+            with open(self.cache_file, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerows(self._row(original, entry) for original, entry in pending)
+
+    def refresh(self):
+        """Re-reads the file to pick up entries written by other processes, keeping the newest entry per name."""
+        self.flush()
+        with _FileLock(self._lock_file):
+            on_disk = self._read()
+        with self._lock:
+            for original, entry in on_disk.items():
+                if self._is_newer(entry, self._entries.get(original)):
+                    self._entries[original] = entry
+
+    def compact(self):
+        """
+        Rewrites the file with a single row per name, merging the entries other processes appended since
+        it was loaded. The new file replaces the old one atomically.
+        """
+        self.flush()
+        with _FileLock(self._lock_file):
+            on_disk = self._read()
+            with self._lock:
+                for original, entry in on_disk.items():
+                    if self._is_newer(entry, self._entries.get(original)):
+                        self._entries[original] = entry
+                entries = dict(self._entries)
+            self._write(entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
@@ -0,0 +1,243 @@
+from taxonomy_cache import TaxonomyCache
+from collections import defaultdict
+import csv
+import re
+
+SCIENTIFIC_NAME_COLUMNS = ["SCIENTIFIC_NAME", "scientific_name", "Scientific Name", "sciName", "name"]
+COMMON_NAME_COLUMNS = ["PRIMARY_COM_NAME", "COMMON_NAME", "common_name", "Common Name", "comName"]
+CODE_COLUMNS = ["SPECIES_CODE", "species_code", "Species eBird Code", "speciesCode", "ebird_code"]
+
+
+def normalize_name(name:str):
+    """Lowercases a name and collapses whitespace, underscores and hyphens so trivial variants compare equal."""
+    return re.sub(r"[\s_\-]+", " ", str(name)).strip().lower()
+
+
+def bounded_edit_distance(a:str, b:str, max_distance:int):
+    """
+    Computes the Levenshtein distance between two strings, giving up as soon as it exceeds max_distance.
+
+    Returns:
+        distance (int): The edit distance, or max_distance + 1 if it is larger than max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+
+GENDER_ENDINGS = ("us", "um", "a")
+
+
+def _strip_gender_ending(epithet:str):
+    for ending in GENDER_ENDINGS:
+        if epithet.endswith(ending) and len(epithet) > len(ending):
+            return epithet[:-len(ending)]
+    return None
+
+
+def is_gender_variant(name:str, other:str):
+    """
+    Checks whether two scientific names only differ in the Latin gender ending (-a, -us or -um) of their
+    epithets, e.g. "Poecile atricapillus" and "Poecile atricapilla". The genus has to match exactly, so
+    distinct species of the same genus such as "Lanius collurio" and "Lanius collaris" are not variants.
+    """
+    words, other_words = normalize_name(name).split(" "), normalize_name(other).split(" ")
+    if len(words) < 2 or len(words) != len(other_words) or words[0] != other_words[0]:
+        return False
+    for epithet, other_epithet in zip(words[1:], other_words[1:]):
+        if epithet == other_epithet:
+            continue
+        stem = _strip_gender_ending(epithet)
+        if stem is None or stem != _strip_gender_ending(other_epithet):
+            return False
+    return True
+
+
+def _first_column(fieldnames, candidates):
+    return next((column for column in candidates if column in fieldnames), None)
+
+
+class TaxonomyIndex:
+    """
+    An offline index of species names used to standardize category names without querying iNaturalist.
+    It answers exact lookups of known names (scientific names, synonyms, spelling variants and common
+    names), eBird code lookups, and approximate lookups through a trigram index verified with a bounded
+    edit distance. Approximate matches are only trusted when they differ from the name in the gender
+    ending of an epithet, since species of the same genus are often a few edits apart. Other approximate
+    matches are left to the online lookup.
+
+    Attributes:
+        max_distance (int): The largest edit distance accepted by approximate lookups.
+        max_relative_distance (float): The largest edit distance accepted relative to the length of the name.
+    """
+
+    ngram_size = 3
+
+    def __init__(self, max_distance:int=2, max_relative_distance:float=0.15):
+        self.max_distance = max_distance
+        self.max_relative_distance = max_relative_distance
+        self._names = {}
+        self._codes = {}
+        self._ngrams = defaultdict(set)
+        self.exact_hits = 0
+        self.code_hits = 0
+        self.fuzzy_hits = 0
+        self.fuzzy_rejected = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._names)
+
+    @classmethod
+    def from_name_cache(cls, name_cache:dict, **kwargs):
+        """Builds an index from an in-memory {original_name: standard_name} cache."""
+        index = cls(**kwargs)
+        for original, standard in name_cache.items():
+            index.add(original, standard)
+        return index
+
+    @classmethod
+    def from_files(cls, cache_file:str=None, taxonomy_file:str=None, **kwargs):
+        """
+        Builds an index from a cache CSV and an optional taxonomy dump.
+
+        Args:
+            cache_file (Optional[str]): A name cache CSV like cache.csv. Expired fallback entries are left out.
+            taxonomy_file (Optional[str]): A taxonomy CSV such as the eBird taxonomy or a dataset's species.csv.
+        """
+        if cache_file:
+            index = cls.from_name_cache(TaxonomyCache(cache_file), **kwargs)
+        else:
+            index = cls(**kwargs)
+        if taxonomy_file:
+            index.add_taxonomy_file(taxonomy_file)
+        return index
+
+    def _ngrams_of(self, key:str):
+        padded = f"  {key} "
+        return {padded[i:i + self.ngram_size] for i in range(len(padded) - self.ngram_size + 1)}
+
+    def add(self, name:str, standard_name:str, code:str=None):
+        """
+        Adds a name to the index.
+
+        Args:
+            name (str): A name as it may appear in a dataset.
+            standard_name (str): The standardized scientific name it maps to.
+            code (Optional[str]): The eBird code of the species.
+        """
+        if not name or not standard_name:
+            return
+        key = normalize_name(name)
+        if key not in self._names:
+            for ngram in self._ngrams_of(key):
+                self._ngrams[ngram].add(key)
+        self._names[key] = standard_name
+        if code:
+            self._codes[normalize_name(code)] = standard_name
+
+    def add_taxonomy_file(self, taxonomy_file:str):
+        """
+        Adds the species of a taxonomy CSV. Scientific names map to themselves, and common names and
+        eBird codes map to the scientific name of the same row.
+        """
+        with open(taxonomy_file, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames or []
+            name_column = _first_column(fieldnames, SCIENTIFIC_NAME_COLUMNS)
+            if name_column is None:
+                raise ValueError(f"No scientific name column found in {taxonomy_file}. Expected one of {SCIENTIFIC_NAME_COLUMNS}.")
+            common_column = _first_column(fieldnames, COMMON_NAME_COLUMNS)
+            code_column = _first_column(fieldnames, CODE_COLUMNS)
+            for row in reader:
+                scientific_name = row[name_column]
+                code = row[code_column] if code_column else None
+                self.add(scientific_name, scientific_name, code=code)
+                if common_column and row[common_column]:
+                    self.add(row[common_column], scientific_name)
+
+    def lookup(self, name:str):
+        """Returns the standard name of a known name, or None."""
+        return self._names.get(normalize_name(name))
+
+    def lookup_code(self, code:str):
+        """Returns the standard name of an eBird code, or None."""
+        return self._codes.get(normalize_name(code))
+
+    def fuzzy_lookup(self, name:str):
+        """
+        Finds the closest known name within the allowed edit distance. Matches that are ambiguous, i.e.
+        two different standard names at the same best distance, are rejected.
+
+        Returns:
+            match (tuple): The (matched_name, standard_name, distance) of the best match, or None.
+        """
+        key = normalize_name(name)
+        max_distance = min(self.max_distance, int(len(key) * self.max_relative_distance))
+        if max_distance < 1:
+            return None
+
+        # An edit changes at most ngram_size n-grams, so closer names must share enough of them
+        ngrams = self._ngrams_of(key)
+        min_shared = len(ngrams) - self.ngram_size * max_distance
+        counts = defaultdict(int)
+        for ngram in ngrams:
+            for candidate in self._ngrams.get(ngram, ()):
+                counts[candidate] += 1
+
+        best = None
+        best_standards = set()
+        for candidate, shared in counts.items():
+            if shared < min_shared:
+                continue
+            distance = bounded_edit_distance(key, candidate, max_distance)
+            if distance > max_distance:
+                continue
+            if best is None or distance < best[2]:
+                best = (candidate, self._names[candidate], distance)
+                best_standards = {self._names[candidate]}
+            elif distance == best[2]:
+                best_standards.add(self._names[candidate])
+        if best is None or len(best_standards) > 1:
+            return None
+        return best
+
+    def resolve(self, name:str):
+        """
+        Resolves a name offline, trying an exact lookup, then an eBird code lookup, then an approximate match.
+        Approximate matches are only accepted if they are gender variants of the name (see is_gender_variant).
+
+        Returns:
+            match (tuple): The (standard_name, approximate) of the name, or None if it has to be looked up online.
+                Approximate matches are not certain and should be cached as fallbacks, so they are resolved again later.
+        """
+        standard_name = self.lookup(name)
+        if standard_name is not None:
+            self.exact_hits += 1
+            return standard_name, False
+        standard_name = self.lookup_code(name)
+        if standard_name is not None:
+            self.code_hits += 1
+            return standard_name, False
+        match = self.fuzzy_lookup(name)
+        if match is not None:
+            if is_gender_variant(name, match[0]):
+                self.fuzzy_hits += 1
+                print(f"Matched '{name}' to '{match[0]}' (edit distance {match[2]}) → '{match[1]}'")
+                return match[1], True
+            self.fuzzy_rejected += 1
+            print(f"Not matching '{name}' to '{match[0]}' offline (edit distance {match[2]}), it may be a different species")
+        self.misses += 1
+        return None
+
+    def report(self):
+        """Returns a short summary of how names were resolved."""
+        return f"Taxonomy index: {self.exact_hits} exact, {self.code_hits} eBird code, {self.fuzzy_hits} approximate, {self.misses} misses ({self.fuzzy_rejected} with an unconfirmed approximate match)"
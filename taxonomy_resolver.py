@@ -0,0 +1,182 @@
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import requests
+import asyncio
+import time
+
+INATURALIST_SEARCH_URL = "https://api.inaturalist.org/v1/search"
+
+
+def parse_retry_after(value, default:float):
+    """
+    Parses the value of a Retry-After header, which is either a number of seconds or an HTTP date.
+
+    Args:
+        value (str): The header value, or None if the header was not sent.
+        default (float): The number of seconds to wait when the header is missing or invalid.
+
+    Returns:
+        seconds (float): The number of seconds to wait before the next request.
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket that limits the rate of requests shared by all the tasks of a resolver.
+
+    Attributes:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens, i.e. the largest allowed burst of requests.
+    """
+
+    def __init__(self, rate:float, capacity:float=1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now:float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def block(self, seconds:float):
+        """Stops handing out tokens for the given number of seconds, e.g. after a 429 with Retry-After."""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._tokens = 0
+        self._updated = now
+
+
+class TaxonomyResolver:
+    """
+    Resolves many species names to standardized scientific names with the iNaturalist search API.
+    Names are deduplicated before querying, a bounded number of requests run at the same time, and
+    all requests share a token bucket that is paused whenever the server answers 429.
+
+    Attributes:
+        url (str): The search endpoint, e.g. the iNaturalist API or a local MockTaxonomyServer.
+        max_concurrency (int): The maximum number of requests in flight.
+        rate (float): The maximum number of requests per second.
+        max_retries (int): The number of attempts per name before giving up on it.
+        max_rate_limited (int): The number of 429 responses per name before giving up on it. They do not use up attempts.
+        timeout (float): The timeout of each request, in seconds.
+        language (str): The locale passed to the search API.
+    """
+
+    def __init__(self, url:str=INATURALIST_SEARCH_URL, max_concurrency:int=4, rate:float=1.0, burst:int=None, max_retries:int=3, timeout:float=5.0, language:str='en', retry_delay:float=2.0, max_rate_limited:int=10):
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst or max_concurrency
+        self.max_retries = max_retries
+        self.max_rate_limited = max_rate_limited
+        self.timeout = timeout
+        self.language = language
+        self.retry_delay = retry_delay
+        self.requests_sent = 0
+        self.rate_limited = 0
+
+    def _search(self, name:str):
+        params = {
+            'q': name,
+            'sources': 'taxa',
+            'per_page': 1,
+            'locale': self.language
+        }
+        return requests.get(self.url, params=params, timeout=self.timeout)
+
+    async def _resolve_one(self, name:str, bucket:TokenBucket, semaphore:asyncio.Semaphore):
+        attempt = 0
+        rate_limited = 0
+        while attempt < self.max_retries:
+            await bucket.acquire()
+            async with semaphore:
+                try:
+                    self.requests_sent += 1
+                    response = await asyncio.to_thread(self._search, name)
+                except requests.exceptions.RequestException as e:
+                    print(f"Exception with '{name}' (attempt {attempt+1}): {e}")
+                    response = None
+
+            if response is not None and response.status_code == 429:
+                # Rate limiting does not use up an attempt, but a server that keeps answering 429 is given up on
+                self.rate_limited += 1
+                rate_limited += 1
+                if rate_limited >= self.max_rate_limited:
+                    print(f"Giving up on '{name}' after {rate_limited} rate limited requests")
+                    return None
+                wait_time = parse_retry_after(response.headers.get("Retry-After"), default=30.0)
+                print(f"Rate limited for '{name}'. Pausing requests for {wait_time:.1f}s...")
+                bucket.block(wait_time)
+                continue
+
+            if response is not None and response.status_code == 200:
+                try:
+                    results = response.json().get("results")
+                except ValueError as e:
+                    # A malformed body counts as a failed attempt instead of aborting the whole batch
+                    print(f"Invalid response for '{name}' (attempt {attempt+1}): {e}")
+                else:
+                    if results:
+                        standard_name = results[0]["record"]["name"]
+                        print(f"Standardized '{name}' → '{standard_name}'")
+                        return standard_name
+                    print(f"No match found for '{name}' (attempt {attempt+1})")
+            elif response is not None:
+                print(f"API error {response.status_code} for '{name}'")
+
+            attempt += 1
+            if attempt < self.max_retries:
+                await asyncio.sleep(self.retry_delay * attempt)
+        return None
+
+    async def resolve_async(self, names):
+        """
+        Resolves names concurrently.
+
+        Args:
+            names (iterable): The names to resolve. Duplicates are only queried once.
+
+        Returns:
+            resolved (dict): Maps every distinct name to its standardized name, or to None if it could not be resolved.
+        """
+        unique_names = list(dict.fromkeys(names))
+        if not unique_names:
+            return {}
+        bucket = TokenBucket(self.rate, self.burst)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*(self._resolve_one(name, bucket, semaphore) for name in unique_names))
+        return dict(zip(unique_names, results))
+
+    def resolve(self, names):
+        """Synchronous wrapper around resolve_async."""
+        return asyncio.run(self.resolve_async(names))
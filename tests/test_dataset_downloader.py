@@ -0,0 +1,130 @@
+from zipfile import ZipFile, ZIP_STORED
+from io import BytesIO
+import hashlib
+import random
+import sys
+import os
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from dataset_downloader import DatasetDownloader, DownloadManifest, download_file, MANIFEST_FILE, DOWNLOAD_DIR
+from mock_zenodo_server import MockZenodoServer
+from prepare_data import prepare_datasets
+
+RECORD_ID = "1001"
+DATASET = "Fixture_Dataset"
+
+
+def _zip(files:dict):
+    buffer = BytesIO()
+    with ZipFile(buffer, "w", ZIP_STORED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def record():
+    """A record with a zip archive holding a nested zip, and a plain file, large enough to be cut mid-download."""
+    rng = random.Random(0)
+    audio = bytes(rng.getrandbits(8) for _ in range(60_000))
+    archive = _zip({
+        "audio/rec_1.wav": audio,
+        "labels/rec_1.txt": b"Begin Time (s)\tEnd Time (s)\n0.5\t1.5\n",
+        "extra.zip": _zip({"notes/rec_1.txt": b"nested"}),
+    })
+    return {"recordings.zip": archive, "readme.txt": b"fixture record"}
+
+
+@pytest.fixture
+def server_factory(record):
+    servers = []
+
+    def start(**kwargs):
+        server = MockZenodoServer({RECORD_ID: {"metadata": {"title": "Fixture"}, "files": record}}, **kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def test_resumes_interrupted_download_with_range_request(tmp_path, record, server_factory):
+    server = server_factory(interrupt_after=20_000)
+    downloader = DatasetDownloader(str(tmp_path), server.api_url, chunk_size=4096, max_retries=2)
+
+    manifests = downloader.download({DATASET: [server.archive_url(RECORD_ID)]})
+
+    assert server.range_request_count >= 1
+    path = os.path.join(downloader.download_dir(DATASET), "recordings.zip")
+    with open(path, "rb") as f:
+        assert hashlib.md5(f.read()).hexdigest() == hashlib.md5(record["recordings.zip"]).hexdigest()
+    assert not os.path.exists(path + ".part")
+    assert manifests[DATASET].files["recordings.zip"]["md5"] == hashlib.md5(record["recordings.zip"]).hexdigest()
+
+
+def test_checksum_mismatch_raises_and_removes_part_file(tmp_path, record, server_factory):
+    server = server_factory(corrupt={"recordings.zip"})
+    path = str(tmp_path / "recordings.zip")
+    url = f"{server.api_url}/records/{RECORD_ID}/files/recordings.zip/content"
+
+    with requests.Session() as session, pytest.raises(ValueError, match="Checksum mismatch"):
+        download_file(session, url, path, len(record["recordings.zip"]), hashlib.md5(record["recordings.zip"]).hexdigest())
+    assert not os.path.exists(path + ".part")
+    assert not os.path.exists(path)
+
+    downloader = DatasetDownloader(str(tmp_path / "data"), server.api_url)
+    with pytest.raises(RuntimeError, match="recordings.zip"):
+        downloader.download({DATASET: [server.archive_url(RECORD_ID)]})
+    assert "recordings.zip" not in DownloadManifest(os.path.join(downloader.download_dir(DATASET), MANIFEST_FILE)).files
+
+
+def test_second_run_skips_downloads_in_manifest(tmp_path, server_factory):
+    server = server_factory()
+    datasets = {DATASET: [server.archive_url(RECORD_ID)]}
+
+    prepare_datasets(datasets, str(tmp_path), server.api_url)
+    first_run_requests = server.request_count
+    prepare_datasets(datasets, str(tmp_path), server.api_url)
+
+    # Only the file listing of the record is requested again
+    assert server.request_count == first_run_requests + 1
+
+
+def test_extracted_layout(tmp_path, record, server_factory):
+    server = server_factory()
+
+    prepare_datasets({DATASET: [server.archive_url(RECORD_ID)]}, str(tmp_path), server.api_url)
+
+    dataset_dir = tmp_path / DATASET
+    files = sorted(os.path.relpath(os.path.join(root, file), dataset_dir).replace(os.sep, "/")
+                   for root, _, names in os.walk(dataset_dir) for file in names)
+    assert files == [
+        f"{DOWNLOAD_DIR}/{MANIFEST_FILE}",
+        "readme.txt",
+        "recordings/audio/rec_1.wav",
+        "recordings/extra/notes/rec_1.txt",
+        "recordings/labels/rec_1.txt",
+    ]
+    assert (dataset_dir / "recordings" / "extra" / "notes" / "rec_1.txt").read_bytes() == b"nested"
+    manifest = DownloadManifest(str(dataset_dir / DOWNLOAD_DIR / MANIFEST_FILE))
+    assert all(entry["extracted"] for entry in manifest.files.values())
+
+
+def test_failed_dataset_does_not_block_extraction_of_others(tmp_path, record):
+    records = {
+        RECORD_ID: {"metadata": {"title": "Fixture"}, "files": record},
+        "1002": {"metadata": {"title": "Broken"}, "files": {"broken.zip": _zip({"rec_2.txt": b"broken"})}},
+    }
+    server = MockZenodoServer(records, corrupt={"broken.zip"}).start()
+    try:
+        with pytest.raises(RuntimeError, match="broken.zip"):
+            prepare_datasets({DATASET: [server.archive_url(RECORD_ID)], "Broken_Dataset": [server.archive_url("1002")]}, str(tmp_path), server.api_url)
+    finally:
+        server.stop()
+
+    assert (tmp_path / DATASET / "recordings" / "audio" / "rec_1.wav").exists()
+    assert not (tmp_path / "Broken_Dataset" / "broken").exists()
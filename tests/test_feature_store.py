@@ -0,0 +1,66 @@
+import sys
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import feature_store
+from feature_store import FeatureStore, feature_config
+
+CONFIG = feature_config(n_fft=256, hop_length=128)
+_compute_sound = feature_store._compute_sound
+
+
+def _sounds(tmp_path, n_sounds:int):
+    rng = np.random.default_rng(0)
+    sounds = []
+    for sound_id in range(n_sounds):
+        file_name = f"sound_{sound_id}.wav"
+        sf.write(str(tmp_path / file_name), rng.standard_normal(4000 + 100 * sound_id).astype(np.float32) * 0.1, 8000)
+        sounds.append({"id": sound_id, "file_name_path": file_name})
+    return sounds
+
+
+def _shard_files(store):
+    return sorted(file for file in os.listdir(store.directory) if file.startswith("shard_"))
+
+
+def _failing_compute_sound(file_path, *args):
+    if file_path.endswith("sound_1.wav"):
+        raise ValueError("unreadable")
+    return _compute_sound(file_path, *args)
+
+
+def test_removed_sounds_and_orphaned_shards_are_deleted(tmp_path):
+    sounds = _sounds(tmp_path, 3)
+    store = FeatureStore(str(tmp_path / "features"), CONFIG)
+    store.build(sounds, str(tmp_path), max_workers=1, shard_frames=1)
+    assert _shard_files(store) == ["shard_00000.npy", "shard_00001.npy", "shard_00002.npy"]
+    # A shard left behind by a crashed run, which the index does not refer to
+    np.save(os.path.join(store.directory, "shard_00003.npy"), np.zeros((1, 1), dtype=np.float32))
+
+    store = FeatureStore(str(tmp_path / "features"), CONFIG)
+    assert store.build(sounds[:2], str(tmp_path), max_workers=1, shard_frames=1) == 0
+
+    assert _shard_files(store) == ["shard_00000.npy", "shard_00001.npy"]
+    assert sorted(FeatureStore(str(tmp_path / "features"), CONFIG).sounds) == [0, 1]
+
+
+def test_failed_sound_keeps_the_others(tmp_path, monkeypatch):
+    sounds = _sounds(tmp_path, 3)
+    store = FeatureStore(str(tmp_path / "features"), CONFIG)
+    monkeypatch.setattr(feature_store, "_compute_sound", _failing_compute_sound)
+    with pytest.raises(RuntimeError, match="sound_1.wav"):
+        store.build(sounds, str(tmp_path), max_workers=1, shard_frames=1)
+    monkeypatch.undo()
+
+    saved = FeatureStore(str(tmp_path / "features"), CONFIG)
+    assert sorted(saved.sounds) == [0, 2]
+    assert _shard_files(saved) == sorted(saved.shards)
+
+    assert saved.build(sounds, str(tmp_path), max_workers=1, shard_frames=1) == 1
+    assert sorted(saved.sounds) == [0, 1, 2]
+    assert _shard_files(saved) == sorted(saved.shards)
+    assert len(saved.get(1)) == len(FeatureStore(str(tmp_path / "features"), CONFIG).get(1))
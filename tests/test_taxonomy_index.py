@@ -0,0 +1,69 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from taxonomy_index import TaxonomyIndex, is_gender_variant
+from taxonomy_cache import TaxonomyCache
+from combine_datasets import resolve_species_names
+
+
+class StaticResolver:
+    """Stands in for TaxonomyResolver and records the names it is asked to resolve."""
+
+    def __init__(self, resolved:dict):
+        self.resolved = resolved
+        self.queried = []
+
+    def resolve(self, names):
+        self.queried.extend(names)
+        return {name: self.resolved.get(name) for name in names}
+
+
+def _cache(tmp_path, entries:dict):
+    cache = TaxonomyCache(str(tmp_path / "cache.csv"))
+    for original, standard in entries.items():
+        cache.put(original, standard, source="inaturalist")
+    cache.flush()
+    return cache
+
+
+def test_gender_variants():
+    assert is_gender_variant("Poecile atricapillus", "Poecile atricapilla")
+    assert is_gender_variant("Sylvia curruca", "sylvia currucum")
+    assert not is_gender_variant("Lanius collaris", "Lanius collurio")
+    assert not is_gender_variant("Parus major", "Parus majus")
+    assert not is_gender_variant("Poecile atricapillus", "Poecila atricapillus")
+
+
+def test_congeneric_species_in_cache_are_never_merged():
+    species = ["Lanius collurio", "Lanius collaris", "Phylloscopus collybita", "Phylloscopus trochilus",
+               "Sylvia borin", "Sylvia curruca", "Emberiza cia", "Emberiza cirlus"]
+    index = TaxonomyIndex.from_name_cache({name: name for name in species})
+    for name in species:
+        assert index.resolve(name) == (name, False)
+        # A typo of one species may only resolve to that species, never to another one of its genus
+        for typo in (name[:-1], name + "a", name[:-2] + name[-1] + name[-2]):
+            match = index.resolve(typo)
+            assert match is None or match[0] == name
+
+
+def test_distinct_species_is_resolved_online(tmp_path):
+    cache = _cache(tmp_path, {"Lanius collurio": "Lanius collurio"})
+    resolver = StaticResolver({"Lanius collaris": "Lanius collaris"})
+
+    resolve_species_names(["Lanius collaris", "Lanius collurio"], cache, resolver)
+
+    assert resolver.queried == ["Lanius collaris"]
+    assert cache["Lanius collaris"] == "Lanius collaris"
+    assert cache["Lanius collurio"] == "Lanius collurio"
+
+
+def test_gender_variant_is_cached_as_fallback(tmp_path):
+    cache = _cache(tmp_path, {"Poecile atricapillus": "Poecile atricapillus"})
+    resolver = StaticResolver({})
+
+    resolve_species_names(["Poecile atricapilla"], cache, resolver)
+
+    assert resolver.queried == []
+    assert cache["Poecile atricapilla"] == "Poecile atricapillus"
+    assert TaxonomyCache(cache.cache_file)._entries["Poecile atricapilla"]["fallback"]
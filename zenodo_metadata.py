@@ -0,0 +1,164 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from dataset_downloader import ZENODO_API_URL, parse_record_id
+import argparse
+import json
+import os
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zenodo_metadata_cache")
+DEFAULT_TTL = timedelta(days=30)
+
+
+class ZenodoMetadataError(ValueError):
+    """Raised when the metadata of a Zenodo record can neither be fetched nor read from the cache."""
+
+
+class ZenodoMetadataCache:
+    """
+    An on-disk cache of the metadata of Zenodo records, with one JSON file per record holding the metadata
+    and the time it was fetched. Entries younger than ttl are used without a request. Older entries are
+    fetched again, but still used if Zenodo cannot be reached. In offline mode no request is ever made, and
+    a record that is not cached raises a ZenodoMetadataError right away.
+
+    The default cache is configured with environment variables, so that it also applies to the readers run
+    in worker processes: ZENODO_METADATA_CACHE sets the directory and ZENODO_OFFLINE=1 turns on offline mode.
+
+    Attributes:
+        cache_dir (str): The directory of the cache files.
+        ttl (timedelta): How long cached metadata is used without fetching it again.
+        offline (bool): Never query Zenodo and fail on cache misses.
+        api_url (str): The base URL of the Zenodo API, e.g. the api_url of a MockZenodoServer.
+        timeout (float): The connect and read timeout of the requests in seconds.
+    """
+
+    def __init__(self, cache_dir:str=DEFAULT_CACHE_DIR, ttl:timedelta=DEFAULT_TTL, offline:bool=False, api_url:str=ZENODO_API_URL, timeout:float=30):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.offline = offline
+        self.api_url = api_url
+        self.timeout = timeout
+
+    @classmethod
+    def from_environment(cls, **kwargs):
+        """Creates the cache configured by the ZENODO_METADATA_CACHE and ZENODO_OFFLINE environment variables."""
+        return cls(cache_dir=os.environ.get("ZENODO_METADATA_CACHE") or DEFAULT_CACHE_DIR,
+                   offline=os.environ.get("ZENODO_OFFLINE", "").lower() in ("1", "true", "yes"), **kwargs)
+
+    def _path(self, record_id:str):
+        return os.path.join(self.cache_dir, f"{record_id}.json")
+
+    def read(self, record_id:str):
+        """Returns the cache entry of a record, a dictionary with its metadata and fetched_at time, or None."""
+        try:
+            with open(self._path(record_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def is_fresh(self, entry:dict):
+        fetched_at = datetime.fromisoformat(entry["fetched_at"])
+        return datetime.now(timezone.utc) - fetched_at < self.ttl
+
+    def fetch(self, record_id:str, session=None):
+        """
+        Fetches the metadata of a record from Zenodo and stores it in the cache.
+
+        Raises:
+            ZenodoMetadataError: If the request fails or the response has no metadata.
+        """
+        import requests  # only needed on cache misses, so it is not imported with the module
+
+        try:
+            response = (session or requests).get(f"{self.api_url}/records/{record_id}", timeout=self.timeout)
+            response.raise_for_status()
+            metadata = response.json()["metadata"]
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            raise ZenodoMetadataError(f"Failed to fetch metadata of Zenodo record {record_id}: {e}") from e
+
+        entry = {"record_id": record_id, "fetched_at": datetime.now(timezone.utc).isoformat(), "metadata": metadata}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Written under a unique name and renamed, so readers in other processes never see a partial file
+        temporary_path = f"{self._path(record_id)}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, indent=4)
+        os.replace(temporary_path, self._path(record_id))
+        return entry
+
+    def get(self, record_id:str, refresh:bool=False):
+        """
+        Returns the metadata of a record, from the cache if it is fresh and from Zenodo otherwise.
+
+        Args:
+            record_id (str): The id of the Zenodo record.
+            refresh (bool): Fetch the metadata again even if the cached entry is fresh.
+
+        Returns:
+            metadata (dict): The metadata of the record, as in the "metadata" field of the records API.
+
+        Raises:
+            ZenodoMetadataError: If the record is not cached in offline mode, or cannot be fetched and is not cached.
+        """
+        entry = self.read(record_id)
+        if self.offline:
+            if entry is None:
+                raise ZenodoMetadataError(f"The metadata of Zenodo record {record_id} is not in the cache {self.cache_dir}, and offline mode "
+                                          f"is on. Run `python zenodo_metadata.py` with network access to fill the cache.")
+            return entry["metadata"]
+        if entry is not None and not refresh and self.is_fresh(entry):
+            return entry["metadata"]
+        try:
+            return self.fetch(record_id)["metadata"]
+        except ZenodoMetadataError as e:
+            if entry is None:
+                raise
+            print(f"Using the metadata of Zenodo record {record_id} cached at {entry['fetched_at']}: {e}")
+            return entry["metadata"]
+
+    def prefetch(self, record_ids:list, refresh:bool=False, max_workers:int=8):
+        """
+        Fills the cache with the metadata of many records, fetching the ones that are missing or stale.
+
+        Returns:
+            errors (dict): Maps the ids of the records that could not be fetched to the error message.
+        """
+        import requests
+
+        pending = [record_id for record_id in dict.fromkeys(record_ids)
+                   if refresh or (entry := self.read(record_id)) is None or not self.is_fresh(entry)]
+        errors = {}
+
+        def fetch(record_id):
+            try:
+                self.fetch(record_id, session)
+            except ZenodoMetadataError as e:
+                errors[record_id] = str(e)
+
+        with requests.Session() as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(fetch, pending))
+        print(f"Fetched the metadata of {len(pending) - len(errors)} records, {len(set(record_ids)) - len(pending)} already cached")
+        return errors
+
+
+def main():
+    # prepare_data imports the downloader and the archive extractor, which add_info does not need
+    from prepare_data import DATASETS
+
+    parser = argparse.ArgumentParser(description="Fill the Zenodo metadata cache with the records of the datasets in prepare_data.")
+    parser.add_argument("--dataset", nargs="+", choices=DATASETS.keys(), help="Names of the datasets. Defaults to every dataset.")
+    parser.add_argument("--cache-dir", default=os.environ.get("ZENODO_METADATA_CACHE") or DEFAULT_CACHE_DIR, help="Directory of the metadata cache.")
+    parser.add_argument("--api-url", default=ZENODO_API_URL, help="Base URL of the Zenodo API, e.g. a local mock_zenodo_server.")
+    parser.add_argument("--ttl-days", type=float, default=DEFAULT_TTL.days, help="Age in days after which cached metadata is fetched again.")
+    parser.add_argument("--refresh", action="store_true", help="Fetch the metadata of every record again, even if it is fresh.")
+    args = parser.parse_args()
+
+    record_ids = [record_id for name in (args.dataset or DATASETS) for url in DATASETS[name] if (record_id := parse_record_id(url))]
+    cache = ZenodoMetadataCache(args.cache_dir, timedelta(days=args.ttl_days), api_url=args.api_url)
+    errors = cache.prefetch(record_ids, refresh=args.refresh)
+    for record_id, error in errors.items():
+        print(f"❌ {error}")
+    if not errors:
+        print(f"✅ Metadata of {len(set(record_ids))} records cached in {cache.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()